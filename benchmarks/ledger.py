@@ -0,0 +1,88 @@
+"""Benchmark comparing ledger replay against rebuilding balances and withdrawal counters from the transaction table.
+
+Usage (from the repository root):
+    python benchmarks/ledger.py [--accounts N] [--transactions N] [--repeat R]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+
+def seed(db, models, accounts, transactions):
+    """Creates a bank with the given number of accounts, and spreads transactions over them and the last year.
+    """
+    bank = models.Bank(name="Benchmark Bank")
+    config = models.AccountConfig(
+        bank=bank, name="Benchmark Checking", is_checking=True, is_savings=False, min_opening_balance=0, interest=0,
+        deposit_fee=0, withdrawal_fee=0, allow_overdraft=True, overdraft_limit=0, overdraft_fee=0)
+    user = models.User(fname="Bench", lname="Mark")
+    db.session.add_all([bank, config, user])
+    db.session.flush()
+
+    rng = random.Random(0)
+    amounts = [rng.randint(-5000, 10000) for _ in range(transactions)]
+    account_ids = [rng.randint(1, accounts) for _ in range(transactions)]
+    balances = [0] * (accounts + 1)
+    for account_id, amount in zip(account_ids, amounts):
+        balances[account_id] += amount
+    db.session.bulk_insert_mappings(models.Account, [
+        {"id": account_id, "bank_id": bank.id, "config_id": config.id, "user_id": user.id, "_balance": balances[account_id] / 100, "version": 1}
+        for account_id in range(1, accounts + 1)
+    ])
+    start = datetime.now() - timedelta(days=365)
+    db.session.bulk_insert_mappings(models.Transaction, [
+        {"account_id": account_id, "cash_amount": amount / 100, "fees": 0, "_check_amount": 0, "description": "", "is_withdrawal": amount < 0,
+         "datetime": start + timedelta(seconds=rng.randint(0, 365 * 86400))}
+        for account_id, amount in zip(account_ids, amounts)
+    ])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=10000)
+    parser.add_argument("--transactions", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ["FLASK_DB_FILE"] = os.path.join(directory, "benchmark.db")
+    from app import app, db
+    import ledger
+    import models
+
+    with app.app_context():
+        db.create_all()
+        seed(db, models, args.accounts, args.transactions)
+        ledger.sync()
+
+        def from_table():
+            failed = models.Account.audit_accounts(models.Account.query, full=True)
+            models.WithdrawalCounter.rebuild()
+            db.session.rollback()
+            return failed
+
+        def from_ledger():
+            replayed = ledger.replay()
+            failed = ledger.audit(replayed)["mismatched"]
+            db.session.rollback()
+            return failed
+
+        assert not from_table() and not from_ledger()
+        before = min(timeit.repeat(from_table, number=1, repeat=args.repeat))
+        after = min(timeit.repeat(from_ledger, number=1, repeat=args.repeat))
+
+    print("Rebuilding {} accounts from {} transactions (best of {}):".format(args.accounts, args.transactions, args.repeat))
+    print("  transaction table: {:8.2f} ms".format(before * 1000))
+    print("  ledger replay:     {:8.2f} ms".format(after * 1000))
+    print("  speedup:           {:8.2f}x".format(before / after))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""HTTP load benchmark reporting throughput and latency percentiles per route.
+
+Seeds a synthetic world of banks, branches, staff, users and accounts (with the account configs from tests/data.py) through the API
+of a running server, then drives a weighted mix of operations on the routes in api_routes from concurrent clients.
+Results are written as JSON, and can be compared against those of a previous run to catch latency regressions.
+
+Usage (from the repository root, with the server running, e.g. `cd src && flask run`):
+    python benchmarks/load.py [--url URL] [--clients C] [--duration S] [--mix NAME=WEIGHT,...] [--output FILE] [--baseline FILE]
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+sys.path.insert(0, ROOT_DIR)
+
+from tests import data  # noqa: E402
+
+ACCOUNT_CONFIGS = (data.account_config_1, data.account_config_2, data.account_config_3, data.account_config_4, data.account_config_5)
+ROLES = (4, 8, 12)  # Teller, Assistant Manager, Manager
+PERCENTILES = (50, 95, 99)
+
+
+class World:
+    """Ids of everything seeded, for operations to pick from.
+    """
+    def __init__(self):
+        self.banks = []
+        self.branches = defaultdict(list)
+        self.users = []
+        self.accounts = defaultdict(list)
+
+    def bank(self, rng):
+        return rng.choice(self.banks)
+
+    def branch(self, rng):
+        bank_id = self.bank(rng)
+        return bank_id, rng.choice(self.branches[bank_id])
+
+    def account(self, rng):
+        bank_id = self.bank(rng)
+        return bank_id, rng.choice(self.accounts[bank_id])
+
+    def counts(self):
+        return {
+            "banks": len(self.banks),
+            "branches": sum(len(branches) for branches in self.branches.values()),
+            "users": len(self.users),
+            "accounts": sum(len(accounts) for accounts in self.accounts.values()),
+        }
+
+
+def _bank(rng, world):
+    return {"bank_id": world.bank(rng)}, None
+
+
+def _branch(rng, world):
+    bank_id, branch_id = world.branch(rng)
+    return {"bank_id": bank_id, "branch_id": branch_id}, None
+
+
+def _account(rng, world):
+    bank_id, account_id = world.account(rng)
+    return {"bank_id": bank_id, "account_id": account_id}, None
+
+
+def _user(rng, world):
+    return {"user_id": rng.choice(world.users)}, None
+
+
+def _cash(sign):
+    def build(rng, world):
+        params, _ = _account(rng, world)
+        return params, {"cash_amount": sign * rng.randint(1, 5000) / 100}
+    return build
+
+
+def _check(rng, world):
+    params, _ = _account(rng, world)
+    return params, {"payable_to": "Load Test Payee", "amount": rng.randint(1, 5000) / 100}
+
+
+def _batch(rng, world):
+    bank_id = world.bank(rng)
+    accounts = world.accounts[bank_id]
+    transactions = [{"account_id": rng.choice(accounts), "cash_amount": rng.randint(1, 5000) / 100} for _ in range(10)]
+    return {"bank_id": bank_id}, {"transactions": transactions, "atomic": False}
+
+
+def _transfer(rng, world):
+    bank_id = world.bank(rng)
+    from_account_id, to_account_id = rng.sample(world.accounts[bank_id], 2)
+    return {"bank_id": bank_id}, {"from_account_id": from_account_id, "to_account_id": to_account_id, "amount": rng.randint(1, 5000) / 100}
+
+
+# Operation name: (HTTP method, resource in api_routes, function building URL parameters and JSON body)
+OPERATIONS = {
+    "list_banks": ("GET", "BankListApi", lambda rng, world: ({}, None)),
+    "get_bank": ("GET", "BankApi", _bank),
+    "list_branches": ("GET", "BranchListApi", _bank),
+    "list_staff": ("GET", "StaffListApi", _branch),
+    "list_account_configs": ("GET", "AccountConfigListApi", _bank),
+    "list_accounts": ("GET", "AccountListApi", _bank),
+    "get_account": ("GET", "AccountApi", _account),
+    "list_transactions": ("GET", "TransactionListApi", _account),
+    "deposit": ("PUT", "TransactionListApi", _cash(1)),
+    "withdraw": ("PUT", "TransactionListApi", _cash(-1)),
+    "transaction_batch": ("PUT", "TransactionBatchApi", _batch),
+    "transfer": ("PUT", "TransferApi", _transfer),
+    "list_checks": ("GET", "CheckListApi", _account),
+    "write_check": ("PUT", "CheckListApi", _check),
+    "list_users": ("GET", "UserListApi", lambda rng, world: ({}, None)),
+    "get_user": ("GET", "UserApi", _user),
+}
+
+DEFAULT_MIX = (
+    "get_account=20,list_transactions=15,deposit=10,withdraw=10,list_accounts=8,get_user=8,get_bank=5,list_checks=5,write_check=3,"
+    "list_branches=3,list_staff=3,list_account_configs=3,transfer=3,transaction_batch=2,list_banks=2,list_users=2"
+)
+
+
+def route_templates():
+    """Gets URL templates of the API's routes
+
+    Returns:
+        dict -- Flask URL rule of each resource, keyed by resource class name
+    """
+    from app import app  # noqa: F401 -- Resources can only be imported once the app is set up
+    from api_routes import routes
+    return {resource.__name__: rule for resource, rule in routes}
+
+
+def parse_mix(mix):
+    """Parses operation weights
+
+    Arguments:
+        mix {str} -- Comma-separated NAME=WEIGHT pairs
+
+    Returns:
+        dict -- Weight by operation name
+    """
+    weights = {}
+    for pair in mix.split(","):
+        name, _, weight = pair.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError("Unknown operation {}, must be one of {}".format(name, ", ".join(OPERATIONS)))
+        weights[name] = float(weight or 1)
+    return weights
+
+
+class Client:
+    """HTTP client keeping one connection per thread.
+    """
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session.request(method, self.url + path, json=body)
+
+    def create(self, path, body):
+        response = self.request("PUT", path, body)
+        response.raise_for_status()
+        return response.json()["id"]
+
+
+def seed(client, args, rng):
+    """Creates banks with branches, staff, account configs and accounts of random users through the API
+
+    Returns:
+        World -- Ids of everything created
+    """
+    world = World()
+    # Names must be unique across runs against the same database, even with the same seed
+    run = uuid.uuid4().hex[:8]
+    with ThreadPoolExecutor(args.clients) as pool:
+        users = [{"fname": "Load", "lname": "User {} {}".format(run, i), "credit_score": rng.randint(550, 850)} for i in range(args.users)]
+        world.users = list(pool.map(lambda user: client.create("/user/", user), users))
+        # Users can only work at one branch
+        staff = rng.sample(world.users, min(len(world.users), args.banks * args.branches * args.staff))
+
+        for i in range(args.banks):
+            bank_id = client.create("/bank/", {"name": "Load Bank {} {}".format(run, i)})
+            world.banks.append(bank_id)
+            configs = [client.create("/bank/{}/account_config/".format(bank_id), config) for config in ACCOUNT_CONFIGS]
+            for j in range(args.branches):
+                branch_id = client.create("/bank/{}/branch/".format(bank_id), {"name": "Branch {}".format(j)})
+                world.branches[bank_id].append(branch_id)
+                for user_id in staff[:args.staff]:
+                    client.create("/bank/{}/branch/{}/staff/".format(bank_id, branch_id), {"user_id": user_id, "role": rng.choice(ROLES)})
+                staff = staff[args.staff:]
+
+            accounts = [
+                {"user_id": rng.choice(world.users), "account_config_id": rng.choice(configs), "initial_deposit": rng.randint(1000, 10000)}
+                for _ in range(args.accounts)
+            ]
+            world.accounts[bank_id] = list(pool.map(lambda account: client.create("/bank/{}/account/".format(bank_id), account), accounts))
+    return world
+
+
+def drive(client, world, templates, weights, args):
+    """Runs operations from concurrent clients for a while
+
+    Returns:
+        tuple -- Samples of (route, status, latency in seconds) from every client, and elapsed seconds
+    """
+    names = list(weights)
+    cumulative_weights = [sum(list(weights.values())[:i + 1]) for i in range(len(names))]
+    paths = {name: re.sub(r"<(?:\w+:)?(\w+)>", r"{\1}", templates[OPERATIONS[name][1]]) for name in names}
+
+    def run_client(i):
+        rng = random.Random(args.seed + i + 1)
+        samples = []
+        warm_until = time.perf_counter() + args.warmup
+        deadline = warm_until + args.duration
+        while True:
+            name = rng.choices(names, cum_weights=cumulative_weights)[0]
+            method, resource, build = OPERATIONS[name]
+            params, body = build(rng, world)
+            start = time.perf_counter()
+            if start >= deadline:
+                return samples
+            try:
+                status = client.request(method, paths[name].format(**params), body).status_code
+            except requests.RequestException:
+                status = None
+            if start >= warm_until:
+                samples.append(("{} {}".format(method, templates[resource]), status, time.perf_counter() - start))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.clients) as pool:
+        samples = [sample for client_samples in pool.map(run_client, range(args.clients)) for sample in client_samples]
+    return samples, time.perf_counter() - start - args.warmup
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of sorted values
+    """
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def summarize(samples, elapsed):
+    """Computes request counts, throughput and latency distribution of samples
+
+    Returns:
+        dict -- Summary, with latencies in milliseconds
+    """
+    latencies = sorted(latency for _, _, latency in samples)
+    statuses = defaultdict(int)
+    for _, status, _ in samples:
+        statuses[str(status) if status else "failed"] += 1
+    summary = {
+        "requests": len(samples),
+        "throughput": round(len(samples) / elapsed, 2),
+        "errors": sum(count for status, count in statuses.items() if status == "failed" or int(status) >= 500),
+        "statuses": dict(sorted(statuses.items())),
+        "latency_ms": {"mean": round(sum(latencies) / len(latencies) * 1000, 3)},
+    }
+    for p in PERCENTILES:
+        summary["latency_ms"]["p{}".format(p)] = round(percentile(latencies, p) * 1000, 3)
+    summary["latency_ms"]["max"] = round(latencies[-1] * 1000, 3)
+    return summary
+
+
+def compare(results, baseline, max_regression, min_samples):
+    """Compares p95 latency of every route against a previous run. Routes with too few requests in either run are skipped, as their p95 is noise.
+
+    Returns:
+        list[str] -- Routes whose p95 latency grew by more than max_regression percent
+    """
+    regressions = []
+    for route, summary in results["routes"].items():
+        before = baseline["routes"].get(route)
+        if not before or min(summary["requests"], before["requests"]) < min_samples:
+            continue
+        change = (summary["latency_ms"]["p95"] / before["latency_ms"]["p95"] - 1) * 100
+        print("{:>+8.1f}% p95  {}".format(change, route), file=sys.stderr)
+        if change > max_regression:
+            regressions.append(route)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:5000/api/v1", help="Base URL of the API")
+    parser.add_argument("--clients", type=int, default=8, help="Number of concurrent clients")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to measure for")
+    parser.add_argument("--warmup", type=float, default=3, help="Seconds to run before measuring")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="Comma-separated operation weights, e.g. get_account=3,deposit=1")
+    parser.add_argument("--banks", type=int, default=3)
+    parser.add_argument("--branches", type=int, default=3, help="Branches per bank")
+    parser.add_argument("--staff", type=int, default=5, help="Staff per branch")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--accounts", type=int, default=300, help="Accounts per bank")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed, so that runs can be repeated")
+    parser.add_argument("--output", help="File to write JSON results to, instead of stdout")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare p95 latencies against")
+    parser.add_argument("--max-regression", type=float, default=20, help="Percent p95 latency increase over the baseline that fails the run")
+    parser.add_argument("--min-samples", type=int, default=100, help="Requests a route needs in both runs to be compared")
+    args = parser.parse_args()
+
+    templates = route_templates()
+    client = Client(args.url)
+    rng = random.Random(args.seed)
+    print("Seeding...", file=sys.stderr)
+    world = seed(client, args, rng)
+    print("Running {} clients for {}s...".format(args.clients, args.duration), file=sys.stderr)
+    started = datetime.now().isoformat()
+    samples, elapsed = drive(client, world, templates, args.mix, args)
+
+    by_route = defaultdict(list)
+    for sample in samples:
+        by_route[sample[0]].append(sample)
+    results = {
+        "started": started,
+        "url": args.url,
+        "clients": args.clients,
+        "duration": round(elapsed, 3),
+        "mix": args.mix,
+        "world": world.counts(),
+        "total": summarize(samples, elapsed),
+        "routes": {route: summarize(route_samples, elapsed) for route, route_samples in sorted(by_route.items())},
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    for route, summary in [("TOTAL", results["total"])] + list(results["routes"].items()):
+        latency = summary["latency_ms"]
+        print("{:>9.1f} req/s  p50 {:>8.2f}  p95 {:>8.2f}  p99 {:>8.2f} ms  {}".format(
+            summary["throughput"], latency["p50"], latency["p95"], latency["p99"], route), file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression, args.min_samples)
+        if regressions:
+            sys.exit("p95 latency regressed by more than {}% on {}".format(args.max_regression, ", ".join(regressions)))
+
+
+if __name__ == "__main__":
+    main()
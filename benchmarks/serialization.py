@@ -0,0 +1,87 @@
+"""Microbenchmark comparing compiled model serializers against the previous reflective IdModel.json.
+
+Usage (from the repository root):
+    python benchmarks/serialization.py [--transactions N] [--repeat R]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+
+def reflective_json(instance):
+    """Previous IdModel.json implementation, kept here as the baseline.
+    """
+    json_dict = {}
+    for attr in ["id"] + list(instance.JSON_ATTRIBUTES):
+        raw_val = getattr(instance, attr) or instance.__class__.__dict__.get(attr, None)
+        if raw_val is None:
+            continue
+        val = raw_val() if callable(raw_val) else raw_val
+        if isinstance(val, property):
+            val = val.fget(instance)
+        json_dict[attr] = str(val)
+    return json_dict
+
+
+def seed(db, models, transactions):
+    """Creates a bank with one account holding the given number of transactions, and as many more accounts.
+    """
+    bank = models.Bank(name="Benchmark Bank")
+    config = models.AccountConfig(
+        bank=bank, name="Benchmark Checking", is_checking=True, is_savings=False, min_opening_balance=0, interest=0,
+        deposit_fee=1, withdrawal_fee=1, allow_overdraft=False, overdraft_limit=0, overdraft_fee=0)
+    user = models.User(fname="Bench", lname="Mark")
+    account = models.Account(bank=bank, config=config, user=user, _balance=0)
+    db.session.add(account)
+    db.session.flush()
+    db.session.bulk_insert_mappings(models.Transaction, [
+        {"account_id": account.id, "cash_amount": 10.0, "fees": 1.0, "description": "Deposit"} for _ in range(transactions)
+    ])
+    db.session.bulk_insert_mappings(models.Account, [
+        {"bank_id": bank.id, "config_id": config.id, "user_id": user.id, "_balance": 100.0} for _ in range(transactions)
+    ])
+    db.session.commit()
+    return account.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transactions", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    os.environ["FLASK_DB_FILE"] = db_file.name
+    from app import app, db
+    import models
+    from utils import json_serialize
+
+    results = []
+    with app.app_context():
+        db.create_all()
+        account_id = seed(db, models, args.transactions)
+        for name, query in (
+            ("transactions", models.Transaction.query.filter_by(account_id=account_id)),
+            ("accounts", models.Account.query),
+        ):
+            rows = query.all()
+            # Warm up lazy loads and serializer compilation so that only serialization is timed
+            json_serialize(rows)
+            before = min(timeit.repeat(lambda: [reflective_json(row) for row in rows], number=1, repeat=args.repeat))
+            after = min(timeit.repeat(lambda: json_serialize(rows), number=1, repeat=args.repeat))
+            results.append((name, len(rows), before, after))
+
+    os.unlink(db_file.name)
+    for name, count, before, after in results:
+        print("Serializing {} {} (best of {}):".format(count, name, args.repeat))
+        print("  reflective IdModel.json: {:8.2f} ms".format(before * 1000))
+        print("  compiled serializer:     {:8.2f} ms".format(after * 1000))
+        print("  speedup:                 {:8.2f}x".format(before / after))
+
+
+if __name__ == "__main__":
+    main()
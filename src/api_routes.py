@@ -5,6 +5,9 @@ routes = (
     (resources.BankListApi, "/bank/"),
     (resources.BankApi, "/bank/<int:bank_id>/"),
 
+    (resources.InterestAccrualApi, "/bank/<int:bank_id>/interest/"),
+    (resources.CheckClearingApi, "/bank/<int:bank_id>/check_clearing/"),
+
     (resources.BranchListApi, "/bank/<int:bank_id>/branch/"),
     (resources.BranchApi, "/bank/<int:bank_id>/branch/<branch_id>/"),
 
@@ -17,6 +20,10 @@ routes = (
     (resources.AccountListApi, "/bank/<int:bank_id>/account/"),
     (resources.AccountApi, "/bank/<int:bank_id>/account/<int:account_id>/"),
 
+    (resources.TransactionBatchApi, "/bank/<int:bank_id>/transaction_batch/"),
+    (resources.TransferApi, "/bank/<int:bank_id>/transfer/"),
+    (resources.TransactionExportApi, "/bank/<int:bank_id>/transaction_export/"),
+
     (resources.TransactionListApi, "/bank/<int:bank_id>/account/<int:account_id>/transaction/"),
     (resources.TransactionApi, "/bank/<int:bank_id>/account/<int:account_id>/transaction/<int:transaction_id>/"),
 
@@ -24,5 +31,8 @@ routes = (
     (resources.CheckApi, "/bank/<int:bank_id>/account/<int:account_id>/check/<int:check_id>/"),
 
     (resources.UserListApi, "/user/"),
-    (resources.UserApi, "/user/<int:user_id>/")
+    (resources.UserApi, "/user/<int:user_id>/"),
+
+    (resources.ProfileApi, "/admin/profile/"),
+    (resources.ProfileDownloadApi, "/admin/profile/<string:output>/")
 )
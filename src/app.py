@@ -1,6 +1,10 @@
+import threading
+from contextlib import contextmanager
+
 import click
 from flask_restful import Api
-from flask import Flask
+from sqlalchemy import event
+from flask import Flask, has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 
@@ -17,11 +21,92 @@ def create_app():
 def setup_db(app):
     db = SQLAlchemy(app, model_class=IdModel)
     Migrate(app, db)
+    if db.engine.dialect.name == "sqlite":
+        configure_sqlite(db.engine, app.config["SQLITE_PRAGMAS"])
     return db
 
 
+_write_intent = threading.local()
+
+
+@contextmanager
+def writing():
+    """Marks database transactions begun by this thread within the block as ones that will write, like requests other than GET.
+    """
+    previous = getattr(_write_intent, "writing", False)
+    _write_intent.writing = True
+    try:
+        yield
+    finally:
+        _write_intent.writing = previous
+
+
+def will_write():
+    """Checks whether the database transaction being begun is expected to write
+
+    Returns:
+        bool -- Whether it's begun for a request that can write, or within a writing block
+    """
+    if getattr(_write_intent, "writing", False):
+        return True
+    return has_request_context() and request.method not in ("GET", "HEAD", "OPTIONS")
+
+
+def configure_sqlite(engine, pragmas):
+    """Applies pragmas to every new SQLite connection, and takes over transaction handling from pysqlite.
+
+    pysqlite only begins transactions before writes, so a SAVEPOINT issued first would start (and, on release, commit) its own transaction.
+    Beginning transactions here makes savepoints always nest inside the session's transaction.
+    Transactions that will write begin immediately, so that concurrent writers queue up on busy_timeout for the write lock,
+    rather than failing with "database is locked" when upgrading from a read whose snapshot another writer has since changed.
+    """
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute("PRAGMA {} = {}".format(name, value))
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def begin(conn):
+        if will_write():
+            conn.execute("BEGIN IMMEDIATE")
+        else:
+            conn.execute("BEGIN")
+
+
 def configure_cli(app, db):
-    from models import User
+    import os
+    import time
+    from datetime import datetime, timedelta
+
+    import export
+    import ledger
+    import loader
+    import statements
+    from clearing import clear_checks
+    from interest import accrue_interest
+    from models import Account, Bank, User, WithdrawalCounter
+
+    def get_banks(bank_id):
+        """Gets bank to run a command for, or all banks if no id is given
+
+        Arguments:
+            bank_id {int} -- Id of bank, or None
+
+        Raises:
+            click.ClickException: No bank has the id
+
+        Returns:
+            list[Bank] -- Banks
+        """
+        if bank_id is None:
+            return Bank.query.all()
+        bank = Bank.query.get(bank_id)
+        if bank is None:
+            raise click.ClickException("No bank with id {}".format(bank_id))
+        return [bank]
 
     @app.cli.command("create-superuser")
     @click.argument("fname")
@@ -31,6 +116,174 @@ def configure_cli(app, db):
         db.session.add(user)
         db.session.commit()
 
+    @app.cli.command("rebuild-withdrawal-counters")
+    def rebuild_withdrawal_counters():
+        count = WithdrawalCounter.rebuild()
+        db.session.commit()
+        click.echo("Rebuilt {} withdrawal counters".format(count))
+
+    @app.cli.command("accrue-interest")
+    @click.option("--bank-id", type=int, default=None, help="Only pay interest at this bank.")
+    @click.option("--datetime", "when", type=click.DateTime(), default=None, help="Time interest is posted at, its month being the month paid for (default: now).")
+    def accrue_monthly_interest(bank_id, when):
+        banks = get_banks(bank_id)
+        for bank in banks:
+            try:
+                accrual = accrue_interest(bank, when)
+            except ValueError as e:
+                raise click.ClickException("{}: {}".format(bank, e))
+            click.echo("{}: paid {} into {} accounts".format(bank, accrual.total, accrual.account_count))
+        db.session.commit()
+
+    @app.cli.command("clear-checks")
+    @click.option("--bank-id", type=int, default=None, help="Only clear checks drawn on accounts at this bank.")
+    @click.option("--datetime", "when", type=click.DateTime(), default=None, help="Time checks are cleared at (default: now).")
+    def clear_pending_checks(bank_id, when):
+        # Take the write lock up front, before the first read begins the transaction, so that no checks are deposited between reading and settling them
+        with writing():
+            banks = get_banks(bank_id)
+            for bank in banks:
+                clearing = clear_checks(bank, when)
+                click.echo("{}: cleared {} checks from {} accounts for {}, returned {} checks".format(
+                    bank, clearing.check_count, clearing.account_count, clearing.total, clearing.returned_count))
+            db.session.commit()
+
+    @app.cli.command("audit")
+    @click.option("--bank-id", type=int, default=None, help="Only audit accounts at this bank.")
+    @click.option("--full", is_flag=True, help="Verify whole transaction logs instead of starting from the latest checkpoints.")
+    def audit(bank_id, full):
+        banks = get_banks(bank_id)
+        failed = []
+        for bank in banks:
+            failed += bank.audit(full=full)
+        db.session.commit()
+        if failed:
+            raise click.ClickException("Balances don't match up with transactions for accounts #s {}".format(", ".join(str(account_id) for account_id in failed)))
+        click.echo("Audited {} banks".format(len(banks)))
+
+    @app.cli.command("ledger-sync")
+    def ledger_sync():
+        try:
+            count = ledger.sync()
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo("Appended {} transactions to {}".format(count, app.config["LEDGER_FILE"]))
+
+    @app.cli.command("ledger-replay")
+    @click.option("--restore", is_flag=True, help="Overwrite mismatched balances and all withdrawal counters with those replayed from the ledger.")
+    def ledger_replay(restore):
+        start = time.perf_counter()
+        try:
+            replayed = ledger.replay()
+        except (OSError, ValueError) as e:
+            raise click.ClickException(str(e))
+        click.echo("Replayed {} transactions into {} accounts in {:.3f}s".format(
+            replayed["records"], len(replayed["account_ids"]), time.perf_counter() - start))
+
+        result = ledger.audit(replayed)
+        if result["behind"]:
+            click.echo("Ledger is missing the latest {} committed transactions, run `flask ledger-sync` to append them".format(result["behind"]))
+        if result["missing"]:
+            click.echo("Accounts #s {} are in the ledger, but not the database".format(", ".join(str(account_id) for account_id in result["missing"])))
+        if restore:
+            ledger.restore(replayed, result["mismatched"])
+            db.session.commit()
+            click.echo("Restored balances of {} accounts, and {} withdrawal counters".format(len(result["mismatched"]), len(replayed["counters"][0])))
+        elif result["mismatched"]:
+            raise click.ClickException("Balances don't match up with the ledger for accounts #s {}".format(
+                ", ".join(str(account_id) for account_id in result["mismatched"])))
+        else:
+            click.echo("All balances match up with the ledger")
+
+    @app.cli.command("export-transactions")
+    @click.option("--bank-id", type=int, default=None, help="Only export transactions of accounts at this bank.")
+    @click.option("--account-id", type=int, default=None, help="Only export transactions of this account.")
+    @click.option("--start", type=click.DateTime(), default=None, help="Only export transactions at or after this time.")
+    @click.option("--end", type=click.DateTime(), default=None, help="Only export transactions before this time.")
+    @click.option("--format", "output_format", type=click.Choice(tuple(export.FORMATS)), default="ndjson", help="Output format (default: ndjson).")
+    @click.option("--output", type=click.File("w"), default="-", help="File to write to (default: stdout).")
+    def export_transactions(bank_id, account_id, start, end, output_format, output):
+        if bank_id is not None:
+            get_banks(bank_id)
+        if account_id is not None:
+            account = Account.query.get(account_id)
+            if account is None or bank_id not in (None, account.bank_id):
+                raise click.ClickException("No account with id {}{}".format(account_id, "" if bank_id is None else " at bank {}".format(bank_id)))
+        encode = export.FORMATS[output_format][1]
+        for chunk in encode(export.transaction_rows(bank_id, account_id, start, end)):
+            output.write(chunk)
+
+    @app.cli.command("statements")
+    @click.option("--bank-id", type=int, required=True, help="Bank to generate statements for.")
+    @click.option("--month", type=click.DateTime(formats=["%Y-%m"]), default=None, help="Month to generate statements for, as YYYY-MM (default: last month).")
+    @click.option("--output", "directory", type=click.Path(file_okay=False), default=None, help="Directory to write statements to (default: statements/<bank id>/<month>).")
+    @click.option("--format", "output_format", type=click.Choice(statements.FORMATS), default="json", help="Statement file format (default: json).")
+    @click.option("--workers", type=int, default=None, help="Number of worker processes (default: one per CPU).")
+    @click.option("--shard-size", type=click.IntRange(min=1), default=1000, help="Width of the range of account ids given to a worker at a time (default: 1000).")
+    def generate_statements(bank_id, month, directory, output_format, workers, shard_size):
+        get_banks(bank_id)
+        if month is None:
+            month = statements.month_bounds(datetime.now())[0] - timedelta(days=1)
+        directory = directory or os.path.join("statements", str(bank_id), "{:%Y-%m}".format(month))
+
+        def progress(done, total, shard, statement_count, transaction_count):
+            click.echo("[{}/{}] shard {}: {} statements, {} transactions".format(done, total, shard, statement_count, transaction_count))
+
+        result = statements.generate_statements(bank_id, month, directory, output_format, workers, shard_size, progress)
+        if result["skipped"]:
+            click.echo("Skipped {} shards generated by an earlier run".format(result["skipped"]))
+        click.echo("Wrote {} statements with {} transactions to {} in {:.2f}s ({:.0f} statements/s)".format(
+            result["statements"], result["transactions"], directory, result["seconds"], result["statements"] / max(result["seconds"], 1e-9)))
+
+    @app.cli.command("bulk-load")
+    @click.option("--bank-id", type=int, required=True, help="Bank to load into.")
+    @click.option("--users", type=click.Path(dir_okay=False), default=None, help="CSV or Parquet file of users.")
+    @click.option("--account-configs", type=click.Path(dir_okay=False), default=None, help="CSV or Parquet file of account configs.")
+    @click.option("--accounts", type=click.Path(dir_okay=False), default=None, help="CSV or Parquet file of accounts.")
+    @click.option("--transactions", type=click.Path(dir_okay=False), default=None, help="CSV or Parquet file of transactions.")
+    @click.option("--checks", type=click.Path(dir_okay=False), default=None, help="CSV or Parquet file of checks.")
+    @click.option("--batch-size", type=click.IntRange(min=1), default=app.config["LOAD_BATCH_SIZE"], help="Number of rows inserted at a time.")
+    def bulk_load(bank_id, users, account_configs, accounts, transactions, checks, batch_size):
+        def progress(kind, count, seconds):
+            click.echo("{}: {} rows in {:.2f}s ({:.0f} rows/s)".format(kind, count, seconds, count / max(seconds, 1e-9)))
+
+        began = time.perf_counter()
+        # Take the write lock up front, before the first read begins the transaction, so that the ids loaded rows are given stay free until they're committed
+        with writing():
+            get_banks(bank_id)
+            try:
+                counts = loader.bulk_load(bank_id, users, account_configs, accounts, transactions, checks, batch_size, progress)
+            except ValueError as e:
+                db.session.rollback()
+                raise click.ClickException(str(e))
+            db.session.commit()
+        seconds = time.perf_counter() - began
+        total = sum(counts.values())
+        click.echo("Loaded {} rows in {:.2f}s ({:.0f} rows/s)".format(total, seconds, total / max(seconds, 1e-9)))
+
+
+def configure_ledger(app, db):
+    import ledger
+    if app.config["LEDGER_FILE"]:
+        ledger.listen(db.session)
+
+
+def configure_metrics(app, db):
+    import metrics
+    if app.config["METRICS_ENABLED"]:
+        metrics.instrument(app, db.engine, db.session)
+
+
+def configure_query_debug(app, db):
+    import query_tracker
+    if app.config["QUERY_DEBUG"]:
+        query_tracker.instrument(app, db.engine)
+
+
+def configure_profiler(app):
+    import profiler
+    profiler.instrument(app)
+
 
 def configure_api(app):
     from api_routes import routes
@@ -44,3 +297,7 @@ app = create_app()
 db = setup_db(app)
 configure_cli(app, db)
 configure_api(app)
+configure_ledger(app, db)
+configure_metrics(app, db)
+configure_query_debug(app, db)
+configure_profiler(app)
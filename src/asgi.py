@@ -0,0 +1,137 @@
+"""ASGI entry point serving the read endpoints, for use with an ASGI server such as uvicorn (`uvicorn asgi:app` from `src`).
+
+Requests are held by the event loop, so thousands can be in flight at once, while the queries and serialization behind them
+run the same resources as the Flask app, on a pool of ASGI_READ_WORKERS threads sized to the database connection pool.
+Only GET and HEAD requests for the routes in READ_RESOURCES are served; everything else gets 405 or 404.
+"""
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import Map, Rule
+
+import config
+from app import app as flask_app
+from api_routes import routes
+
+READ_RESOURCES = (
+    "BankListApi", "BankApi",
+    "AccountListApi", "AccountApi",
+    "TransactionListApi", "TransactionApi",
+    "CheckListApi", "CheckApi",
+)
+
+_url_map = Map([
+    Rule(config.BASE_PATH + path, endpoint=resource.__name__, methods=["GET"])
+    for resource, path in routes if resource.__name__ in READ_RESOURCES
+])
+_executor = ThreadPoolExecutor(max_workers=config.ASGI_READ_WORKERS, thread_name_prefix="asgi-read")
+
+
+def _environ(scope, body):
+    """Builds the WSGI environ of an ASGI HTTP request
+
+    Arguments:
+        scope {dict} -- ASGI connection scope
+        body {bytes} -- Request body
+
+    Returns:
+        dict -- WSGI environ
+    """
+    root_path = scope.get("root_path", "")
+    path = unquote(scope["path"])
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server_name, server_port = scope.get("server") or ("localhost", None)
+    if server_port is None:
+        server_port = 443 if scope.get("scheme") == "https" else 80
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path,
+        "PATH_INFO": path,
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": "HTTP/{}".format(scope.get("http_version", "1.1")),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"], environ["REMOTE_PORT"] = scope["client"][0], str(scope["client"][1])
+    for name, value in scope["headers"]:
+        name, value = name.decode("latin-1").upper().replace("-", "_"), value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        environ[name] = environ[name] + "," + value if name in environ else value
+    return environ
+
+
+def _dispatch(environ):
+    """Runs a request through the Flask app, in a worker thread
+
+    Arguments:
+        environ {dict} -- WSGI environ of the request
+
+    Returns:
+        tuple -- Status code, response headers and body
+    """
+    with flask_app.request_context(environ):
+        response = flask_app.full_dispatch_request()
+        return response.status_code, response.headers.to_wsgi_list(), response.get_data()
+
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            return body
+
+
+async def _send_response(send, status, headers, body):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            _executor.shutdown(wait=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI application serving read endpoints
+    """
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    environ = _environ(scope, await _read_body(receive))
+    try:
+        _url_map.bind("", path_info=environ["PATH_INFO"]).match(method=scope["method"])
+    except HTTPException as e:
+        response = e.get_response()
+        return await _send_response(send, response.status_code, response.headers.to_wsgi_list(), response.get_data())
+
+    loop = asyncio.get_running_loop()
+    status, response_headers, body = await loop.run_in_executor(_executor, _dispatch, environ)
+    await _send_response(send, status, response_headers, b"" if scope["method"] == "HEAD" else body)
@@ -1,12 +1,16 @@
 import sqlalchemy as sa
 from flask_sqlalchemy import Model
 from sqlalchemy.ext.declarative import declared_attr
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import selectinload
 
 
 class IdModel(Model):
     """Abstract model that serves as base for all models used.
     """
     JSON_ATTRIBUTES = ()
+    # Dotted relationship paths read when encoding JSON_ATTRIBUTES, including by __repr__ of related instances
+    JSON_EAGER_LOAD = ()
 
     @declared_attr
     def id(cls):
@@ -26,16 +30,132 @@ class IdModel(Model):
             if hasattr(self, k) and not callable(getattr(self, k)) and v is not None:
                 setattr(self, k, v)
 
-    def json(self):
-        """JSON-encodes object by going through whitelist of returned attributes (and id), then returning the string value of all attributes (called if callable). If an attribute is a property, calls its __get__ magic method to obtain value.
-        """
-        json_dict = {}
-        for attr in ["id"] + list(self.JSON_ATTRIBUTES):
-            raw_val = getattr(self, attr) or self.__class__.__dict__.get(attr, None)
-            if raw_val is None:
-                continue
-            val = raw_val() if callable(raw_val) else raw_val
-            if isinstance(val, property):
-                val = val.fget(self)
-            json_dict[attr] = str(val)
-        return json_dict
+    def json(self, expand=()):
+        """JSON-encodes object using the serializer compiled for its class.
+
+        Keyword Arguments:
+            expand {iterable} -- Relationships to encode as nested objects instead of as their string value (default: {()})
+        """
+        return self.json_serializer(expand)(self, {})
+
+    @classmethod
+    def json_serializer(cls, expand=()):
+        """Gets serializer for this class, compiling it on first use.
+
+        Keyword Arguments:
+            expand {iterable} -- Relationships to encode as nested objects instead of as their string value (default: {()})
+
+        Returns:
+            function -- Function taking instance of this class and a memo dict, and returning the instance's JSON-encodable dict
+        """
+        serializers = cls.__dict__.get("_json_serializers")
+        if serializers is None:
+            serializers = {}
+            cls._json_serializers = serializers
+        expand = frozenset(expand)
+        serializer = serializers.get(expand)
+        if serializer is None:
+            serializer = cls.compile_json_serializer(expand)
+            serializers[expand] = serializer
+        return serializer
+
+    @classmethod
+    def compile_json_serializer(cls, expand=frozenset()):
+        """Generates serializer going through whitelist of returned attributes (and id). Attributes missing a value are left out.
+
+        Attributes are resolved once per class rather than once per instance: loaded column and relationship values are read straight
+        from the instance dict, and numbers, booleans and strings are kept as they are. Everything else is encoded as its string value.
+        Related instances are encoded once per memo, so that a list sharing the same related instance only renders it once.
+
+        Keyword Arguments:
+            expand {frozenset} -- Relationships to encode as nested objects instead of as their string value (default: {frozenset()})
+
+        Returns:
+            function -- Function taking instance of this class and a memo dict, and returning the instance's JSON-encodable dict
+        """
+        mapper = sa.inspect(cls)
+        namespace = {"_JSON_TYPES": _JSON_TYPES}
+        lines = ["def serialize(instance, memo):", "    loaded = instance.__dict__", "    json_dict = {}"]
+        for attr in ["id"] + list(cls.JSON_ATTRIBUTES):
+            descriptor = next((klass.__dict__[attr] for klass in cls.__mro__ if attr in klass.__dict__), None)
+            if attr in mapper.column_attrs or attr in mapper.relationships:
+                lines.append("    val = loaded[{0!r}] if {0!r} in loaded else instance.{0}".format(attr))
+            elif isinstance(descriptor, (property, hybrid_property)):
+                # Call getter directly rather than going through the descriptor protocol
+                namespace["_get_" + attr] = descriptor.fget
+                lines.append("    val = _get_{}(instance)".format(attr))
+            else:
+                lines.append("    val = instance.{}".format(attr))
+            lines.append("    if val is not None:")
+            column = mapper.columns.get(attr)
+            if column is not None and _python_type(column) in _JSON_TYPES:
+                lines.append("        json_dict[{!r}] = val".format(attr))
+            elif attr in expand:
+                relationship = mapper.relationships[attr]
+                namespace["_serialize_" + attr] = relationship.mapper.class_.json_serializer()
+                if relationship.uselist:
+                    lines.append("        json_dict[{0!r}] = [_serialize_{0}(related, memo) for related in val]".format(attr))
+                else:
+                    lines.append("        key = (id(val), {!r})".format(attr))
+                    lines.append("        if key not in memo:")
+                    lines.append("            memo[key] = _serialize_{}(val, memo)".format(attr))
+                    lines.append("        json_dict[{!r}] = memo[key]".format(attr))
+            elif attr in mapper.relationships:
+                lines.append("        key = id(val)")
+                lines.append("        if key not in memo:")
+                lines.append("            memo[key] = str(val)")
+                lines.append("        json_dict[{!r}] = memo[key]".format(attr))
+            else:
+                lines.append("        json_dict[{!r}] = val if val.__class__ in _JSON_TYPES else str(val)".format(attr))
+        lines.append("    return json_dict")
+
+        exec(compile("\n".join(lines), "<{} json serializer>".format(cls.__name__), "exec"), namespace)
+        return namespace["serialize"]
+
+    @classmethod
+    def json_expandable(cls):
+        """Gets relationships in the whitelist of returned attributes, which can be encoded as nested objects.
+
+        Returns:
+            tuple -- Names of expandable relationships
+        """
+        relationships = sa.inspect(cls).relationships
+        return tuple(attr for attr in cls.JSON_ATTRIBUTES if attr in relationships)
+
+    @classmethod
+    def json_loader_options(cls, expand=()):
+        """Builds query options eagerly loading everything the serializer will read, so that serializing a list costs a
+        constant number of queries instead of one lazy load per instance and relationship.
+
+        Keyword Arguments:
+            expand {iterable} -- Relationships that will be encoded as nested objects (default: {()})
+
+        Returns:
+            list -- Loader options to pass to Query.options
+        """
+        paths = list(cls.JSON_EAGER_LOAD)
+        for attr in expand:
+            related = sa.inspect(cls).relationships[attr].mapper.class_
+            paths += [attr] + ["{}.{}".format(attr, path) for path in related.JSON_EAGER_LOAD]
+
+        options = []
+        for path in paths:
+            model, option = cls, None
+            for attr in path.split("."):
+                relationship = getattr(model, attr)
+                option = selectinload(relationship) if option is None else option.selectinload(relationship)
+                model = relationship.property.mapper.class_
+            options.append(option)
+        return options
+
+
+_JSON_TYPES = (bool, int, float, str)
+
+
+def _python_type(column):
+    """Gets python type of column values, or None if the column type doesn't declare one.
+    """
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return None
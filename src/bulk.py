@@ -0,0 +1,106 @@
+"""Bulk ledger writes for batch jobs.
+
+Transactions and balance updates for many accounts are written with executemany rather than through the ORM,
+so no objects are created per account. Amounts are given as integer cents.
+"""
+from itertools import repeat
+
+import sqlalchemy as sa
+
+from app import db
+from ledger import mark_pending
+from models import Account
+
+# Lightweight views of the ledger tables, whose amount columns bind and load raw integer cents rather than going through Money
+transaction_cents = sa.table(
+    "transaction",
+    sa.column("account_id", sa.Integer),
+    sa.column("cash_amount", sa.Integer),
+    sa.column("fees", sa.Integer),
+    sa.column("_check_amount", sa.Integer),
+    sa.column("description", sa.String),
+    sa.column("datetime", sa.DateTime),
+    sa.column("is_withdrawal", sa.Boolean),
+)
+account_cents = sa.table(
+    "account",
+    sa.column("id", sa.Integer),
+    sa.column("_balance", sa.Integer),
+    sa.column("version", sa.Integer),
+)
+
+_insert_transactions = transaction_cents.insert().values(
+    account_id=sa.bindparam("account_id"),
+    cash_amount=sa.bindparam("amount"),
+    fees=sa.bindparam("fees"),
+    _check_amount=sa.literal_column("0"),
+    description=sa.bindparam("description"),
+    datetime=sa.bindparam("posted_at"),
+    is_withdrawal=sa.bindparam("withdrawal"),
+)
+_update_balances = account_cents.update() \
+    .where(account_cents.c.id == sa.bindparam("account_id")) \
+    .values(_balance=account_cents.c._balance + sa.bindparam("net"), version=account_cents.c.version + sa.literal_column("1"))
+
+
+def execute_many(connection, statement, columns):
+    """Executes statement once for each row of parameters, compiling it only once.
+
+    Rows are handed to the driver as they are, skipping SQLAlchemy's per-row parameter processing,
+    so values must already be in the form the driver expects.
+
+    Arguments:
+        connection {Connection} -- Connection to execute statement on
+        statement {Executable} -- Statement with named bind parameters
+        columns {dict} -- Iterable of parameter values by bind parameter name
+    """
+    compiled = statement.compile(dialect=connection.dialect)
+    if compiled.positional:
+        rows = list(zip(*(columns[name] for name in compiled.positiontup)))
+    else:
+        names = list(compiled.bind_names.values())
+        rows = [dict(zip(names, values)) for values in zip(*(columns[name] for name in names))]
+    connection.execute(str(compiled), rows)
+
+
+def post_transactions(connection, when, description, account_ids, amounts, fees=None, withdrawal=False):
+    """Posts one transaction to each of many accounts, and applies them to account balances.
+
+    Account versions are bumped like any other balance update, and balances of accounts already loaded in the session are expired.
+
+    Arguments:
+        connection {Connection} -- Connection of the session to write with
+        when {datetime} -- Time transactions are posted at
+        description {str} -- Description of every transaction
+        account_ids {list[int]} -- Accounts to post to
+        amounts {list[int]} -- Cash amount of each transaction in cents, negative for withdrawals
+
+    Keyword Arguments:
+        fees {list[int]} -- Fees of each transaction in cents (default: {no fees})
+        withdrawal {bool} -- Whether transactions are withdrawals, counting towards the savings withdrawal limit (default: {False})
+    """
+    if not account_ids:
+        return
+    process_datetime = sa.DateTime().dialect_impl(connection.dialect).bind_processor(connection.dialect)
+    fees = list(fees) if fees is not None else [0] * len(account_ids)
+    columns = {
+        "account_id": account_ids,
+        "amount": amounts,
+        "fees": fees,
+        "net": [amount - fee for amount, fee in zip(amounts, fees)],
+        "description": repeat(description),
+        "withdrawal": repeat(withdrawal),
+        "posted_at": repeat(process_datetime(when) if process_datetime else when),
+    }
+    execute_many(connection, _insert_transactions, columns)
+    execute_many(connection, _update_balances, columns)
+    mark_pending()
+    expire_balances()
+
+
+def expire_balances():
+    """Expires balances and versions of accounts loaded in the session, after they were changed behind the session's back
+    """
+    for instance in db.session.identity_map.values():
+        if isinstance(instance, Account):
+            db.session.expire(instance, ["_balance", "version"])
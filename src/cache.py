@@ -0,0 +1,205 @@
+"""Process-local caching of rarely changing reference data, and of responses built from it.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, abort, g, has_request_context, request
+from flask_restful.representations.json import output_json
+
+import config
+from app import db
+
+# Version counter per cache, shared by all workers through the database
+cache_version = db.Table(
+    'cache_version',
+    db.Column('name', db.String(64), primary_key=True),
+    db.Column('version', db.Integer, nullable=False),
+)
+
+
+def _current_versions():
+    """Gets version of every cache. Read at most once per request, so that checking any number of caches costs one small query.
+
+    Returns:
+        dict -- Versions by cache name
+    """
+    if has_request_context() and "cache_versions" in g:
+        return g.cache_versions
+    versions = dict(db.session.execute(db.select([cache_version.c.name, cache_version.c.version])).fetchall())
+    if has_request_context():
+        g.cache_versions = versions
+    return versions
+
+
+def bump_versions(*names):
+    """Bumps version counters in the current database transaction
+
+    Arguments:
+        *names {str} -- Names of the counters
+    """
+    for name in names:
+        updated = db.session.execute(
+            cache_version.update().where(cache_version.c.name == name).values(version=cache_version.c.version + 1)
+        ).rowcount
+        if not updated:
+            db.session.execute(cache_version.insert().values(name=name, version=1))
+    if has_request_context():
+        g.pop("cache_versions", None)
+
+
+class ReferenceCache:
+    """Size-bounded read-through cache, evicting least recently used entries.
+
+    Entries are only valid for as long as the cache's version counter is unchanged. Writers call invalidate, which bumps the counter in
+    the database as part of their transaction, and every worker process drops its entries the next time it sees a new version.
+    Values should be immutable (e.g. rows of column values rather than ORM instances), since they are shared between requests and threads.
+    """
+    def __init__(self, name, load, maxsize):
+        """Initializes empty cache
+
+        Arguments:
+            name {str} -- Name of the version counter
+            load {function} -- Function loading value for a key from the database, returning None if there is none
+            maxsize {int} -- Maximum number of entries to keep
+        """
+        self.name = name
+        self.load = load
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Gets value for key, loading and caching it if it isn't cached. Missing values aren't cached.
+
+        Arguments:
+            key -- Key to look up
+
+        Returns:
+            Cached value, or None if there isn't one
+        """
+        version = _current_versions().get(self.name, 0)
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        value = self.load(key)
+        if value is not None:
+            with self._lock:
+                if version == self._version:
+                    self._entries[key] = value
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+        return value
+
+    def get_or_404(self, key):
+        """Gets value for key like get, aborting with 404 if there isn't one.
+        """
+        value = self.get(key)
+        if value is None:
+            abort(404)
+        return value
+
+    def invalidate(self):
+        """Bumps the version counter in the current database transaction, and drops this worker's entries.
+        """
+        bump_versions(self.name)
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+
+class ResponseCache:
+    """Size-bounded cache of GET responses, evicting least recently used entries.
+
+    Responses are keyed by path, query string and the version counters of the collections they're built from. Writers to a collection
+    invalidate every response built from it by bumping its counter with bump_versions, so a repeated request for an unchanged collection
+    only costs the version lookup. Responses carry an ETag of their body, and requests with a matching If-None-Match get 304.
+    """
+    def __init__(self, maxsize):
+        """Initializes empty cache
+
+        Arguments:
+            maxsize {int} -- Maximum number of responses to keep
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def versioned(self, *collections):
+        """Decorates a Resource's get method to cache its responses
+
+        Arguments:
+            *collections {str} -- Names of version counters of the collections the responses are built from
+
+        Returns:
+            function -- Decorator
+        """
+        def decorator(get):
+            @wraps(get)
+            def cached_get(resource, *args, **kwargs):
+                versions = _current_versions()
+                key = (request.path, request.query_string, tuple(versions.get(name, 0) for name in collections))
+                with self._lock:
+                    response = self._entries.get(key)
+                    if response is not None:
+                        self._entries.move_to_end(key)
+                if response is None:
+                    response = _render(get(resource, *args, **kwargs))
+                    if response.status_code == 200:
+                        response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+                        with self._lock:
+                            self._entries[key] = response
+                            while len(self._entries) > self.maxsize:
+                                self._entries.popitem(last=False)
+                return _conditional(response)
+            return cached_get
+        return decorator
+
+    def clear(self):
+        """Drops all responses
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+def _render(result):
+    """Renders a Resource method's return value as Flask-RESTful's JSON representation would
+
+    Arguments:
+        result -- Data, or tuple of data, status code and headers
+
+    Returns:
+        Response -- JSON response
+    """
+    if not isinstance(result, tuple):
+        result = (result,)
+    data, status, headers = result + (200, None)[len(result) - 1:]
+    response = output_json(data, status, headers)
+    response.mimetype = "application/json"
+    return response
+
+
+def _conditional(response):
+    """Answers the current request with a cached response, or with 304 if the client has it already
+
+    Arguments:
+        response {Response} -- Cached response, which is shared and mustn't be modified
+
+    Returns:
+        Response -- Response to send
+    """
+    if response.status_code == 200 and request.if_none_match.contains(response.get_etag()[0]):
+        not_modified = Response(status=304)
+        not_modified.set_etag(response.get_etag()[0])
+        return not_modified
+    return Response(response.get_data(), response.status_code, response.headers.copy())
+
+
+response_cache = ResponseCache(config.RESPONSE_CACHE_SIZE)
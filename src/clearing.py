@@ -0,0 +1,145 @@
+"""Batch check clearing.
+
+Deposits credit checks to the depositing account straight away, leaving them pending. A clearing run then nets all pending checks
+drawn on each of a bank's accounts, and debits each issuing account once for their total, rather than once per check.
+Checks the issuing account can't cover are returned, and taken back from their depositing accounts, again once per account.
+"""
+from datetime import datetime
+
+import sqlalchemy as sa
+
+import config
+from app import db
+from bulk import post_transactions
+from models import Account, AccountConfig, Check, CheckClearing, Transaction, WithdrawalCounter
+from money import from_cents
+
+
+def _cents(column):
+    """Loads Money column as raw integer cents
+    """
+    return sa.type_coerce(column, sa.Integer)
+
+
+def _covers(balance, total, closed, allow_overdraft, overdraft_limit, is_savings, withdrawals):
+    """Decides whether an account can pay the checks drawn on it, by the same rules as a withdrawal
+
+    Arguments:
+        balance {int} -- Account balance in cents
+        total {int} -- Total of checks drawn on the account in cents
+        closed {bool} -- Whether account is closed
+        allow_overdraft {bool} -- Whether account config allows overdrafts
+        overdraft_limit {int} -- Overdraft limit of account config in cents
+        is_savings {bool} -- Whether account is a savings account
+        withdrawals {int} -- Number of withdrawals made from account in the calendar month checks are cleared in
+
+    Returns:
+        bool -- Whether checks are paid
+    """
+    if closed:
+        return False
+    if is_savings and withdrawals >= config.SAVINGS_ACCOUNT_MAX_WITHDRAWALS_PER_MONTH:
+        return False
+    if balance - total < 0:
+        return allow_overdraft and balance - total >= -overdraft_limit
+    return True
+
+
+def _record_withdrawals(account_ids, when):
+    """Increments withdrawal counters of many accounts for the calendar month of when
+
+    Arguments:
+        account_ids {list[int]} -- Accounts that made a withdrawal
+        when {datetime} -- Time of withdrawals
+    """
+    counters = WithdrawalCounter.query.filter(
+        WithdrawalCounter.account_id.in_(account_ids), WithdrawalCounter.year == when.year, WithdrawalCounter.month == when.month)
+    existing = {account_id for (account_id,) in counters.with_entities(WithdrawalCounter.account_id)}
+    if existing:
+        counters.update({WithdrawalCounter.count: WithdrawalCounter.count + 1}, synchronize_session=False)
+    db.session.bulk_insert_mappings(WithdrawalCounter, [
+        {"account_id": account_id, "year": when.year, "month": when.month, "count": 1}
+        for account_id in account_ids if account_id not in existing
+    ])
+
+
+def clear_checks(bank, when=None):
+    """Settles all pending checks drawn on a bank's accounts. Changes are left for the caller to commit.
+
+    Every issuing account that can cover its checks is debited once for their total, with its withdrawal fee,
+    and its overdraft fee if the debit overdraws it. The debit is a withdrawal, so the checks of savings accounts that already made
+    as many withdrawals that month as allowed are returned, along with those of accounts that can't cover them.
+
+    Arguments:
+        bank {Bank} -- Bank whose accounts the checks are drawn on
+
+    Keyword Arguments:
+        when {datetime} -- Time checks are cleared at (default: {now})
+
+    Returns:
+        CheckClearing -- Record of the run
+    """
+    when = when or datetime.now()
+    clearing = CheckClearing(bank=bank, datetime=when, account_count=0, check_count=0, returned_count=0, total=from_cents(0))
+    db.session.add(clearing)
+    db.session.flush()
+
+    pending = sa.and_(
+        Check._deposited == sa.true(),
+        Check._cleared == sa.false(),
+        Check._returned == sa.false(),
+        Check.issuing_account_id.in_(db.session.query(Account.id).filter(Account.bank_id == bank.id)),
+    )
+    counters = sa.and_(WithdrawalCounter.account_id == Account.id, WithdrawalCounter.year == when.year, WithdrawalCounter.month == when.month)
+    connection = db.session.connection()
+    rows = connection.execute(
+        sa.select([
+            Account.id, _cents(Account._balance), Account._closed,
+            _cents(AccountConfig.withdrawal_fee), AccountConfig.allow_overdraft, _cents(AccountConfig.overdraft_limit), _cents(AccountConfig.overdraft_fee),
+            AccountConfig.is_savings, sa.func.coalesce(sa.func.max(WithdrawalCounter.count), 0), sa.func.sum(_cents(Check.amount)), sa.func.count(Check.id),
+        ]).select_from(
+            sa.join(Check, Account, Check.issuing_account_id == Account.id)
+            .join(AccountConfig, Account.config_id == AccountConfig.id)
+            .outerjoin(WithdrawalCounter, counters)
+        ).where(pending).group_by(Account.id)
+    ).fetchall()
+    if not rows:
+        return clearing
+
+    paid_ids, amounts, fees, returned_ids = [], [], [], []
+    paid_total = returned_count = 0
+    for account_id, balance, closed, withdrawal_fee, allow_overdraft, overdraft_limit, overdraft_fee, is_savings, withdrawals, total, count in rows:
+        if not _covers(balance, total, closed, allow_overdraft, overdraft_limit, is_savings, withdrawals):
+            returned_ids.append(account_id)
+            returned_count += count
+            continue
+        paid_ids.append(account_id)
+        amounts.append(-total)
+        fees.append(abs(withdrawal_fee) + (overdraft_fee if balance - total < 0 else 0))
+        paid_total += total
+
+    post_transactions(connection, when, "Check Clearing", paid_ids, amounts, fees, withdrawal=True)
+    if paid_ids:
+        _record_withdrawals(paid_ids, when)
+
+    if returned_ids:
+        returned = sa.and_(pending, Check.issuing_account_id.in_(returned_ids))
+        depositors = connection.execute(
+            sa.select([Transaction.account_id, sa.func.sum(_cents(Check.amount))])
+            .select_from(sa.join(Check, Transaction, Check.transaction_id == Transaction.id))
+            .where(returned).group_by(Transaction.account_id)
+        ).fetchall()
+        post_transactions(connection, when, "Returned Checks", [account_id for account_id, _ in depositors], [-total for _, total in depositors])
+        Check.query.filter(returned).update({Check._returned: True, Check.clearing_id: clearing.id}, synchronize_session=False)
+
+    Check.query.filter(pending).update({Check._cleared: True, Check.clearing_id: clearing.id}, synchronize_session=False)
+    # Checks were changed behind the session's back
+    for instance in db.session.identity_map.values():
+        if isinstance(instance, Check):
+            db.session.expire(instance, ["_cleared", "_returned", "clearing_id"])
+
+    clearing.account_count = len(paid_ids)
+    clearing.check_count = sum(count for *_, count in rows) - returned_count
+    clearing.returned_count = returned_count
+    clearing.total = from_cents(paid_total)
+    return clearing
@@ -1,8 +1,80 @@
 import os
 
-SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), os.environ.get("FLASK_DB_FILE", 'app.db'))
+from sqlalchemy.pool import QueuePool
+
+DB_FILE = os.path.join(os.path.abspath(os.path.dirname(__file__)), os.environ.get("FLASK_DB_FILE", 'app.db'))
+SQLALCHEMY_DATABASE_URI = 'sqlite:///' + DB_FILE
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+# =====Database Engine Settings======
+
+# Keep a pool of open connections rather than reopening the database file (and reapplying pragmas) on every request.
+# Connections are shared between the server's worker threads, so SQLite's same-thread check is disabled.
+SQLALCHEMY_ENGINE_OPTIONS = {
+    "poolclass": QueuePool,
+    "pool_size": int(os.environ.get("FLASK_DB_POOL_SIZE", 10)),
+    "max_overflow": int(os.environ.get("FLASK_DB_MAX_OVERFLOW", 20)),
+    "pool_timeout": 30,
+    "connect_args": {"check_same_thread": False},
+}
+
+# Threads running the read endpoints served by asgi.py. Each holds a pooled connection while it works, so it defaults to the pool size.
+ASGI_READ_WORKERS = int(os.environ.get("FLASK_ASGI_READ_WORKERS", SQLALCHEMY_ENGINE_OPTIONS["pool_size"]))
+
+# Pragmas applied to every new SQLite connection.
+# WAL lets readers keep reading while a write is in progress, and only needs a sync on checkpoints when synchronous is NORMAL.
+# busy_timeout (in milliseconds) makes writers wait for the write lock instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("FLASK_SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": "NORMAL",
+    "busy_timeout": int(os.environ.get("FLASK_SQLITE_BUSY_TIMEOUT", 10000)),
+    "cache_size": -64000,  # Negative sizes are in KiB, so 64 MiB per connection
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+# Updates conflicting with a concurrent update are rolled back and retried this many times, before giving up with 409 Conflict.
+# Retries wait a random time of up to CONFLICT_BACKOFF seconds, doubling with each retry but capped at CONFLICT_MAX_BACKOFF.
+CONFLICT_RETRIES = 8
+CONFLICT_BACKOFF = 0.002
+CONFLICT_MAX_BACKOFF = 0.1
+
+# Append-only binary log of committed transactions, which balances can be rebuilt from with `flask ledger-replay`. Set to an empty string to disable.
+LEDGER_FILE = os.environ.get("FLASK_LEDGER_FILE", DB_FILE + ".ledger")
+# Whether to fsync the ledger after every append. Like SQLite with synchronous=NORMAL, records are otherwise only durable once the OS flushes them.
+LEDGER_FSYNC = False
+
+# Request latencies, SQL statement and row counts, and commit times are exposed at /metrics. Set FLASK_METRICS=0 to disable.
+METRICS_ENABLED = os.environ.get("FLASK_METRICS", "1") != "0"
+# Upper bounds of histogram buckets, in seconds for durations
+METRICS_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 10000)
+
+# Tracks the SQL statements and lazy loads of each request, reporting statement shapes or relationships repeated more than
+# QUERY_DEBUG_THRESHOLD times (N+1 queries) by logging a warning or, with QUERY_DEBUG_ACTION = "raise", failing the request.
+QUERY_DEBUG = os.environ.get("FLASK_QUERY_DEBUG", "0") != "0"
+QUERY_DEBUG_THRESHOLD = int(os.environ.get("FLASK_QUERY_DEBUG_THRESHOLD", 10))
+QUERY_DEBUG_ACTION = os.environ.get("FLASK_QUERY_DEBUG_ACTION", "log")
+
+# Number of profiles of sampled requests kept for each route, and of functions listed in text reports of them
+PROFILE_RETAINED_SAMPLES = 200
+PROFILE_REPORT_LIMIT = 100
+
+# Maximum number of entries in each process-local cache of reference data (banks, account configs)
+REFERENCE_CACHE_SIZE = 1024
+
+# Number of rows fetched from the database and encoded at a time by transaction exports
+EXPORT_BATCH_SIZE = 1000
+
+# Number of rows inserted by each executemany of flask bulk-load
+LOAD_BATCH_SIZE = 10000
+
+# Maximum number of list responses kept by each process, for collections that rarely change (banks, branches, account configs, staff)
+RESPONSE_CACHE_SIZE = 1024
+
+# Maximum number of users whose staff roles are cached by each process
+PERMISSION_CACHE_SIZE = 10000
+
 # =====Banking Settings======
 
 # Ordinal permission levels, initialized with distance between them to allow future modification
@@ -33,3 +105,10 @@ CREDIT_SCORE_INTEREST_RATE_MAPPING = {
 
 # API Settings
 BASE_PATH = "/api/v1"
+
+# Page sizes for list endpoints. Clients can request smaller pages with ?limit=, but never larger than the maximum.
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Maximum number of transactions that can be submitted in one batch
+MAX_TRANSACTION_BATCH_SIZE = 10000
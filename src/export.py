@@ -0,0 +1,112 @@
+"""Streaming export of transaction histories as NDJSON or CSV.
+
+Rows are fetched in batches of EXPORT_BATCH_SIZE and written out as each batch arrives, so exporting any number of transactions
+takes constant memory. A bank's transactions are exported one account at a time, each in date order straight off the
+(account_id, datetime) index, as ordering the whole bank's transactions by date would make SQLite sort them all first.
+"""
+import csv
+import json
+from io import StringIO
+
+import config
+from app import db
+from models import Account, Transaction
+
+COLUMNS = ("id", "account_id", "datetime", "cash_amount", "check_amount", "fees", "total_amount", "description")
+
+_json_encoder = json.JSONEncoder(default=str)
+
+
+def _account_rows(account_id, start, end, batch_size):
+    query = db.session.query(
+        Transaction.id, Transaction.account_id, Transaction.datetime,
+        Transaction.cash_amount, Transaction._check_amount, Transaction.fees, Transaction.description,
+    ).filter(Transaction.account_id == account_id)
+    if start is not None:
+        query = query.filter(Transaction.datetime >= start)
+    if end is not None:
+        query = query.filter(Transaction.datetime < end)
+    for id_, account_id, when, cash_amount, check_amount, fees, description in query.order_by(Transaction.datetime, Transaction.id).yield_per(batch_size):
+        yield id_, account_id, when, cash_amount, check_amount, fees, cash_amount + check_amount - fees, description
+
+
+def transaction_rows(bank_id=None, account_id=None, start=None, end=None, batch_size=config.EXPORT_BATCH_SIZE):
+    """Iterates over transactions, ordered by account, then date
+
+    Keyword Arguments:
+        bank_id {int} -- Only export transactions of accounts at this bank (default: {None})
+        account_id {int} -- Only export transactions of this account (default: {None})
+        start {datetime} -- Only export transactions at or after this time (default: {None})
+        end {datetime} -- Only export transactions before this time (default: {None})
+        batch_size {int} -- Number of rows fetched from the database at a time (default: {config.EXPORT_BATCH_SIZE})
+
+    Yields:
+        tuple -- Values of COLUMNS
+    """
+    if account_id is not None:
+        account_ids = [account_id]
+    else:
+        query = db.session.query(Account.id)
+        if bank_id is not None:
+            query = query.filter(Account.bank_id == bank_id)
+        account_ids = [id_ for id_, in query.order_by(Account.id)]
+    for account_id in account_ids:
+        yield from _account_rows(account_id, start, end, batch_size)
+
+
+def _batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def to_ndjson(rows, batch_size=config.EXPORT_BATCH_SIZE):
+    """Encodes rows as newline delimited JSON objects, with amounts and datetimes as strings like the rest of the API
+
+    Arguments:
+        rows {iterable} -- Rows from transaction_rows
+
+    Keyword Arguments:
+        batch_size {int} -- Number of rows encoded into each chunk (default: {config.EXPORT_BATCH_SIZE})
+
+    Yields:
+        str -- Chunk of lines
+    """
+    for batch in _batches(rows, batch_size):
+        yield "".join(_json_encoder.encode(dict(zip(COLUMNS, row))) + "\n" for row in batch)
+
+
+def to_csv(rows, batch_size=config.EXPORT_BATCH_SIZE):
+    """Encodes rows as CSV, with a header row
+
+    Arguments:
+        rows {iterable} -- Rows from transaction_rows
+
+    Keyword Arguments:
+        batch_size {int} -- Number of rows encoded into each chunk (default: {config.EXPORT_BATCH_SIZE})
+
+    Yields:
+        str -- Chunk of lines
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for batch in _batches(rows, batch_size):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# Mimetype and encoder of each export format
+FORMATS = {
+    "ndjson": ("application/x-ndjson", to_ndjson),
+    "csv": ("text/csv", to_csv),
+}
@@ -0,0 +1,95 @@
+"""Month-end interest accrual.
+
+Balances of every open account at a bank are read as columns of integer cents, accruals are computed with NumPy,
+and the resulting transactions and balance updates are written in bulk, so no ORM objects are created per account.
+"""
+from datetime import datetime
+
+import numpy as np
+import sqlalchemy as sa
+
+from app import db
+from bulk import post_transactions
+from models import Account, AccountConfig, InterestAccrual
+from money import from_cents
+
+
+def interest_description(when):
+    """Gets description of interest transactions paid for a month
+
+    Arguments:
+        when {datetime} -- Any time in the month paid for
+
+    Returns:
+        str -- Transaction description
+    """
+    return "Interest for {}/{}".format(when.month, when.year)
+
+
+def compute_accruals(balances, config_ids, rates):
+    """Computes one month of interest for many accounts at once
+
+    Arguments:
+        balances {ndarray} -- Account balances in cents
+        config_ids {ndarray} -- Account config id of each account
+        rates {dict} -- Yearly interest rate by account config id
+
+    Returns:
+        ndarray -- Accrued interest in cents of each account, rounded to the nearest cent (ties to even)
+    """
+    config_index = np.array(sorted(rates), dtype=np.int64)
+    monthly_rates = np.array([rates[config_id] for config_id in config_index], dtype=np.float64) / 12
+    account_rates = monthly_rates[np.searchsorted(config_index, config_ids)]
+    return np.rint(balances * account_rates).astype(np.int64)
+
+
+def accrue_interest(bank, when=None):
+    """Pays a month of interest into every open account at a bank with a positive balance. Changes are left for the caller to commit.
+
+    Arguments:
+        bank {Bank} -- Bank whose accounts accrue interest
+
+    Keyword Arguments:
+        when {datetime} -- Time interest is posted at, its calendar month being the month paid for (default: {now})
+
+    Raises:
+        ValueError: Interest was already paid for that month
+
+    Returns:
+        InterestAccrual -- Record of the run
+    """
+    when = when or datetime.now()
+    if InterestAccrual.query.filter_by(bank_id=bank.id, year=when.year, month=when.month).first():
+        raise ValueError("Interest for {}/{} Was Already Paid".format(when.month, when.year))
+
+    accrual = InterestAccrual(bank=bank, year=when.year, month=when.month, datetime=when, account_count=0, total=from_cents(0))
+    db.session.add(accrual)
+
+    rates = dict(db.session.query(AccountConfig.id, AccountConfig.interest).filter(AccountConfig.bank_id == bank.id, AccountConfig.interest > 0))
+    if not rates:
+        return accrual
+
+    connection = db.session.connection()
+    rows = connection.execute(
+        sa.select([Account.id, sa.type_coerce(Account._balance, sa.Integer), Account.config_id]).where(sa.and_(
+            Account.bank_id == bank.id,
+            Account._closed == sa.false(),
+            Account.config_id.in_(rates),
+            Account._balance > 0,
+        ))
+    ).fetchall()
+    if not rows:
+        return accrual
+
+    account_ids, balances, config_ids = np.array([tuple(row) for row in rows], dtype=np.int64).T
+    amounts = compute_accruals(balances, config_ids, rates)
+    paid = amounts > 0
+    account_ids, amounts = account_ids[paid], amounts[paid]
+    if not len(account_ids):
+        return accrual
+
+    post_transactions(connection, when, interest_description(when), account_ids.tolist(), amounts.tolist())
+
+    accrual.account_count = len(account_ids)
+    accrual.total = from_cents(amounts.sum())
+    return accrual
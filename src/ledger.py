@@ -0,0 +1,305 @@
+"""Append-only binary ledger of committed transactions.
+
+Every committed transaction is appended to the ledger file as a fixed-width record of its id, account id, total amount in cents,
+posting time and whether it's a withdrawal, in transaction id order. The file is read back through mmap as a NumPy structured array without copying,
+so balances and withdrawal counters can be rebuilt from it, and checked against the database, without going through the ORM.
+"""
+import fcntl
+import logging
+import mmap
+import os
+import struct
+
+import numpy as np
+import sqlalchemy as sa
+
+import config
+from app import db
+from models import Account, Transaction, WithdrawalCounter
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct("<8sII")
+MAGIC = b"BANKLDGR"
+FORMAT_VERSION = 2
+RECORD = np.dtype([
+    ("transaction_id", "<i8"),
+    ("account_id", "<i8"),  # 0 for transactions not made on an account
+    ("amount", "<i8"),  # Total amount in cents
+    ("posted_at", "<i8"),  # Microseconds since 1970-01-01, in the same local time as Transaction.datetime
+    ("is_withdrawal", "?"),  # Transaction.is_withdrawal, which isn't the same as a negative amount
+])
+
+# Transactions are copied from the database into the ledger in chunks of this many rows
+SYNC_CHUNK_SIZE = 100000
+
+_MONTH_BITS = 20
+
+
+def _cents(column):
+    """Loads Money column as raw integer cents
+    """
+    return sa.type_coerce(column, sa.Integer)
+
+
+def _check_header(header):
+    """Makes sure ledger file was written in this format
+
+    Arguments:
+        header {bytes} -- First bytes of ledger file
+
+    Raises:
+        ValueError: File isn't a ledger in this format
+    """
+    magic, version, record_size = HEADER.unpack(header)
+    if magic != MAGIC or version != FORMAT_VERSION or record_size != RECORD.itemsize:
+        raise ValueError("Not a version {} ledger file. Ledgers of other versions can be deleted and rewritten with flask ledger-sync.".format(FORMAT_VERSION))
+
+
+def _last_transaction_id(log):
+    """Finds id of the last transaction in ledger, dropping any partly written record at the end
+
+    Arguments:
+        log {file} -- Ledger file opened for reading and appending, and locked
+
+    Returns:
+        int -- Id of the last transaction in ledger, or 0 if it's empty
+    """
+    size = log.seek(0, os.SEEK_END)
+    if size < HEADER.size:
+        log.truncate(0)
+        log.write(HEADER.pack(MAGIC, FORMAT_VERSION, RECORD.itemsize))
+        return 0
+    log.seek(0)
+    _check_header(log.read(HEADER.size))
+    records_size = (size - HEADER.size) // RECORD.itemsize * RECORD.itemsize
+    if HEADER.size + records_size != size:
+        log.truncate(HEADER.size + records_size)
+    if not records_size:
+        return 0
+    log.seek(HEADER.size + records_size - RECORD.itemsize)
+    return int(np.frombuffer(log.read(RECORD.itemsize), RECORD)["transaction_id"][0])
+
+
+def sync(path=None):
+    """Appends transactions committed since the last one in the ledger
+
+    Appending is idempotent, so a failed or skipped sync is caught up by the next one, and the file is locked while appending,
+    so that syncs from several threads or processes don't interleave.
+
+    Keyword Arguments:
+        path {str} -- Ledger file (default: {config.LEDGER_FILE})
+
+    Raises:
+        ValueError: Ledger has transactions the database doesn't, so belongs to another database
+
+    Returns:
+        int -- Number of transactions appended
+    """
+    path = path or config.LEDGER_FILE
+    total = sa.type_coerce(_cents(Transaction.cash_amount) + _cents(Transaction._check_amount) - _cents(Transaction.fees), sa.Integer)
+    with open(path, "a+b") as log, db.engine.connect() as connection:
+        fcntl.flock(log, fcntl.LOCK_EX)
+        last_id = _last_transaction_id(log)
+        max_id = connection.execute(sa.select([sa.func.max(Transaction.id)])).scalar() or 0
+        if last_id > max_id:
+            raise ValueError("Ledger {} has transactions up to #{}, but the database only up to #{}".format(path, last_id, max_id))
+
+        appended = 0
+        while last_id < max_id:
+            rows = connection.execute(
+                sa.select([
+                    Transaction.id, sa.func.coalesce(Transaction.account_id, 0), total, sa.type_coerce(Transaction.datetime, sa.String),
+                    Transaction.is_withdrawal,
+                ])
+                .where(sa.and_(Transaction.id > last_id, Transaction.id <= max_id)).order_by(Transaction.id).limit(SYNC_CHUNK_SIZE)
+            ).fetchall()
+            if not rows:
+                break
+            transaction_ids, account_ids, amounts, posted_at, is_withdrawal = zip(*rows)
+            records = np.empty(len(rows), RECORD)
+            records["transaction_id"] = transaction_ids
+            records["account_id"] = account_ids
+            records["amount"] = amounts
+            records["posted_at"] = np.array(posted_at, dtype="datetime64[us]").astype(np.int64)
+            records["is_withdrawal"] = is_withdrawal
+            log.write(records.tobytes())
+            last_id = transaction_ids[-1]
+            appended += len(rows)
+
+        log.flush()
+        if config.LEDGER_FSYNC:
+            os.fsync(log.fileno())
+        return appended
+
+
+def replay(path=None):
+    """Rebuilds account balances and monthly withdrawal counts from the ledger
+
+    Withdrawals are counted like WithdrawalCounter.rebuild does, as the transactions marked as withdrawals when made.
+
+    Keyword Arguments:
+        path {str} -- Ledger file (default: {config.LEDGER_FILE})
+
+    Raises:
+        ValueError: Ledger is corrupt
+
+    Returns:
+        dict -- Number of records, last transaction id, account ids with their balances in cents,
+                and account ids, years and months with their withdrawal counts
+    """
+    path = path or config.LEDGER_FILE
+    with open(path, "rb") as log:
+        if os.fstat(log.fileno()).st_size < HEADER.size:
+            raise ValueError("Ledger {} is empty".format(path))
+        with mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            _check_header(view[:HEADER.size])
+            records = np.frombuffer(view, RECORD, count=(len(view) - HEADER.size) // RECORD.itemsize, offset=HEADER.size)
+            try:
+                return _summarize(records)
+            finally:
+                # The mmap can't be closed while arrays still point into it
+                del records
+
+
+def _summarize(records):
+    """Sums ledger records into balances and withdrawal counts
+
+    Arguments:
+        records {ndarray} -- Ledger records, in transaction id order
+
+    Returns:
+        dict -- See replay
+    """
+    transaction_ids = records["transaction_id"]
+    if np.any(transaction_ids[1:] <= transaction_ids[:-1]):
+        raise ValueError("Ledger records are out of order or duplicated")
+
+    on_account = records["account_id"] != 0
+    account_ids, position = np.unique(records["account_id"][on_account], return_inverse=True)
+    balances = np.zeros(len(account_ids), dtype=np.int64)
+    np.add.at(balances, position, records["amount"][on_account])
+
+    withdrawals = on_account & records["is_withdrawal"]
+    months = records["posted_at"][withdrawals].astype("datetime64[us]").astype("datetime64[M]").astype(np.int64)
+    keys, counts = np.unique((records["account_id"][withdrawals] << _MONTH_BITS) | months, return_counts=True)
+    months = keys & ((1 << _MONTH_BITS) - 1)
+
+    return {
+        "records": len(records),
+        "last_transaction_id": int(transaction_ids[-1]) if len(records) else 0,
+        "account_ids": account_ids,
+        "balances": balances,
+        "counters": (keys >> _MONTH_BITS, 1970 + months // 12, months % 12 + 1, counts),
+    }
+
+
+def _replayed_balances(replayed, ids):
+    """Looks up balances of accounts replayed from the ledger, which are 0 for accounts it has no transactions of
+
+    Arguments:
+        replayed {dict} -- Result of replay
+        ids {ndarray} -- Account ids
+
+    Returns:
+        ndarray -- Balance of each account in cents
+    """
+    account_ids, balances = replayed["account_ids"], replayed["balances"]
+    if not len(account_ids):
+        return np.zeros(len(ids), dtype=np.int64)
+    position = np.searchsorted(account_ids, ids).clip(max=len(account_ids) - 1)
+    return np.where(account_ids[position] == ids, balances[position], 0)
+
+
+def audit(replayed):
+    """Compares account balances in the database against those replayed from the ledger
+
+    Arguments:
+        replayed {dict} -- Result of replay
+
+    Returns:
+        dict -- Ids of accounts whose balance doesn't match, ids of accounts in the ledger missing from the database,
+                and number of committed transactions the ledger doesn't have yet
+    """
+    connection = db.session.connection()
+    rows = connection.execute(sa.select([Account.id, _cents(Account._balance)]).order_by(Account.id)).fetchall()
+    db_ids, db_balances = np.array([tuple(row) for row in rows], dtype=np.int64).reshape(-1, 2).T
+
+    behind = connection.execute(
+        sa.select([sa.func.count(Transaction.id)]).where(Transaction.id > replayed["last_transaction_id"])).scalar()
+    return {
+        "mismatched": db_ids[db_balances != _replayed_balances(replayed, db_ids)].tolist(),
+        "missing": np.setdiff1d(replayed["account_ids"], db_ids).tolist(),
+        "behind": behind,
+    }
+
+
+def restore(replayed, account_ids):
+    """Overwrites balances of accounts with those replayed from the ledger, and rebuilds all withdrawal counters.
+    Changes are left for the caller to commit.
+
+    Arguments:
+        replayed {dict} -- Result of replay
+        account_ids {list[int]} -- Accounts whose balance to restore, such as the mismatched ones found by audit
+    """
+    from bulk import account_cents, execute_many, expire_balances
+
+    if account_ids:
+        ids = np.array(account_ids, dtype=np.int64)
+        balances = _replayed_balances(replayed, ids)
+        statement = account_cents.update().where(account_cents.c.id == sa.bindparam("account_id")).values(
+            _balance=sa.bindparam("balance"), version=account_cents.c.version + sa.literal_column("1"))
+        execute_many(db.session.connection(), statement, {"account_id": ids.tolist(), "balance": balances.tolist()})
+        expire_balances()
+
+    WithdrawalCounter.query.delete()
+    db.session.bulk_insert_mappings(WithdrawalCounter, [
+        {"account_id": account_id, "year": year, "month": month, "count": count}
+        for account_id, year, month, count in zip(*(column.tolist() for column in replayed["counters"]))
+    ])
+
+
+def _note_new_transactions(session, flush_context):
+    if any(isinstance(instance, Transaction) for instance in session.new):
+        mark_pending(session)
+
+
+def _forget_new_transactions(session, transaction):
+    # A savepoint rolling back leaves transactions written outside it pending
+    if transaction.parent is None:
+        session.info.pop("ledger_pending", None)
+
+
+def _append_committed(session):
+    # Savepoints being released fire after_commit too, but nothing is visible to the ledger's connection until the outermost commit
+    if session.transaction is not None and session.transaction.parent is not None:
+        return
+    if not session.info.pop("ledger_pending", False):
+        return
+    try:
+        sync()
+    except Exception:
+        # The transaction is already committed, and will be appended by the next sync
+        logger.exception("Failed to append committed transactions to ledger")
+
+
+def mark_pending(session=None):
+    """Notes that transactions were written in session, so that they're appended to the ledger once it commits.
+
+    Transactions added through the ORM are noticed on flush. Writes bypassing it must call this.
+
+    Keyword Arguments:
+        session {Session} -- Session transactions were written in (default: {db.session})
+    """
+    (session or db.session).info["ledger_pending"] = True
+
+
+def listen(session):
+    """Appends transactions to the ledger whenever a session commits any
+
+    Arguments:
+        session {Session} -- Session, scoped session or session class to listen to
+    """
+    sa.event.listen(session, "after_flush", _note_new_transactions)
+    sa.event.listen(session, "after_commit", _append_committed)
+    sa.event.listen(session, "after_transaction_end", _forget_new_transactions)
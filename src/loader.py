@@ -0,0 +1,333 @@
+"""Bulk loading of users, account configs, accounts, transactions and checks into a bank, from CSV or Parquet files.
+
+Files are read and validated row by row, and rows are inserted with executemany LOAD_BATCH_SIZE at a time, all in one database
+transaction, so that a file failing validation leaves nothing loaded. No ORM objects are created. Balances and withdrawal
+counters of the loaded accounts are computed from the loaded transactions with one statement each once all files are in.
+
+Rows refer to each other by the ids in the files (e.g. the user_id of an account is the id of a row in the users file). Loaded rows
+are given those ids plus the largest id in their table before the load, so that no mapping from file ids to new ids has to be kept.
+"""
+import csv
+import os
+import time
+from datetime import datetime
+
+import sqlalchemy as sa
+
+import config
+from app import db
+from bulk import execute_many
+from cache import bump_versions
+from ledger import mark_pending
+from models import Account, AccountConfig, Check, Transaction, User, WithdrawalCounter
+from money import parse_money, to_cents
+
+
+class LoadError(ValueError):
+    """Raised when a row of an input file is invalid
+    """
+    def __init__(self, path, line, message):
+        super().__init__("{}:{}: {}".format(path, line, message))
+
+
+def read_rows(path, batch_size=config.LOAD_BATCH_SIZE):
+    """Reads rows of a CSV file, or of a Parquet file if its name ends with .parquet (which requires pyarrow)
+
+    Arguments:
+        path {str} -- File to read
+
+    Keyword Arguments:
+        batch_size {int} -- Number of rows read from Parquet files at a time (default: {config.LOAD_BATCH_SIZE})
+
+    Yields:
+        tuple -- Line number, and dict of values by column name
+    """
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError("Reading Parquet files requires pyarrow")
+        line = 0
+        for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=batch_size):
+            for row in batch.to_pylist():
+                line += 1
+                yield line, row
+    else:
+        with open(path, newline="") as file:
+            # Line numbers count the header
+            yield from enumerate(csv.DictReader(file), 2)
+
+
+def _blank(value):
+    return value is None or value == ""
+
+
+def _integer(value):
+    if isinstance(value, bool):
+        raise ValueError("Not an integer")
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError("Not an integer")
+    return int(value)
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ("1", "true", "t", "yes", "y"):
+        return True
+    if text in ("0", "false", "f", "no", "n"):
+        return False
+    raise ValueError("Not a boolean")
+
+
+def _timestamp(value):
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+def _credit_score(value):
+    return str(_integer(value))
+
+
+def _cents(value):
+    return to_cents(parse_money(value))
+
+
+class _Table:
+    """Loads rows of one input file into one table
+
+    Arguments:
+        table {Table} -- Table to insert into
+        fields {dict} -- Parser of each field read from the file, by column name. Fields are named in files without leading underscores.
+        defaults {dict} -- Values of fields that are optional in the file, or of columns not in it
+    """
+    def __init__(self, table, fields, defaults):
+        self.table = table
+        self.fields = fields
+        self.defaults = defaults
+        self.columns = list(fields) + [name for name in defaults if name not in fields]
+        self.insert = table.insert().values({name: sa.bindparam(name) for name in self.columns})
+
+    def parse(self, path, line, row):
+        """Validates and converts a row of the file to the values to insert
+
+        Raises:
+            LoadError: Row is missing a required field, or has an invalid value
+
+        Returns:
+            dict -- Values by column name
+        """
+        values = {}
+        for name, parse in self.fields.items():
+            field = name.lstrip("_")
+            value = row.get(field)
+            if _blank(value):
+                if name not in self.defaults:
+                    raise LoadError(path, line, "Missing {}".format(field))
+                value = self.defaults[name]
+            else:
+                try:
+                    value = parse(value)
+                except (TypeError, ValueError, ArithmeticError) as e:
+                    raise LoadError(path, line, "Invalid {} {!r}: {}".format(field, value, e))
+            values[name] = value
+        for name in self.columns:
+            if name not in values:
+                values[name] = self.defaults[name]
+        return values
+
+
+class Loader:
+    """Loads files into a bank, within the current database transaction
+
+    Arguments:
+        bank_id {int} -- Bank to load into
+
+    Keyword Arguments:
+        batch_size {int} -- Number of rows inserted by each executemany (default: {config.LOAD_BATCH_SIZE})
+        progress {function} -- Called with the kind of rows, number loaded so far and seconds spent loading them, after each batch (default: {None})
+    """
+    def __init__(self, bank_id, batch_size=config.LOAD_BATCH_SIZE, progress=None):
+        self.bank_id = bank_id
+        self.batch_size = batch_size
+        self.progress = progress
+        self.connection = db.session.connection()
+        dialect = self.connection.dialect
+        self._bind_datetime = sa.DateTime().dialect_impl(dialect).bind_processor(dialect) or (lambda value: value)
+        self._bind_boolean = sa.Boolean().dialect_impl(dialect).bind_processor(dialect) or (lambda value: value)
+
+        def offset(model):
+            return self.connection.execute(sa.select([sa.func.coalesce(sa.func.max(model.id), 0)])).scalar()
+        self.offsets = {model: offset(model) for model in (User, AccountConfig, Account)}
+        self.loaded = {model: set() for model in (User, AccountConfig, Account)}
+        self.counts = {}
+
+    def _reference(self, model, path, line, value):
+        """Converts id in a file to the id the referenced row is loaded with, checking the row was loaded
+        """
+        if value not in self.loaded[model]:
+            raise LoadError(path, line, "No {} with id {} was loaded".format(model.__tablename__, value))
+        return self.offsets[model] + value
+
+    def _identify(self, model, path, line, values):
+        """Gives a row of a file its id in the database, checking it's unique
+        """
+        source_id = values["id"]
+        if source_id < 1:
+            raise LoadError(path, line, "Ids must be positive")
+        if source_id in self.loaded[model]:
+            raise LoadError(path, line, "Duplicate id {}".format(source_id))
+        self.loaded[model].add(source_id)
+        values["id"] = self.offsets[model] + source_id
+
+    def _load(self, kind, path, loader, validate):
+        """Parses, validates and inserts rows of a file in batches
+
+        Arguments:
+            kind {str} -- Kind of rows, as reported to progress
+            path {str} -- File to load
+            loader {_Table} -- Table to insert parsed rows into
+            validate {function} -- Called with line number and parsed values of each row, to check references and finish converting them
+
+        Returns:
+            int -- Number of rows loaded
+        """
+        began = time.perf_counter()
+        count = 0
+        batch = {name: [] for name in loader.columns}
+        for line, row in read_rows(path, self.batch_size):
+            values = loader.parse(path, line, row)
+            validate(line, values)
+            for name in loader.columns:
+                batch[name].append(values[name])
+            count += 1
+            if count % self.batch_size == 0:
+                execute_many(self.connection, loader.insert, batch)
+                batch = {name: [] for name in loader.columns}
+                self._report(kind, count, began)
+        if count % self.batch_size or not count:
+            if count:
+                execute_many(self.connection, loader.insert, batch)
+            self._report(kind, count, began)
+        self.counts[kind] = count
+        return count
+
+    def _report(self, kind, count, began):
+        if self.progress is not None:
+            self.progress(kind, count, time.perf_counter() - began)
+
+    def load_users(self, path):
+        """Loads users, with columns id, fname, lname and optionally credit_score
+        """
+        loader = _Table(User.__table__, {"id": _integer, "fname": str, "lname": str, "credit_score": _credit_score}, {
+            "credit_score": str(config.USA_AVERAGE_FICO_CREDIT_SCORE), "_is_superuser": self._bind_boolean(False)})
+
+        def validate(line, values):
+            self._identify(User, path, line, values)
+        return self._load("users", path, loader, validate)
+
+    def load_account_configs(self, path):
+        """Loads account configs, with columns id, name, is_savings, is_checking, min_opening_balance, interest,
+        deposit_fee, withdrawal_fee, allow_overdraft, overdraft_limit and overdraft_fee
+        """
+        loader = _Table(AccountConfig.__table__, {
+            "id": _integer, "name": str, "is_savings": _boolean, "is_checking": _boolean, "min_opening_balance": _cents, "interest": float,
+            "deposit_fee": _cents, "withdrawal_fee": _cents, "allow_overdraft": _boolean, "overdraft_limit": _cents, "overdraft_fee": _cents,
+        }, {"bank_id": self.bank_id})
+
+        def validate(line, values):
+            if values["is_savings"] == values["is_checking"]:
+                raise LoadError(path, line, "Account can't be both savings and checkings.")
+            self._identify(AccountConfig, path, line, values)
+            for name in ("is_savings", "is_checking", "allow_overdraft"):
+                values[name] = self._bind_boolean(values[name])
+        return self._load("account configs", path, loader, validate)
+
+    def load_accounts(self, path):
+        """Loads accounts, with columns id, user_id, config_id and optionally closed. Balances are computed by finish.
+        """
+        loader = _Table(Account.__table__, {"id": _integer, "user_id": _integer, "config_id": _integer, "_closed": _boolean}, {
+            "_closed": False, "bank_id": self.bank_id, "_balance": 0, "version": 1})
+
+        def validate(line, values):
+            values["user_id"] = self._reference(User, path, line, values["user_id"])
+            values["config_id"] = self._reference(AccountConfig, path, line, values["config_id"])
+            values["_closed"] = self._bind_boolean(values["_closed"])
+            self._identify(Account, path, line, values)
+        return self._load("accounts", path, loader, validate)
+
+    def load_transactions(self, path):
+        """Loads transactions, with columns account_id, cash_amount, datetime, and optionally fees, check_amount and description.
+        Transactions with a negative cash amount are withdrawals, as when made through the API.
+        """
+        loader = _Table(Transaction.__table__, {
+            "account_id": _integer, "cash_amount": _cents, "fees": _cents, "_check_amount": _cents, "description": str, "datetime": _timestamp,
+        }, {"fees": 0, "_check_amount": 0, "description": "", "is_withdrawal": False})
+
+        def validate(line, values):
+            values["account_id"] = self._reference(Account, path, line, values["account_id"])
+            values["datetime"] = self._bind_datetime(values["datetime"])
+            values["is_withdrawal"] = self._bind_boolean(values["cash_amount"] < 0)
+        count = self._load("transactions", path, loader, validate)
+        mark_pending()
+        return count
+
+    def load_checks(self, path):
+        """Loads checks, with columns issuing_account_id, payable_to, amount, and optionally void, deposited, cleared and returned
+        """
+        loader = _Table(Check.__table__, {
+            "issuing_account_id": _integer, "payable_to": str, "amount": _cents,
+            "_void": _boolean, "_deposited": _boolean, "_cleared": _boolean, "_returned": _boolean,
+        }, {"_void": False, "_deposited": False, "_cleared": False, "_returned": False, "transaction_id": None, "clearing_id": None})
+
+        def validate(line, values):
+            values["issuing_account_id"] = self._reference(Account, path, line, values["issuing_account_id"])
+            for name in ("_void", "_deposited", "_cleared", "_returned"):
+                values[name] = self._bind_boolean(values[name])
+        return self._load("checks", path, loader, validate)
+
+    def finish(self):
+        """Computes balances and withdrawal counters of the loaded accounts from their transactions
+        """
+        if not self.loaded[Account]:
+            return
+        loaded = sa.and_(Account.bank_id == self.bank_id, Account.id > self.offsets[Account])
+        cents = sa.type_coerce(Transaction.cash_amount, sa.Integer) + sa.type_coerce(Transaction._check_amount, sa.Integer) \
+            - sa.type_coerce(Transaction.fees, sa.Integer)
+        balance = sa.select([sa.func.coalesce(sa.func.sum(cents), 0)]).where(Transaction.account_id == Account.id).as_scalar()
+        self.connection.execute(Account.__table__.update().where(loaded).values(_balance=balance))
+
+        withdrawals = WithdrawalCounter.tally(sa.select([Account.id]).where(loaded)).statement
+        self.connection.execute(WithdrawalCounter.__table__.insert().from_select(["account_id", "year", "month", "count"], withdrawals))
+
+        # Cached lists of account configs don't have the loaded ones
+        if self.loaded[AccountConfig]:
+            bump_versions("account_configs")
+
+
+def bulk_load(bank_id, users=None, account_configs=None, accounts=None, transactions=None, checks=None, batch_size=config.LOAD_BATCH_SIZE, progress=None):
+    """Loads files into a bank, in the current database transaction, which the caller commits
+
+    Arguments:
+        bank_id {int} -- Bank to load into
+
+    Keyword Arguments:
+        users, account_configs, accounts, transactions, checks {str} -- Files to load (default: {None})
+        batch_size {int} -- Number of rows inserted by each executemany (default: {config.LOAD_BATCH_SIZE})
+        progress {function} -- See Loader (default: {None})
+
+    Raises:
+        LoadError: A row of a file is invalid
+
+    Returns:
+        dict -- Number of rows loaded by kind
+    """
+    loader = Loader(bank_id, batch_size, progress)
+    for path, load in ((users, loader.load_users), (account_configs, loader.load_account_configs), (accounts, loader.load_accounts),
+                       (transactions, loader.load_transactions), (checks, loader.load_checks)):
+        if path is not None:
+            if not os.path.exists(path):
+                raise ValueError("{} doesn't exist".format(path))
+            load(path)
+    loader.finish()
+    return loader.counts
@@ -0,0 +1,285 @@
+"""Request and database metrics, exposed in the Prometheus text format at /metrics.
+
+Each thread records into its own shard of metric values, so recording never takes a lock. A lock is only taken when a thread
+records for the first time, which is also when shards of threads that have exited are folded into a retired total,
+and when metrics are exposed, which sums the retired total with the shards of live threads.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, request
+from sqlalchemy import event
+from sqlalchemy.engine import ResultProxy
+
+import config
+
+_request = threading.local()
+
+
+class Registry:
+    """Metrics of the process, sharded by thread
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = {}
+        self._retired = {}
+        self._metrics = {}
+
+    def register(self, metric):
+        """Adds metric to exposition
+
+        Arguments:
+            metric {Counter, Histogram} -- Metric recording into this registry
+
+        Returns:
+            Counter, Histogram -- The metric
+        """
+        self._metrics[metric.name] = metric
+        return metric
+
+    def shard(self):
+        """Gets this thread's shard of metric values, which only this thread writes to
+
+        Returns:
+            dict -- List of values by metric name and label values
+        """
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._retire_exited()
+                self._shards[threading.current_thread()] = shard
+        return shard
+
+    def _retire_exited(self):
+        for thread in [thread for thread in self._shards if not thread.is_alive()]:
+            self._merge(self._retired, self._shards.pop(thread))
+
+    @staticmethod
+    def _merge(totals, shard):
+        for key, values in list(shard.items()):
+            total = totals.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                total[i] += value
+
+    def collect(self):
+        """Sums metric values of all threads
+
+        Returns:
+            dict -- List of values by metric name and label values
+        """
+        with self._lock:
+            self._retire_exited()
+            totals = {key: list(values) for key, values in self._retired.items()}
+            for shard in list(self._shards.values()):
+                self._merge(totals, shard)
+        return totals
+
+    def expose(self):
+        """Renders all metrics in the Prometheus text format
+
+        Returns:
+            str -- Metrics exposition
+        """
+        totals = self.collect()
+        lines = []
+        for name, metric in self._metrics.items():
+            lines += metric.expose(sorted((labels, values) for (metric_name, labels), values in totals.items() if metric_name == name))
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"')) for name, value in pairs) + "}"
+
+
+class Counter:
+    """Monotonically increasing count
+    """
+    def __init__(self, registry, name, documentation, labels=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        registry.register(self)
+
+    def inc(self, label_values=(), amount=1):
+        """Increments count of the given label values
+
+        Keyword Arguments:
+            label_values {tuple} -- Values of the counter's labels (default: {()})
+            amount {int} -- Amount to add (default: {1})
+        """
+        shard = self.registry.shard()
+        key = (self.name, label_values)
+        values = shard.get(key)
+        if values is None:
+            values = shard[key] = [0]
+        values[0] += amount
+
+    def expose(self, samples):
+        lines = ["# HELP {} {}".format(self.name, self.documentation), "# TYPE {} counter".format(self.name)]
+        for label_values, (count,) in samples:
+            lines.append("{}{} {}".format(self.name, _format_labels(self.labels, label_values), count))
+        return lines
+
+
+class Histogram:
+    """Distribution of observed values over fixed buckets
+    """
+    def __init__(self, registry, name, documentation, buckets, labels=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.labels = labels
+        registry.register(self)
+
+    def observe(self, value, label_values=()):
+        """Records an observation
+
+        Arguments:
+            value {float} -- Observed value
+
+        Keyword Arguments:
+            label_values {tuple} -- Values of the histogram's labels (default: {()})
+        """
+        shard = self.registry.shard()
+        key = (self.name, label_values)
+        values = shard.get(key)
+        if values is None:
+            # Count of each bucket, then of values above all buckets, then sum and count of all values
+            values = shard[key] = [0] * (len(self.buckets) + 3)
+        values[bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def expose(self, samples):
+        lines = ["# HELP {} {}".format(self.name, self.documentation), "# TYPE {} histogram".format(self.name)]
+        for label_values, values in samples:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values):
+                cumulative += count
+                lines.append("{}_bucket{} {}".format(self.name, _format_labels(self.labels, label_values, [("le", bound)]), cumulative))
+            lines.append("{}_sum{} {}".format(self.name, _format_labels(self.labels, label_values), values[-2]))
+            lines.append("{}_count{} {}".format(self.name, _format_labels(self.labels, label_values), values[-1]))
+        return lines
+
+
+registry = Registry()
+
+REQUESTS = Counter(registry, "http_requests_total", "Requests handled, by route and status code.", ("route", "method", "status"))
+REQUEST_DURATION = Histogram(
+    registry, "http_request_duration_seconds", "Time taken to handle requests, by route.", config.METRICS_LATENCY_BUCKETS, ("route", "method"))
+REQUEST_STATEMENTS = Histogram(
+    registry, "db_statements_per_request", "SQL statements executed per request, by route.", config.METRICS_COUNT_BUCKETS, ("route", "method"))
+REQUEST_ROWS = Histogram(
+    registry, "db_rows_fetched_per_request", "Rows fetched from SQL results per request, by route.", config.METRICS_COUNT_BUCKETS, ("route", "method"))
+COMMIT_DURATION = Histogram(
+    registry, "db_commit_duration_seconds", "Time taken to flush and commit sessions, by route.", config.METRICS_LATENCY_BUCKETS, ("route", "method"))
+
+
+def _route():
+    """Gets route and method labels of the request being handled by this thread, or None outside of requests
+    """
+    return getattr(_request, "route", None)
+
+
+def _begin_request():
+    _request.route = (request.url_rule.rule if request.url_rule else "unmatched", request.method)
+    _request.statements = 0
+    _request.rows = 0
+    _request.start = time.perf_counter()
+
+
+def _end_request(response):
+    route = _route()
+    if route is not None:
+        REQUEST_DURATION.observe(time.perf_counter() - _request.start, route)
+        REQUEST_STATEMENTS.observe(_request.statements, route)
+        REQUEST_ROWS.observe(_request.rows, route)
+        REQUESTS.inc(route + (str(response.status_code),))
+        _request.route = None
+    return response
+
+
+def _abandon_request(exception):
+    _request.route = None
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if _route() is not None:
+        _request.statements += 1
+
+
+def _count_rows(count):
+    if _route() is not None:
+        _request.rows += count
+
+
+class _CountingResultProxy(ResultProxy):
+    """Result counting the rows fetched from it
+    """
+    def _fetchone_impl(self):
+        row = super()._fetchone_impl()
+        if row is not None:
+            _count_rows(1)
+        return row
+
+    def _fetchmany_impl(self, size=None):
+        rows = super()._fetchmany_impl(size)
+        _count_rows(len(rows))
+        return rows
+
+    def _fetchall_impl(self):
+        rows = super()._fetchall_impl()
+        _count_rows(len(rows))
+        return rows
+
+
+def _counting_execution_context(context_class):
+    """Subclasses dialect's execution context to return results that count their rows
+    """
+    def get_result_proxy(self):
+        if self._is_server_side:
+            return context_class.get_result_proxy(self)
+        return _CountingResultProxy(self)
+    return type("Counting" + context_class.__name__, (context_class,), {"get_result_proxy": get_result_proxy})
+
+
+def _begin_commit(session):
+    _request.commit_start = time.perf_counter()
+
+
+def _end_commit(session):
+    start = getattr(_request, "commit_start", None)
+    route = _route()
+    if start is not None and route is not None:
+        COMMIT_DURATION.observe(time.perf_counter() - start, route)
+    _request.commit_start = None
+
+
+def _metrics_view():
+    return Response(registry.expose(), mimetype="text/plain; version=0.0.4")
+
+
+def instrument(app, engine, session):
+    """Records metrics of app's requests and engine's statements, and exposes them at /metrics
+
+    Arguments:
+        app {Flask} -- App to time requests of
+        engine {Engine} -- Engine to count statements and rows of
+        session {Session} -- Session, scoped session or session class to time commits of
+    """
+    app.before_request(_begin_request)
+    app.after_request(_end_request)
+    app.teardown_request(_abandon_request)
+    event.listen(engine, "after_cursor_execute", _count_statement)
+    engine.dialect.execution_ctx_cls = _counting_execution_context(engine.dialect.execution_ctx_cls)
+    event.listen(session, "before_commit", _begin_commit)
+    event.listen(session, "after_commit", _end_commit)
+    app.add_url_rule("/metrics", "metrics", _metrics_view)
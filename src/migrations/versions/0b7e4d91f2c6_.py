@@ -0,0 +1,42 @@
+"""store monetary amounts as integer cents
+
+Revision ID: 0b7e4d91f2c6
+Revises: 5c8d0e2b7a19
+Create Date: 2026-10-18 15:12:03.552917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b7e4d91f2c6'
+down_revision = '5c8d0e2b7a19'
+branch_labels = None
+depends_on = None
+
+
+MONEY_COLUMNS = {
+    'account_config': ('min_opening_balance', 'deposit_fee', 'withdrawal_fee', 'overdraft_limit', 'overdraft_fee'),
+    'account': ('_balance',),
+    'transaction': ('cash_amount', 'fees', '_check_amount'),
+    'check': ('amount',),
+    'balance_checkpoint': ('balance',),
+}
+
+
+def upgrade():
+    for table, columns in MONEY_COLUMNS.items():
+        # Round before changing the type, since casting truncates (e.g. 12.99 * 100 is stored as 1298.9999...)
+        op.execute('UPDATE "{}" SET {}'.format(table, ", ".join('"{0}" = ROUND("{0}" * 100)'.format(column) for column in columns)))
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                batch_op.alter_column(column, existing_type=sa.Float(), type_=sa.Integer(), existing_nullable=False)
+
+
+def downgrade():
+    for table, columns in MONEY_COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                batch_op.alter_column(column, existing_type=sa.Integer(), type_=sa.Float(), existing_nullable=False)
+        op.execute('UPDATE "{}" SET {}'.format(table, ", ".join('"{0}" = "{0}" / 100.0'.format(column) for column in columns)))
@@ -0,0 +1,24 @@
+"""drop redundant transaction account index
+
+Revision ID: d1e3f5a7c9b0
+Revises: c4f6a8e0b2d9
+Create Date: 2026-10-19 11:04:21.873310
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd1e3f5a7c9b0'
+down_revision = 'c4f6a8e0b2d9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ix_transaction_account_id_datetime already serves lookups by account
+    op.drop_index(op.f('ix_transaction_account_id'), table_name='transaction')
+
+
+def downgrade():
+    op.create_index(op.f('ix_transaction_account_id'), 'transaction', ['account_id'], unique=False)
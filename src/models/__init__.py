@@ -1,15 +1,19 @@
-from .accounts import Account, AccountConfig
-from .bank import Bank, BankBranch, Staff
+from .accounts import Account, AccountConfig, BalanceCheckpoint, WithdrawalCounter
+from .bank import Bank, BankBranch, CheckClearing, InterestAccrual, Staff
 from .financial_instruments import Check, Transaction
 from .user import User
 
 __all__ = (
     Account,
     AccountConfig,
+    BalanceCheckpoint,
     Bank,
     BankBranch,
     Check,
+    CheckClearing,
+    InterestAccrual,
     Staff,
     Transaction,
-    User
+    User,
+    WithdrawalCounter
 )
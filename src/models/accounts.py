@@ -1,6 +1,11 @@
 from datetime import datetime
 
+import config
 from app import db
+from cache import ReferenceCache
+from money import Money
+
+from .financial_instruments import Transaction
 
 
 class AccountConfig(db.Model):
@@ -11,17 +16,17 @@ class AccountConfig(db.Model):
     is_savings = db.Column(db.Boolean, nullable=False)
     is_checking = db.Column(db.Boolean, nullable=False)
 
-    min_opening_balance = db.Column(db.Float, nullable=False)
+    min_opening_balance = db.Column(Money, nullable=False)
     interest = db.Column(db.Float, nullable=False)
 
-    deposit_fee = db.Column(db.Float, nullable=False)
-    withdrawal_fee = db.Column(db.Float, nullable=False)
+    deposit_fee = db.Column(Money, nullable=False)
+    withdrawal_fee = db.Column(Money, nullable=False)
 
     allow_overdraft = db.Column(db.Boolean, nullable=False)
-    overdraft_limit = db.Column(db.Float, nullable=False)
-    overdraft_fee = db.Column(db.Float, nullable=False)
+    overdraft_limit = db.Column(Money, nullable=False)
+    overdraft_fee = db.Column(Money, nullable=False)
 
-    bank_id = db.Column(db.Integer, db.ForeignKey('bank.id'), nullable=False)
+    bank_id = db.Column(db.Integer, db.ForeignKey('bank.id'), nullable=False, index=True)
 
     accounts = db.relationship('Account', backref='config', lazy=True)
 
@@ -51,6 +56,13 @@ class AccountConfig(db.Model):
         return self.name
 
 
+AccountConfig.cache = ReferenceCache(
+    "account_config",
+    lambda account_config_id: db.session.query(*AccountConfig.__table__.columns).filter(AccountConfig.id == account_config_id).first(),
+    maxsize=config.REFERENCE_CACHE_SIZE
+)
+
+
 class Account(db.Model):
     """Database model representing account.
     """
@@ -64,21 +76,43 @@ class Account(db.Model):
 
     transactions = db.relationship('Transaction', backref='account', lazy=True)
 
-    _balance = db.Column(db.Float, nullable=False, default=0)
+    withdrawal_counters = db.relationship('WithdrawalCounter', backref='account', lazy=True)
+
+    balance_checkpoints = db.relationship('BalanceCheckpoint', backref='account', lazy=True)
+
+    _balance = db.Column(Money, nullable=False, default=0)
 
     _closed = db.Column(db.Boolean, nullable=False, default=False)
 
+    # Incremented by every update, which only applies if the version is still the one read, so that concurrent updates can't be lost
+    version = db.Column(db.Integer, nullable=False)
+
     JSON_ATTRIBUTES = ("user", "bank", "config", "balance")
+    JSON_EAGER_LOAD = ("user", "bank", "config")
+
+    __table_args__ = (db.Index('ix_account_bank_id_closed', 'bank_id', '_closed'),)
+    __mapper_args__ = {"version_id_col": version}
 
     @property
     def balance(self):
         """Encapsulates balance
 
         Returns:
-            float -- Account instance balance
+            Decimal -- Account instance balance
         """
         return self._balance
 
+    @property
+    def rules(self):
+        """Gets account config's fees, limits and type from the reference data cache, rather than loading the config
+
+        Returns:
+            tuple -- Named tuple of account config column values (or account config itself, if the account isn't saved yet)
+        """
+        if self.config_id is None:
+            return self.config
+        return AccountConfig.cache.get(self.config_id)
+
     @property
     def closed(self):
         """Encapsulates closed
@@ -89,32 +123,99 @@ class Account(db.Model):
         return self._closed
 
     @property
-    def withdrawals_last_month(self):
-        """Calculates withdrawals during last calendar month
+    def withdrawals_this_month(self):
+        """Looks up number of withdrawals during current calendar month from the maintained counter
 
         Returns:
-            int -- number of withdrawals during last calendar month
-        """
-        count = 0
-        i = len(self.transactions) - 1
-        while i >= 0 and (datetime.now() - self.transactions[i].datetime).days / 31 < 1:
-            i -= 1
-            if self.transactions[i].total_amount < 0:
-                # Withdrawal, so increment counter
-                count += 1
-        return count
-
-    def audit(self):
+            int -- number of withdrawals during current calendar month
+        """
+        counter = self.get_withdrawal_counter(datetime.now())
+        return counter.count if counter else 0
+
+    def get_withdrawal_counter(self, when):
+        """Gets withdrawal counter for the calendar month containing a given datetime
+
+        Arguments:
+            when {datetime} -- Any datetime in the calendar month
+
+        Returns:
+            WithdrawalCounter -- Counter instance, or None if no withdrawals were made that month
+        """
+        if self.id is None:
+            return None
+        return WithdrawalCounter.query.filter_by(account_id=self.id, year=when.year, month=when.month).first()
+
+    def record_withdrawal(self, transaction):
+        """Increments withdrawal counter for the calendar month of a withdrawal transaction
+
+        Arguments:
+            transaction {Transaction} -- Withdrawal transaction made from this account
+        """
+        when = transaction.datetime or datetime.now()
+        counter = self.get_withdrawal_counter(when)
+        if counter is None:
+            counter = WithdrawalCounter(account=self, year=when.year, month=when.month, count=0)
+            db.session.add(counter)
+        counter.count += 1
+
+    def audit(self, full=False):
         """Audits account to ensure that balance attribute matches transaction log
 
+        Keyword Arguments:
+            full {bool} -- Whether to verify the whole transaction log instead of starting from the latest checkpoint (default: {False})
+
         Raises:
             Exception: Balance doesn't match up with transaction
         """
-        try:
-            assert self._balance == sum([transaction.total_amount for transaction in self.transactions if not transaction.undone])
-        except AssertionError:
+        if self.id in Account.audit_accounts(Account.query.filter_by(id=self.id), full=full):
             raise Exception("Balance doesn't match up with transactions")
 
+    @classmethod
+    def audit_accounts(cls, accounts, full=False):
+        """Audits many accounts at once, checkpointing balances of accounts that pass.
+
+        Only transactions made since each account's latest balance checkpoint are summed, unless full verification is requested.
+
+        Arguments:
+            accounts {Query} -- Query of accounts to audit
+
+        Keyword Arguments:
+            full {bool} -- Whether to verify the whole transaction log instead of starting from the latest checkpoints (default: {False})
+
+        Returns:
+            list[int] -- Ids of accounts whose balance doesn't match up with their transactions
+        """
+        account_ids = accounts.with_entities(cls.id).subquery()
+        latest = db.session.query(
+            BalanceCheckpoint.account_id,
+            db.func.max(BalanceCheckpoint.last_transaction_id).label("last_transaction_id")
+        ).filter(BalanceCheckpoint.account_id.in_(account_ids)).group_by(BalanceCheckpoint.account_id).subquery()
+
+        checkpoints = {
+            checkpoint.account_id: checkpoint for checkpoint in BalanceCheckpoint.query.join(latest, db.and_(
+                BalanceCheckpoint.account_id == latest.c.account_id,
+                BalanceCheckpoint.last_transaction_id == latest.c.last_transaction_id))
+        }
+
+        deltas = db.session.query(Transaction.account_id, db.func.sum(Transaction.total_amount), db.func.max(Transaction.id)) \
+            .filter(Transaction.account_id.in_(account_ids))
+        if not full:
+            deltas = deltas.outerjoin(latest, Transaction.account_id == latest.c.account_id) \
+                .filter(Transaction.id > db.func.coalesce(latest.c.last_transaction_id, 0))
+        deltas = {account_id: (amount, last_transaction_id) for account_id, amount, last_transaction_id in deltas.group_by(Transaction.account_id)}
+
+        failed = []
+        for account_id, balance in accounts.with_entities(cls.id, cls._balance):
+            checkpoint = checkpoints.get(account_id)
+            expected = checkpoint.balance if checkpoint and not full else 0
+            amount, last_transaction_id = deltas.get(account_id, (0, None))
+            expected += amount
+            if balance != expected:
+                failed.append(account_id)
+            elif last_transaction_id is not None and not (checkpoint and checkpoint.last_transaction_id == last_transaction_id):
+                db.session.add(BalanceCheckpoint(account_id=account_id, last_transaction_id=last_transaction_id, balance=expected))
+        return failed
+
     def close(self):
         """Encapsulates closing account
         """
@@ -135,3 +236,79 @@ class Account(db.Model):
             str -- String representation of account
         """
         return "{} #{}".format(self.config, self.id)
+
+
+class WithdrawalCounter(db.Model):
+    """Database model representing number of withdrawals made from an account during a calendar month.
+
+    Maintained as withdrawals are made so that Regulation D limits can be checked without scanning the transaction log.
+    """
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.UniqueConstraint('account_id', 'year', 'month'),)
+
+    @classmethod
+    def tally(cls, account_ids=None):
+        """Counts withdrawals from the transaction log, as the transactions marked as withdrawals when made
+
+        Keyword Arguments:
+            account_ids {Query} -- Only count withdrawals of these accounts (default: {None, all accounts})
+
+        Returns:
+            Query -- Account id, year, month and number of withdrawals of each account in each calendar month with any
+        """
+        year = db.extract('year', Transaction.datetime)
+        month = db.extract('month', Transaction.datetime)
+        query = db.session.query(Transaction.account_id, year, month, db.func.count(Transaction.id)) \
+            .filter(Transaction.account_id.isnot(None), Transaction.is_withdrawal == db.true())
+        if account_ids is not None:
+            query = query.filter(Transaction.account_id.in_(account_ids))
+        return query.group_by(Transaction.account_id, year, month)
+
+    @classmethod
+    def rebuild(cls):
+        """Recomputes all withdrawal counters from the transaction log
+
+        Returns:
+            int -- Number of counters written
+        """
+        rows = cls.tally().all()
+
+        cls.query.delete()
+        db.session.bulk_insert_mappings(cls, [
+            {"account_id": account_id, "year": year, "month": month, "count": count}
+            for account_id, year, month, count in rows
+        ])
+        return len(rows)
+
+    def __repr__(self):
+        """String representation of withdrawal counter
+
+        Returns:
+            str -- String representation of withdrawal counter
+        """
+        return "{} Withdrawals {}/{}: {}".format(self.account, self.month, self.year, self.count)
+
+
+class BalanceCheckpoint(db.Model):
+    """Database model representing an audited account balance as of a given transaction.
+
+    Audits start from the latest checkpoint, so only transactions made since then have to be summed.
+    """
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
+    last_transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'), nullable=False)
+    balance = db.Column(Money, nullable=False)
+    datetime = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (db.Index('ix_balance_checkpoint_account_id_last_transaction_id', 'account_id', 'last_transaction_id'),)
+
+    def __repr__(self):
+        """String representation of balance checkpoint
+
+        Returns:
+            str -- String representation of balance checkpoint
+        """
+        return "{} Checkpoint at Transaction #{}: {}".format(self.account, self.last_transaction_id, self.balance)
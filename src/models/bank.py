@@ -1,5 +1,11 @@
+from datetime import datetime
+
 import config
 from app import db
+from cache import ReferenceCache
+from money import Money
+
+from .accounts import Account
 
 
 class Bank(db.Model):
@@ -11,9 +17,22 @@ class Bank(db.Model):
     branches = db.relationship('BankBranch', backref="bank", lazy=True)
     account_configs = db.relationship('AccountConfig', backref='bank', lazy=True)
     accounts = db.relationship('Account', backref='bank', lazy=True)
+    interest_accruals = db.relationship('InterestAccrual', backref='bank', lazy=True)
+    check_clearings = db.relationship('CheckClearing', backref='bank', lazy=True)
 
     JSON_ATTRIBUTES = ("name",)
 
+    def audit(self, full=False):
+        """Audits all accounts at bank, checkpointing balances of accounts that pass
+
+        Keyword Arguments:
+            full {bool} -- Whether to verify whole transaction logs instead of starting from the latest checkpoints (default: {False})
+
+        Returns:
+            list[int] -- Ids of accounts whose balance doesn't match up with their transactions
+        """
+        return Account.audit_accounts(Account.query.filter_by(bank_id=self.id), full=full)
+
     def __repr__(self):
         """Verbose representation of bank instance
 
@@ -23,15 +42,73 @@ class Bank(db.Model):
         return self.name
 
 
+Bank.cache = ReferenceCache(
+    "bank",
+    lambda bank_id: db.session.query(Bank.id, Bank.name).filter(Bank.id == bank_id).first(),
+    maxsize=config.REFERENCE_CACHE_SIZE
+)
+
+
+class InterestAccrual(db.Model):
+    """Database model representing a month-end interest run at a bank.
+
+    At most one run is recorded per bank and calendar month, so that interest can't be paid twice.
+    """
+    bank_id = db.Column(db.Integer, db.ForeignKey('bank.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    datetime = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    account_count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(Money, nullable=False, default=0)
+
+    __table_args__ = (db.UniqueConstraint('bank_id', 'year', 'month'),)
+
+    JSON_ATTRIBUTES = ("bank", "year", "month", "datetime", "account_count", "total")
+    JSON_EAGER_LOAD = ("bank",)
+
+    def __repr__(self):
+        """Verbose representation of interest accrual instance
+
+        Returns:
+            str -- Verbose representation of interest accrual instance
+        """
+        return "{} Interest {}/{}: {}".format(self.bank, self.month, self.year, self.total)
+
+
+class CheckClearing(db.Model):
+    """Database model representing a clearing run, which settles checks drawn on a bank's accounts that have been deposited since the last run.
+    """
+    bank_id = db.Column(db.Integer, db.ForeignKey('bank.id'), nullable=False, index=True)
+    datetime = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    account_count = db.Column(db.Integer, nullable=False, default=0)
+    check_count = db.Column(db.Integer, nullable=False, default=0)
+    returned_count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(Money, nullable=False, default=0)
+
+    checks = db.relationship('Check', backref='clearing', lazy=True)
+
+    JSON_ATTRIBUTES = ("bank", "datetime", "account_count", "check_count", "returned_count", "total")
+    JSON_EAGER_LOAD = ("bank",)
+
+    def __repr__(self):
+        """Verbose representation of check clearing instance
+
+        Returns:
+            str -- Verbose representation of check clearing instance
+        """
+        return "{} Check Clearing {}: {}".format(self.bank, self.datetime, self.total)
+
+
 class BankBranch(db.Model):
     """Database model representing bank branch
     """
     name = db.Column(db.String(128), nullable=False)
-    bank_id = db.Column(db.Integer, db.ForeignKey('bank.id'), nullable=False)
+    bank_id = db.Column(db.Integer, db.ForeignKey('bank.id'), nullable=False, index=True)
 
     staff = db.relationship('Staff', backref='branch', lazy=True)
 
     JSON_ATTRIBUTES = ("name", "bank")
+    JSON_EAGER_LOAD = ("bank",)
 
     def __repr__(self):
         """Verbose representation of bank branch instance
@@ -45,12 +122,13 @@ class BankBranch(db.Model):
 class Staff(db.Model):
     """Database representation of bank staff
     """
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    branch_id = db.Column(db.Integer, db.ForeignKey('bank_branch.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    branch_id = db.Column(db.Integer, db.ForeignKey('bank_branch.id'), nullable=False, index=True)
 
     role = db.Column(db.Integer, nullable=False)
 
     JSON_ATTRIBUTES = ("user", "branch", "role_display")
+    JSON_EAGER_LOAD = ("user", "branch.bank")
 
     @property
     def role_display(self):
@@ -1,7 +1,9 @@
 from datetime import datetime
 from flask import abort
+from sqlalchemy.ext.hybrid import hybrid_property
 
 from app import db
+from money import Money
 
 
 class Check(db.Model):
@@ -9,14 +11,24 @@ class Check(db.Model):
     """
     issuing_account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
     payable_to = db.Column(db.String(256), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(Money, nullable=False)
 
     transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'), nullable=True)
+    clearing_id = db.Column(db.Integer, db.ForeignKey('check_clearing.id'), nullable=True)
 
+    # Deposited checks are pending until a clearing run either pays them from the issuing account or returns them
     _deposited = db.Column(db.Boolean, nullable=False, default=False)
+    _cleared = db.Column(db.Boolean, nullable=False, default=False)
+    _returned = db.Column(db.Boolean, nullable=False, default=False)
     _void = db.Column(db.Boolean, nullable=False, default=False)
 
-    JSON_ATTRIBUTES = ("issuing_account", "payable_to", "amount", "is_void", "is_deposited")
+    JSON_ATTRIBUTES = ("issuing_account", "payable_to", "amount", "is_void", "is_deposited", "is_cleared", "is_returned")
+    JSON_EAGER_LOAD = ("issuing_account.config",)
+
+    __table_args__ = (
+        db.Index('ix_check_issuing_account_id_void', 'issuing_account_id', '_void'),
+        db.Index('ix_check_deposited_cleared_returned', '_deposited', '_cleared', '_returned'),
+    )
 
     @property
     def is_deposited(self):
@@ -24,6 +36,24 @@ class Check(db.Model):
         """
         return self._deposited
 
+    @property
+    def is_pending(self):
+        """Whether check is deposited, but not yet cleared or returned.
+        """
+        return self._deposited and not self._cleared and not self._returned
+
+    @property
+    def is_cleared(self):
+        """Encapsulation of whether check was paid by issuing account.
+        """
+        return self._cleared
+
+    @property
+    def is_returned(self):
+        """Encapsulation of whether check was returned unpaid, and taken back from depositing account.
+        """
+        return self._returned
+
     @property
     def is_void(self):
         """Encapsulation of whether check is void
@@ -45,11 +75,11 @@ class Check(db.Model):
         return not self.is_deposited and not self.is_void and valid_depositing_account
 
     def deposit(self):
-        """Mark check as account
+        """Mark check as deposited, pending clearing
         """
         if self._deposited or self._void:
             abort(403, "Can't deposit deposited or voided check")
-        self._void = True
+        self._deposited = True
 
     def void(self):
         """Mark check as void
@@ -72,21 +102,27 @@ class Transaction(db.Model):
     """
     account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=True)
 
-    cash_amount = db.Column(db.Float, nullable=False)
+    cash_amount = db.Column(Money, nullable=False)
     checks = db.relationship('Check', backref='transaction', lazy=True)
-    fees = db.Column(db.Float, nullable=False, default=0)
+    fees = db.Column(Money, nullable=False, default=0)
 
     description = db.Column(db.String(2000), nullable=False, default="")
 
-    _check_amount = db.Column(db.Float, nullable=False, default=0)
+    _check_amount = db.Column(Money, nullable=False, default=0)
+
+    # Withdrawals count towards the savings withdrawal limit. Deposits with fees larger than them, and returned checks taken back, don't.
+    is_withdrawal = db.Column(db.Boolean, nullable=False, default=False)
 
     datetime = db.Column(db.DateTime, nullable=False, default=datetime.now)
 
     JSON_ATTRIBUTES = ("account", "total_amount", "datetime", "description")
+    JSON_EAGER_LOAD = ("account.config",)
 
-    @property
+    __table_args__ = (db.Index('ix_transaction_account_id_datetime', 'account_id', 'datetime'),)
+
+    @hybrid_property
     def total_amount(self):
-        """Computes total amount of transaction
+        """Computes total amount of transaction. Also usable as a SQL expression.
         """
         return self.cash_amount + self._check_amount - self.fees
 
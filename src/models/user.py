@@ -1,7 +1,10 @@
+from types import MappingProxyType
+
 import config
 from app import db
+from cache import ReferenceCache
 
-from .bank import Bank, Staff
+from .bank import Bank, BankBranch, Staff
 
 
 class User(db.Model):
@@ -27,25 +30,37 @@ class User(db.Model):
         """
         return "{} {}".format(self.fname, self.lname)
 
+    @property
+    def bank_roles(self):
+        """Gets the user's staff roles from the permission cache
+
+        Returns:
+            Mapping -- Highest role held at any branch of each bank, by bank id
+        """
+        return User.permission_cache.get(self.id)
+
     def get_permission_level(self, bank=None):
         """Gets permission level at a given bank. Returns admin if global admin, and customer if no staff positions for bank found
 
         Keyword Arguments:
-            bank {Bank} -- Bank instance for which to get permissions (default: {None})
+            bank {Bank|int} -- Bank instance or id for which to get permissions (default: {None})
 
         Raises:
-            TypeError: If provided, Bank must be an instance of Bank
+            TypeError: If provided, Bank must be an instance of Bank or a bank id
 
         Returns:
             int -- Ordinal permission level
         """
-        if bank is None:
-            return config.ADMIN if self._is_superuser else config.CUSTOMER
+        if self._is_superuser:
+            return config.ADMIN
+        elif bank is None:
+            return config.CUSTOMER
         elif isinstance(bank, Bank):
-            staff = Staff.query.filter(Staff.user == self and Staff.bank == bank)
-            return staff.role
+            return self.bank_roles.get(bank.id, config.CUSTOMER)
+        elif isinstance(bank, int):
+            return self.bank_roles.get(bank, config.CUSTOMER)
         else:
-            raise TypeError("Bank must be instance of Bank or None.")
+            raise TypeError("Bank must be instance of Bank, bank id or None.")
 
     def __repr__(self):
         """Verbose representation of user instance
@@ -54,3 +69,22 @@ class User(db.Model):
             str -- Verbose representation of user instance
         """
         return self.full_name
+
+
+def _load_bank_roles(user_id):
+    """Loads highest staff role of a user at each bank, in one query through the user's staff positions and their branches
+
+    Arguments:
+        user_id {int} -- User id
+
+    Returns:
+        Mapping -- Read-only map of role by bank id, empty if the user isn't staff anywhere
+    """
+    roles = db.session.query(BankBranch.bank_id, db.func.max(Staff.role)) \
+        .join(Staff, Staff.branch_id == BankBranch.id) \
+        .filter(Staff.user_id == user_id) \
+        .group_by(BankBranch.bank_id)
+    return MappingProxyType(dict(roles))
+
+
+User.permission_cache = ReferenceCache("bank_roles", _load_bank_roles, maxsize=config.PERMISSION_CACHE_SIZE)
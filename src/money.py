@@ -0,0 +1,86 @@
+"""Fixed-point handling of monetary amounts.
+
+Amounts are stored in the database as integer numbers of cents, so that sums and comparisons are exact both in SQL and in
+vectorized code. In Python they are handled as Decimals with two decimal places, and only turned into strings when encoded as JSON.
+"""
+from decimal import ROUND_HALF_EVEN, Decimal, InvalidOperation
+
+import sqlalchemy as sa
+
+CENT = Decimal("0.01")
+
+
+def to_decimal(value):
+    """Converts number or numeric string to an amount, rounding to the nearest cent (ties to even).
+
+    Arguments:
+        value {Decimal|int|float|str} -- Amount to convert
+
+    Returns:
+        Decimal -- Amount with two decimal places
+    """
+    if isinstance(value, float):
+        # Go through the shortest repr so that e.g. 0.1 becomes 0.10 rather than 0.1000000000000000055...
+        value = repr(value)
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_EVEN)
+
+
+def to_cents(value):
+    """Converts amount to integer number of cents
+
+    Arguments:
+        value {Decimal|int|float|str} -- Amount to convert
+
+    Returns:
+        int -- Number of cents
+    """
+    return int(to_decimal(value).scaleb(2))
+
+
+def from_cents(cents):
+    """Converts integer number of cents to amount
+
+    Arguments:
+        cents {int} -- Number of cents
+
+    Returns:
+        Decimal -- Amount with two decimal places
+    """
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def parse_money(value):
+    """Argument type for monetary amounts in requests. Unlike to_decimal, rejects fractions of a cent instead of rounding them.
+
+    Arguments:
+        value {int|float|str} -- Amount provided by client
+
+    Raises:
+        ValueError: Amount isn't a finite number of cents
+
+    Returns:
+        Decimal -- Amount with two decimal places
+    """
+    try:
+        amount = Decimal(repr(value) if isinstance(value, float) else str(value))
+        if amount.is_finite() and amount == amount.quantize(CENT):
+            return amount.quantize(CENT)
+    except InvalidOperation:
+        pass
+    raise ValueError("Amounts must be numbers with at most two decimal places")
+
+
+class Money(sa.types.TypeDecorator):
+    """Column type storing amounts as integer numbers of cents, and loading them as Decimals.
+    """
+    impl = sa.Integer
+
+    @property
+    def python_type(self):
+        return Decimal
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_cents(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else from_cents(value)
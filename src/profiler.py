@@ -0,0 +1,220 @@
+"""Sampling of live requests under cProfile, switched on and off at runtime through /admin/profile/.
+
+While sampling is on, each request to a selected route is profiled with probability `rate`. Only one request is profiled at a
+time (others are skipped rather than made to wait), which bounds the overhead, and keeps profiles of concurrent requests apart.
+The stats of the last PROFILE_RETAINED_SAMPLES profiled requests of each route are kept in memory, and merged on download.
+"""
+import cProfile
+import marshal
+import pstats
+import random
+import threading
+from collections import deque
+from io import StringIO
+
+from flask import request
+
+import config
+
+
+class _Sample:
+    """Stats of one profiled request, in the form pstats loads profiles from
+    """
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class Sampler:
+    """Profiles a fraction of requests, keeping recent profiles by route
+
+    Keyword Arguments:
+        retained {int} -- Number of profiles kept for each route (default: {config.PROFILE_RETAINED_SAMPLES})
+    """
+    def __init__(self, retained=config.PROFILE_RETAINED_SAMPLES):
+        self.retained = retained
+        self.rate = 0
+        self.routes = None
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._profiling = threading.Lock()
+        self._local = threading.local()
+
+    def configure(self, rate, routes=None):
+        """Starts sampling requests, or stops with a rate of 0
+
+        Arguments:
+            rate {float} -- Fraction of requests to profile, between 0 and 1
+
+        Keyword Arguments:
+            routes {list[str]} -- Routes, as in api_routes, to sample requests of, or None for all routes (default: {None})
+        """
+        self.rate = rate
+        self.routes = frozenset(routes) if routes else None
+
+    def reset(self):
+        """Stops sampling, and discards all profiles
+        """
+        self.configure(0)
+        with self._lock:
+            self._samples.clear()
+
+    def status(self):
+        """Describes sampling settings and profiles kept
+
+        Returns:
+            dict -- Rate, routes sampled and number of profiles kept by route
+        """
+        with self._lock:
+            samples = {route: len(profiles) for route, profiles in self._samples.items()}
+        return {"rate": self.rate, "routes": sorted(self.routes) if self.routes else None, "samples": samples}
+
+    def begin(self, route):
+        """Starts profiling this thread's request, if it's sampled
+
+        Arguments:
+            route {str} -- Route of the request
+        """
+        if not self.rate or (self.routes is not None and route not in self.routes) or random.random() >= self.rate:
+            return
+        if not self._profiling.acquire(blocking=False):
+            return
+        profile = cProfile.Profile()
+        self._local.request = (route, profile)
+        profile.enable()
+
+    def end(self):
+        """Stops profiling this thread's request, and keeps its profile
+        """
+        current = getattr(self._local, "request", None)
+        if current is None:
+            return
+        route, profile = current
+        profile.disable()
+        self._local.request = None
+        self._profiling.release()
+        profile.create_stats()
+        with self._lock:
+            profiles = self._samples.get(route)
+            if profiles is None:
+                profiles = self._samples[route] = deque(maxlen=self.retained)
+            profiles.append(profile.stats)
+
+    def merged(self, route=None):
+        """Merges kept profiles
+
+        Keyword Arguments:
+            route {str} -- Route to merge profiles of, or None for all routes (default: {None})
+
+        Returns:
+            pstats.Stats -- Merged profile, or None if no profiles are kept
+        """
+        with self._lock:
+            samples = [stats for sample_route, profiles in self._samples.items() if route in (None, sample_route) for stats in profiles]
+        if not samples:
+            return None
+        # Stats are merged into the first profile's, so it's copied to leave the kept one as it was
+        return pstats.Stats(_Sample(dict(samples[0]))).add(*[_Sample(stats) for stats in samples[1:]])
+
+
+def dump(stats):
+    """Serializes stats in the format written by cProfile, which pstats, snakeviz and similar tools load
+
+    Arguments:
+        stats {pstats.Stats} -- Profile to serialize
+
+    Returns:
+        bytes -- Profile file contents
+    """
+    return marshal.dumps(stats.stats)
+
+
+def report(stats, limit=config.PROFILE_REPORT_LIMIT):
+    """Renders stats as pstats' text report, sorted by cumulative time
+
+    Arguments:
+        stats {pstats.Stats} -- Profile to render
+
+    Keyword Arguments:
+        limit {int} -- Number of functions to list (default: {config.PROFILE_REPORT_LIMIT})
+
+    Returns:
+        str -- Text report
+    """
+    stream = StringIO()
+    stats.stream = stream
+    stats.sort_stats("cumulative").print_stats(limit)
+    return stream.getvalue()
+
+
+def _label(function):
+    filename, line, name = function
+    if filename == "~":
+        return name
+    return "{}:{}:{}".format(filename.rsplit("/", 1)[-1], line, name)
+
+
+def collapse(stats, min_microseconds=1):
+    """Renders stats as collapsed stacks, one `frame;frame;... microseconds` line per stack, for flamegraph.pl or speedscope.
+
+    cProfile records calls between pairs of functions rather than whole stacks, so stacks are reconstructed from the call graph,
+    splitting the time of a function called from several places between them in proportion to the time spent in it from each.
+
+    Arguments:
+        stats {pstats.Stats} -- Profile to render
+
+    Keyword Arguments:
+        min_microseconds {int} -- Stacks with less time than this are left out (default: {1})
+
+    Returns:
+        str -- Collapsed stacks
+    """
+    callees = {}
+    for function, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((function, edge[3]))
+    roots = [function for function, (_, _, _, _, callers) in stats.stats.items() if not callers]
+
+    lines = {}
+    # Depth first walk of (function, stack above it, fraction of the function's time spent under that stack)
+    pending = [(root, (), 1.0) for root in roots]
+    while pending:
+        function, stack, fraction = pending.pop()
+        stack += (_label(function),)
+        own_time = stats.stats[function][2]
+        microseconds = int(own_time * fraction * 1e6)
+        if microseconds >= min_microseconds:
+            key = ";".join(stack)
+            lines[key] = lines.get(key, 0) + microseconds
+        for callee, edge_time in callees.get(function, ()):
+            callee_total = stats.stats[callee][3]
+            if _label(callee) in stack or not callee_total:
+                continue
+            callee_fraction = fraction * edge_time / callee_total
+            if callee_total * callee_fraction * 1e6 >= min_microseconds:
+                pending.append((callee, stack, callee_fraction))
+    return "".join("{} {}\n".format(stack, microseconds) for stack, microseconds in sorted(lines.items()))
+
+
+sampler = Sampler()
+
+
+def _begin_request():
+    if request.url_rule is not None:
+        sampler.begin(request.url_rule.rule[len(config.BASE_PATH):])
+
+
+def _end_request(exception):
+    sampler.end()
+
+
+def instrument(app):
+    """Profiles app's requests as sampler is configured
+
+    Arguments:
+        app {Flask} -- App to profile requests of
+    """
+    app.before_request(_begin_request)
+    app.teardown_request(_end_request)
@@ -0,0 +1,230 @@
+"""Detection of N+1 queries, for development and tests.
+
+Every SQL statement executed while a tracker is active is fingerprinted by its text (with IN lists collapsed, as parameters
+are bound), and attributed to the relationship being lazy loaded, if any, and to the code outside of libraries it was made from.
+A statement shape or relationship repeated more times than the tracker's threshold is logged or raised as NPlusOneError.
+
+Trackers are active for each request when QUERY_DEBUG is set, and can also be used directly, e.g. in tests:
+
+    with query_budget(5):
+        client.get("/api/v1/bank/")
+"""
+import logging
+import os
+import re
+import sys
+import sysconfig
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.orm.strategies import LazyLoader
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Frames of code in these directories (the standard library and installed packages) aren't reported as call sites
+LIBRARY_DIRS = tuple({sysconfig.get_paths()[name] for name in ("stdlib", "platstdlib", "purelib", "platlib")})
+# Number of frames reported as the call site of a statement, innermost first
+CALL_SITE_DEPTH = 3
+
+_local = threading.local()
+_in_list = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_whitespace = re.compile(r"\s+")
+
+
+class NPlusOneError(Exception):
+    """Raised when a statement or lazy load is repeated more times than allowed
+    """
+
+
+def fingerprint(statement):
+    """Reduces statement to its shape, so that executions differing only in parameters or IN list lengths compare equal
+
+    Arguments:
+        statement {str} -- SQL statement
+
+    Returns:
+        str -- Fingerprint of statement
+    """
+    return _in_list.sub("(?)", _whitespace.sub(" ", statement).strip())
+
+
+def _display_path(filename):
+    relative = os.path.relpath(filename)
+    return filename if relative.startswith("..") else relative
+
+
+def _origin():
+    """Finds relationship being lazy loaded, and code outside of libraries making the statement being executed
+
+    Returns:
+        tuple -- Relationship as Model.attribute or None, and call site
+    """
+    relationship = None
+    call_site = []
+    frame = sys._getframe(2)
+    while frame is not None:
+        if relationship is None and isinstance(frame.f_locals.get("self"), LazyLoader):
+            relationship = str(frame.f_locals["self"].parent_property)
+        filename = frame.f_code.co_filename
+        if len(call_site) < CALL_SITE_DEPTH and filename != __file__ and not filename.startswith(LIBRARY_DIRS + ("<",)):
+            call_site.append("{}:{} ({})".format(_display_path(filename), frame.f_lineno, frame.f_code.co_name))
+        frame = frame.f_back
+    return relationship, " <- ".join(call_site) or "unknown"
+
+
+class QueryTracker:
+    """Statements and lazy loads made while tracking
+
+    Keyword Arguments:
+        threshold {int} -- Times a statement shape or lazy loaded relationship may repeat before being reported (default: {None, never})
+        action {str} -- "raise" to raise NPlusOneError when the threshold is exceeded, or "log" to log a warning (default: {"raise"})
+    """
+    def __init__(self, threshold=None, action="raise"):
+        self.threshold = threshold
+        self.action = action
+        self.statements = Counter()
+        self.lazy_loads = Counter()
+        self.call_sites = {}
+        self._lazy_statements = set()
+        self._reported = set()
+
+    @property
+    def statement_count(self):
+        """Total number of statements executed
+        """
+        return sum(self.statements.values())
+
+    def record(self, statement, relationship, call_site):
+        """Records execution of a statement
+
+        Arguments:
+            statement {str} -- Fingerprint of statement
+            relationship {str} -- Relationship lazy loaded by statement, or None
+            call_site {str} -- Code that made statement
+
+        Raises:
+            NPlusOneError: Statement or lazy load was repeated too many times, and action is "raise"
+        """
+        self.statements[statement] += 1
+        self.call_sites.setdefault(statement, call_site)
+        if relationship is not None:
+            self.lazy_loads[relationship] += 1
+            self._lazy_statements.add(statement)
+            self.call_sites.setdefault(relationship, call_site)
+            self._check(relationship, self.lazy_loads[relationship], "Lazy loaded {}".format(relationship))
+        else:
+            self._check(statement, self.statements[statement], "Executed {}".format(statement))
+
+    def _check(self, key, count, description):
+        if self.threshold is None or count <= self.threshold or key in self._reported:
+            return
+        self._reported.add(key)
+        message = "{} more than {} times, first from {}".format(description, self.threshold, self.call_sites[key])
+        if self.action == "raise":
+            raise NPlusOneError(message)
+        logger.warning(message)
+
+    def report(self):
+        """Summarizes repeated statements and lazy loads
+
+        Returns:
+            str -- One line per lazy loaded relationship, then per other statement executed more than once, most repeated first
+        """
+        lines = ["{} statements".format(self.statement_count)]
+        for relationship, count in self.lazy_loads.most_common():
+            lines.append("{}x lazy load of {} from {}".format(count, relationship, self.call_sites[relationship]))
+        for statement, count in self.statements.most_common():
+            if count > 1 and statement not in self._lazy_statements:
+                lines.append("{}x {} from {}".format(count, statement, self.call_sites[statement]))
+        return "\n".join(lines)
+
+
+def _trackers():
+    trackers = getattr(_local, "trackers", None)
+    if trackers is None:
+        trackers = _local.trackers = []
+    return trackers
+
+
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    trackers = _trackers()
+    if not trackers:
+        return
+    shape = fingerprint(statement)
+    relationship, call_site = _origin()
+    for tracker in trackers:
+        tracker.record(shape, relationship, call_site)
+
+
+def _listen(engine):
+    if not event.contains(engine, "after_cursor_execute", _record_statement):
+        event.listen(engine, "after_cursor_execute", _record_statement)
+
+
+@contextmanager
+def track_queries(threshold=None, action="raise", engine=None):
+    """Tracks statements executed by this thread within the block
+
+    Keyword Arguments:
+        threshold {int} -- See QueryTracker (default: {None})
+        action {str} -- See QueryTracker (default: {"raise"})
+        engine {Engine} -- Engine to track statements of (default: {db.engine})
+
+    Yields:
+        QueryTracker -- Statements and lazy loads made so far
+    """
+    _listen(engine or db.engine)
+    tracker = QueryTracker(threshold, action)
+    _trackers().append(tracker)
+    try:
+        yield tracker
+    finally:
+        _trackers().remove(tracker)
+
+
+@contextmanager
+def query_budget(max_statements, threshold=None, engine=None):
+    """Fails if the block executes more statements than allowed, or repeats any more than threshold times
+
+    Arguments:
+        max_statements {int} -- Number of statements allowed
+
+    Keyword Arguments:
+        threshold {int} -- See QueryTracker (default: {None})
+        engine {Engine} -- Engine to track statements of (default: {db.engine})
+
+    Raises:
+        AssertionError: Block executed too many statements, with a report of them
+    """
+    with track_queries(threshold, "raise", engine) as tracker:
+        yield tracker
+    if tracker.statement_count > max_statements:
+        raise AssertionError("Executed {} statements, over budget of {}:\n{}".format(tracker.statement_count, max_statements, tracker.report()))
+
+
+def instrument(app, engine):
+    """Tracks statements of each of app's requests, reporting N+1 queries as configured by QUERY_DEBUG_THRESHOLD and QUERY_DEBUG_ACTION
+
+    Arguments:
+        app {Flask} -- App to track requests of
+        engine {Engine} -- Engine to track statements of
+    """
+    _listen(engine)
+
+    def begin_request():
+        tracker = QueryTracker(app.config["QUERY_DEBUG_THRESHOLD"], app.config["QUERY_DEBUG_ACTION"])
+        _local.request_tracker = tracker
+        _trackers().append(tracker)
+
+    def end_request(exception):
+        tracker = getattr(_local, "request_tracker", None)
+        if tracker is not None:
+            _trackers().remove(tracker)
+            _local.request_tracker = None
+
+    app.before_request(begin_request)
+    app.teardown_request(end_request)
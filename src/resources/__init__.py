@@ -1,7 +1,10 @@
 from .accounts import (AccountApi, AccountConfigApi, AccountConfigListApi,
                        AccountListApi, CheckApi, CheckListApi, TransactionApi,
-                       TransactionListApi)
-from .bank import (BankApi, BankListApi, BranchApi, BranchListApi, StaffApi,
+                       TransactionBatchApi, TransactionExportApi,
+                       TransactionListApi, TransferApi)
+from .admin import ProfileApi, ProfileDownloadApi
+from .bank import (BankApi, BankListApi, BranchApi, BranchListApi,
+                   CheckClearingApi, InterestAccrualApi, StaffApi,
                    StaffListApi)
 from .user import UserApi, UserListApi
 
@@ -15,11 +18,18 @@ __all__ = (
     BranchApi,
     BranchListApi,
     CheckApi,
+    CheckClearingApi,
     CheckListApi,
+    InterestAccrualApi,
+    ProfileApi,
+    ProfileDownloadApi,
     UserApi,
     UserListApi,
     StaffApi,
     StaffListApi,
     TransactionApi,
-    TransactionListApi
+    TransactionBatchApi,
+    TransactionExportApi,
+    TransactionListApi,
+    TransferApi
 )
@@ -1,35 +1,28 @@
-from flask_restful import Resource, reqparse
+from datetime import datetime
+
+from flask_restful import Resource, inputs, reqparse
+from werkzeug.exceptions import HTTPException
 
 import config
-from flask import abort
+import export
+from flask import Response, abort, stream_with_context
 from app import db
-from utils import json_serialize
+from cache import bump_versions, response_cache
+from money import parse_money
+from utils import json_serialize, paginate, parse_expand, retry_on_conflict
 from models import Account, AccountConfig, Bank, Check, Transaction, User
 
 
-def _deposit_check(check):
-    """Helper method for depositing check in transaction
-
-    Withdraw amount from issuing account, then mark check as deposited
-
-    Arguments:
-        check {Check} -- Check being deposited
-    """
-    transaction = _gen_withdraw_transaction(check.issuing_account, -1 * check.amount, description="Check Payment")
-    check.issuing_account.process_transaction(transaction)
-    check.deposit()
-
-
 def _gen_deposit_transaction(account, cash_amount, description=None, checks=[]):
     """Helper method for processing deposits
 
     Separate checks into valid and invalid.
     If any are invalid, terminate and return invalid check ids in error message.
-    If all are good, process deposit on all checks and return generated deposit transaction
+    If all are good, mark all checks as deposited pending clearing, and return generated deposit transaction
 
     Arguments:
         account {Account} -- Account being deposited from
-        cash_amount {float} -- Amount being deposited
+        cash_amount {Decimal} -- Amount being deposited
 
     Keyword Arguments:
         description {str} -- Optional description for transaction (default: {None})
@@ -47,15 +40,15 @@ def _gen_deposit_transaction(account, cash_amount, description=None, checks=[]):
         abort(400, "Checks #s {} Are Invalid".format(", ".join([str(check.id) for check in failed_checks])))
 
     for check in good_checks:
-        # This will withdraw relevant amount from issuing account. If failed, no changes would be applied to the database.
-        _deposit_check(check)
+        # Issuing accounts are only debited by the next clearing run
+        check.deposit()
 
     # All Good
     transaction = Transaction(
         account=account,
         cash_amount=cash_amount,
         checks=good_checks,
-        fees=account.config.deposit_fee,
+        fees=account.rules.deposit_fee,
         description=description or "Deposit"
     )
     db.session.add(transaction)
@@ -70,7 +63,7 @@ def _gen_withdraw_transaction(account, cash_amount, description=None):
 
     Arguments:
         account {Account} -- Account being withdrawn from
-        cash_amount {float} -- Amount being withdrawn
+        cash_amount {Decimal} -- Amount being withdrawn
 
     Keyword Arguments:
         description {str} -- Optional description for transaction (default: {None})
@@ -79,28 +72,59 @@ def _gen_withdraw_transaction(account, cash_amount, description=None):
         Transaction -- Transaction object
     """
     cash_amount = abs(cash_amount) * -1
-    fees = abs(account.config.withdrawal_fee)
+    rules = account.rules
+    fees = abs(rules.withdrawal_fee)
     # Check withdrawal limit
-    if account.config.is_savings and account.withdrawals_last_month >= config.SAVINGS_ACCOUNT_MAX_WITHDRAWALS_PER_MONTH:
+    if rules.is_savings and account.withdrawals_this_month >= config.SAVINGS_ACCOUNT_MAX_WITHDRAWALS_PER_MONTH:
         abort(403, "You can only withdraw from a saving account {} times each month".format(
             config.SAVINGS_ACCOUNT_MAX_WITHDRAWALS_PER_MONTH))
     # Check Overdraft
     if account._balance + cash_amount < 0:
-        if not account.config.allow_overdraft:
+        if not rules.allow_overdraft:
             abort(403, "Withdrawal amount exceeds balance, and this account does not allow you to overdraft.")
-        if account.balance + cash_amount < -1 * account.config.overdraft_limit:
+        if account.balance + cash_amount < -1 * rules.overdraft_limit:
             abort(403, "Withdrawal amount exceeds balance, and you have exceeded this account's overdraft limit")
         # Overdraft allowed, apply Overdraft Fee
-        fees += account.config.overdraft_fee
+        fees += rules.overdraft_fee
 
     # All Good
     transaction = Transaction(
         account=account,
         cash_amount=cash_amount,
         fees=fees,
-        description=description or "Withdrawal"
+        description=description or "Withdrawal",
+        is_withdrawal=True
     )
     db.session.add(transaction)
+    account.record_withdrawal(transaction)
+    return transaction
+
+
+def _process_transaction(account, cash_amount, checks, description=None):
+    """Helper method for classifying transaction as deposit or withdrawal, and applying it to account balance
+
+    Arguments:
+        account {Account} -- Account transaction is made on
+        cash_amount {Decimal} -- Amount being deposited (if positive) or withdrawn (if negative)
+        checks {list[Check]} -- List of Check objects being deposited
+
+    Keyword Arguments:
+        description {str} -- Optional description for transaction (default: {None})
+
+    Returns:
+        Transaction -- Transaction object
+    """
+    if cash_amount < 0 and not checks:
+        # Withdrawal
+        transaction = _gen_withdraw_transaction(account, cash_amount, description)
+    elif cash_amount >= 0:
+        # Deposit
+        transaction = _gen_deposit_transaction(account, cash_amount, checks=checks, description=description)
+    else:
+        abort(400, "Invalid Transaction: Must either have negative cash amount and no checks, or positive cash amount and checks.")
+
+    # Change balance
+    account.process_transaction(transaction)
     return transaction
 
 
@@ -108,13 +132,13 @@ _account_config_fields = {
     "name": str,
     "is_savings": bool,
     "is_checking": bool,
-    "min_opening_balance": float,
+    "min_opening_balance": parse_money,
     "interest": float,
-    "deposit_fee": float,
-    "withdrawal_fee": float,
+    "deposit_fee": parse_money,
+    "withdrawal_fee": parse_money,
     "allow_overdraft": bool,
-    "overdraft_limit": float,
-    "overdraft_fee": float
+    "overdraft_limit": parse_money,
+    "overdraft_fee": parse_money
 }
 
 _account_config_create_parser = reqparse.RequestParser()
@@ -127,6 +151,7 @@ for field, type_ in _account_config_fields.items():
 class AccountConfigListApi(Resource):
     """API Endpoint for bank's account config options
     """
+    @response_cache.versioned("banks", "account_configs")
     def get(self, bank_id):
         """API Endpoint to get all Account Configs for a bank.
         """
@@ -142,6 +167,7 @@ class AccountConfigListApi(Resource):
         conf = AccountConfig(bank=bank, **args)
         conf.check_account_type_valid()
         db.session.add(conf)
+        bump_versions("account_configs")
         db.session.commit()
         return json_serialize(conf)
 
@@ -164,6 +190,8 @@ class AccountConfigApi(Resource):
         conf = AccountConfig.query.filter_by(bank=bank, id=account_config_id).first_or_404()
         conf.update(args)
         conf.check_account_type_valid()
+        AccountConfig.cache.invalidate()
+        bump_versions("account_configs")
         db.session.commit()
         return json_serialize(conf)
 
@@ -173,6 +201,8 @@ class AccountConfigApi(Resource):
         bank = Bank.query.get_or_404(bank_id)
         conf = AccountConfig.query.filter_by(bank=bank, id=account_config_id).first_or_404()
         db.session.delete(conf)
+        AccountConfig.cache.invalidate()
+        bump_versions("account_configs")
         db.session.commit()
         return json_serialize(conf)
 
@@ -180,7 +210,7 @@ class AccountConfigApi(Resource):
 _account_parser = reqparse.RequestParser()
 _account_parser.add_argument("user_id", type=int, required=True, help="No User Id provided", location="json")
 _account_parser.add_argument("account_config_id", type=int, required=True, help="No Account Config Id Provided", location="json")
-_account_parser.add_argument("initial_deposit", type=float, required=False, default=0, location="json")
+_account_parser.add_argument("initial_deposit", type=parse_money, required=False, default=0, location="json")
 
 
 class AccountListApi(Resource):
@@ -189,9 +219,11 @@ class AccountListApi(Resource):
     def get(self, bank_id):
         """API Endpoint for getting all accounts for a bank
         """
-        bank = Bank.query.get_or_404(bank_id)
-        accounts = Account.query.filter(Account.bank == bank).filter_by(_closed=False).all()
-        return json_serialize(accounts)
+        expand = parse_expand(Account)
+        bank = Bank.cache.get_or_404(bank_id)
+        query = Account.query.options(*Account.json_loader_options(expand)).filter_by(bank_id=bank.id, _closed=False)
+        accounts, headers = paginate(query, Account.id)
+        return json_serialize(accounts, expand), 200, headers
 
     def put(self, bank_id):
         """API Endpoint for adding new account to a bank
@@ -220,9 +252,11 @@ class AccountApi(Resource):
     def get(self, bank_id, account_id):
         """API Endpoint for accessing account instance
         """
+        expand = parse_expand(Account)
         account = Account.query.get_or_404(account_id)
-        return json_serialize(account)
+        return json_serialize(account, expand)
 
+    @retry_on_conflict
     def delete(self, bank_id, account_id):
         """API Endpoint for closing account instance
         """
@@ -233,7 +267,7 @@ class AccountApi(Resource):
 
 
 _transaction_parser = reqparse.RequestParser()
-_transaction_parser.add_argument("cash_amount", type=float, required=False, default=0)
+_transaction_parser.add_argument("cash_amount", type=parse_money, required=False, default=0)
 _transaction_parser.add_argument("checks", type=int, required=False, default=[], action='append')
 _transaction_parser.add_argument("description", type=str, required=False, default="")
 
@@ -244,9 +278,13 @@ class TransactionListApi(Resource):
     def get(self, bank_id, account_id):
         """API Endpoint for getting all account transactions
         """
+        expand = parse_expand(Transaction)
         account = Account.query.get_or_404(account_id)
-        return json_serialize(account.transactions)
+        query = Transaction.query.options(*Transaction.json_loader_options(expand)).filter_by(account=account)
+        transactions, headers = paginate(query, Transaction.datetime, Transaction.id)
+        return json_serialize(transactions, expand), 200, headers
 
+    @retry_on_conflict
     def put(self, bank_id, account_id):
         """API Endpoint for adding account transaction
         """
@@ -255,21 +293,172 @@ class TransactionListApi(Resource):
         cash_amount = args['cash_amount']
         raw_checks = args['checks']
         checks = [Check.query.get_or_404(check_id) for check_id in raw_checks]
+        transaction = _process_transaction(account, cash_amount, checks, args['description'])
+        # Serialize before committing, so that the transaction doesn't have to be reloaded
+        db.session.flush()
+        response = json_serialize(transaction)
+        db.session.commit()
+        return response
+
+
+_export_parser = reqparse.RequestParser()
+_export_parser.add_argument("account_id", type=int, required=False, location="args")
+_export_parser.add_argument("start", type=datetime.fromisoformat, help="Datetime Must Be In ISO 8601 Format", location="args")
+_export_parser.add_argument("end", type=datetime.fromisoformat, help="Datetime Must Be In ISO 8601 Format", location="args")
+_export_parser.add_argument("format", type=str, default="ndjson", choices=tuple(export.FORMATS), help="Format Must Be ndjson Or csv", location="args")
+
 
-        # Classify Transaction
-        if cash_amount < 0 and not checks:
-            # Withdrawal
-            transaction = _gen_withdraw_transaction(account, cash_amount, args['description'])
-        elif cash_amount >= 0:
-            # Deposit
-            transaction = _gen_deposit_transaction(account, cash_amount, checks=checks, description=args['description'])
-        else:
-            abort(400, "Invalid Transaction: Must either have negative cash amount and no checks, or positive cash amount and checks.")
-
-        # Change balance
-        account.process_transaction(transaction)
+class TransactionExportApi(Resource):
+    """API Endpoint for exporting complete transaction histories
+    """
+    def get(self, bank_id):
+        """API Endpoint for streaming all transactions of accounts at a bank, or of one of its accounts, optionally between two dates
+        """
+        args = _export_parser.parse_args()
+        bank = Bank.cache.get_or_404(bank_id)
+        if args['account_id'] is not None:
+            Account.query.filter_by(bank_id=bank.id, id=args['account_id']).first_or_404()
+        mimetype, encode = export.FORMATS[args['format']]
+        rows = export.transaction_rows(bank.id, args['account_id'], args['start'], args['end'])
+        return Response(stream_with_context(encode(rows)), mimetype=mimetype, headers={
+            "Content-Disposition": "attachment; filename=transactions.{}".format(args['format'])})
+
+
+_transaction_batch_parser = reqparse.RequestParser()
+_transaction_batch_parser.add_argument("transactions", type=dict, required=True, help="No Transactions Provided", action='append', location="json")
+_transaction_batch_parser.add_argument("atomic", type=inputs.boolean, required=False, default=True, location="json")
+
+
+def _parse_batch_item(item):
+    """Helper method for validating a single transaction in a batch
+
+    Arguments:
+        item {dict} -- Transaction data, with account_id, and optionally cash_amount, checks and description
+
+    Returns:
+        tuple -- Account id, cash amount, list of check ids and description
+    """
+    try:
+        return (
+            int(item["account_id"]),
+            parse_money(item.get("cash_amount", 0)),
+            [int(check_id) for check_id in item.get("checks", [])],
+            str(item.get("description", ""))
+        )
+    except (KeyError, TypeError, ValueError):
+        abort(400, "Invalid Transaction: Must have an account id, a numeric cash amount, and a list of check ids.")
+
+
+class TransactionBatchApi(Resource):
+    """API Endpoint for adding many transactions to a bank's accounts at once
+    """
+    @retry_on_conflict
+    def put(self, bank_id):
+        """API Endpoint for adding a batch of account transactions in a single database transaction
+
+        If the batch is atomic (the default), any failed transaction rolls back the whole batch.
+        Otherwise, only failed transactions are rolled back, and the rest are applied.
+        """
+        args = _transaction_batch_parser.parse_args()
+        bank = Bank.cache.get_or_404(bank_id)
+        if len(args['transactions']) > config.MAX_TRANSACTION_BATCH_SIZE:
+            abort(400, "Batches can contain at most {} transactions".format(config.MAX_TRANSACTION_BATCH_SIZE))
+
+        items = []
+        for item in args['transactions']:
+            try:
+                items.append(_parse_batch_item(item))
+            except HTTPException as e:
+                items.append(e)
+
+        # Load all accounts and checks up front rather than once per transaction
+        parsed = [item for item in items if not isinstance(item, HTTPException)]
+        accounts = {account.id: account for account in Account.query.filter(
+            Account.bank_id == bank.id, Account.id.in_({account_id for account_id, _, _, _ in parsed}))}
+        checks = {check.id: check for check in Check.query.filter(
+            Check.id.in_({check_id for _, _, check_ids, _ in parsed for check_id in check_ids}))}
+
+        results = []
+        for i, item in enumerate(items):
+            savepoint = None if args['atomic'] else db.session.begin_nested()
+            try:
+                if isinstance(item, HTTPException):
+                    raise item
+                account_id, cash_amount, check_ids, description = item
+                if account_id not in accounts:
+                    abort(404, "Account #{} Not Found".format(account_id))
+                missing_checks = [str(check_id) for check_id in check_ids if check_id not in checks]
+                if missing_checks:
+                    abort(404, "Checks #s {} Not Found".format(", ".join(missing_checks)))
+                transaction = _process_transaction(accounts[account_id], cash_amount, [checks[check_id] for check_id in check_ids], description)
+                if savepoint:
+                    savepoint.commit()
+                results.append(transaction)
+            except HTTPException as e:
+                if savepoint:
+                    savepoint.rollback()
+                    results.append(e)
+                    continue
+                db.session.rollback()
+                failure = {"status": e.code, "message": e.description}
+                skipped = {"status": 424, "message": "Not applied because transaction #{} in the batch failed".format(i)}
+                return {"results": [failure if j == i else skipped for j in range(len(items))]}, e.code
+
+        # Serialize before committing, so that transactions don't have to be reloaded
+        db.session.flush()
+        response = {"results": [
+            {"status": result.code, "message": result.description} if isinstance(result, HTTPException)
+            else {"status": 200, "transaction": json_serialize(result)}
+            for result in results
+        ]}
+        db.session.commit()
+        return response
+
+
+_transfer_parser = reqparse.RequestParser()
+_transfer_parser.add_argument("from_account_id", type=int, required=True, help="No Source Account Provided", location="json")
+_transfer_parser.add_argument("to_account_id", type=int, required=True, help="No Destination Account Provided", location="json")
+_transfer_parser.add_argument("amount", type=parse_money, required=True, help="No amount provided", location="json")
+_transfer_parser.add_argument("description", type=str, required=False, default="", location="json")
+
+
+class TransferApi(Resource):
+    """API Endpoint for moving money between two accounts
+    """
+    @retry_on_conflict
+    def put(self, bank_id):
+        """API Endpoint for transferring money from an account at a given bank to any other account, in a single database transaction
+
+        The source account's withdrawal limit, overdraft rules and withdrawal fee apply, as does the destination account's deposit fee.
+        """
+        args = _transfer_parser.parse_args()
+        from_account_id, to_account_id, amount = args['from_account_id'], args['to_account_id'], args['amount']
+        if amount <= 0:
+            abort(400, "Transfer amount must be positive")
+        if from_account_id == to_account_id:
+            abort(400, "Can't transfer money to the same account")
+
+        # Both accounts are locked in id order, whichever way money moves between them, so that concurrent transfers can't deadlock
+        accounts = {account.id: account for account in Account.query.filter(
+            Account.id.in_((from_account_id, to_account_id))).order_by(Account.id).with_for_update()}
+        from_account, to_account = accounts.get(from_account_id), accounts.get(to_account_id)
+        if from_account is None or from_account.bank_id != bank_id:
+            abort(404, "Account #{} Not Found".format(from_account_id))
+        if to_account is None:
+            abort(404, "Account #{} Not Found".format(to_account_id))
+        if from_account.closed or to_account.closed:
+            abort(403, "Can't transfer money to or from a closed account")
+
+        description = args['description']
+        withdrawal = _gen_withdraw_transaction(from_account, amount, description or "Transfer to Account #{}".format(to_account.id))
+        deposit = _gen_deposit_transaction(to_account, amount, description or "Transfer from Account #{}".format(from_account.id))
+        from_account.process_transaction(withdrawal)
+        to_account.process_transaction(deposit)
+        # Serialize before committing, so that the transactions don't have to be reloaded
+        db.session.flush()
+        response = {"withdrawal": json_serialize(withdrawal), "deposit": json_serialize(deposit)}
         db.session.commit()
-        return json_serialize(transaction)
+        return response
 
 
 class TransactionApi(Resource):
@@ -278,12 +467,13 @@ class TransactionApi(Resource):
     def get(self, bank_id, account_id, transaction_id):
         """API Endpoint for accessing transaction instance
         """
-        return json_serialize(Transaction.query.get_or_404(transaction_id))
+        expand = parse_expand(Transaction)
+        return json_serialize(Transaction.query.get_or_404(transaction_id), expand)
 
 
 _check_parser = reqparse.RequestParser()
 _check_parser.add_argument("payable_to", type=str, required=True, help="No Payable To information provided", location="json")
-_check_parser.add_argument("amount", type=float, required=True, help="No amount provided", location="json")
+_check_parser.add_argument("amount", type=parse_money, required=True, help="No amount provided", location="json")
 
 
 class CheckListApi(Resource):
@@ -292,8 +482,11 @@ class CheckListApi(Resource):
     def get(self, bank_id, account_id):
         """API Endpoint for accessing account's checks
         """
+        expand = parse_expand(Check)
         account = Account.query.get_or_404(account_id)
-        return json_serialize(Check.query.filter(Check.issuing_account == account).filter_by(_void=False).all())
+        query = Check.query.options(*Check.json_loader_options(expand)).filter(Check.issuing_account == account).filter_by(_void=False)
+        checks, headers = paginate(query, Check.id)
+        return json_serialize(checks, expand), 200, headers
 
     def put(self, bank_id, account_id):
         """API Endpoint for issuing a check
@@ -312,7 +505,8 @@ class CheckApi(Resource):
     def get(self, bank_id, account_id, check_id):
         """API Endpoint for accessing check instance
         """
-        return json_serialize(Check.query.get_or_404(check_id))
+        expand = parse_expand(Check)
+        return json_serialize(Check.query.get_or_404(check_id), expand)
 
     def delete(self, bank_id, account_id, check_id):
         """API Endpoint for voicing issued check instance
@@ -0,0 +1,85 @@
+from flask import Response, abort
+from flask_restful import Resource, reqparse
+
+import config
+import profiler
+from models import User
+
+
+def _require_admin(user_id):
+    """Aborts unless user_id is that of a superuser
+
+    Arguments:
+        user_id {int} -- Id of the user making the request
+    """
+    user = User.query.get(user_id)
+    if user is None or user.get_permission_level() < config.ADMIN:
+        abort(403, "Only admins can profile requests")
+
+
+_profile_parser = reqparse.RequestParser()
+_profile_parser.add_argument("user_id", type=int, required=True, help="No User Id provided", location="json")
+_profile_parser.add_argument("rate", type=float, required=True, help="No Sampling Rate Provided", location="json")
+_profile_parser.add_argument("routes", type=str, action="append", location="json")
+
+_admin_parser = reqparse.RequestParser()
+_admin_parser.add_argument("user_id", type=int, required=True, help="No User Id provided", location="args")
+
+_download_parser = _admin_parser.copy()
+_download_parser.add_argument("route", type=str, location="args")
+
+_PROFILE_FORMATS = {
+    "pstats": ("application/octet-stream", "prof", profiler.dump),
+    "collapsed": ("text/plain", "txt", profiler.collapse),
+    "text": ("text/plain", "txt", profiler.report),
+}
+
+
+class ProfileApi(Resource):
+    """API Endpoint for sampling requests under cProfile
+    """
+    def get(self):
+        """API Endpoint for getting the sampling rate and routes, and the number of profiles kept by route
+        """
+        _require_admin(_admin_parser.parse_args()["user_id"])
+        return profiler.sampler.status()
+
+    def put(self):
+        """API Endpoint for starting to profile a fraction of requests, optionally only to given routes. A rate of 0 stops profiling.
+        """
+        from api_routes import routes as api_routes
+
+        args = _profile_parser.parse_args()
+        _require_admin(args["user_id"])
+        if not 0 <= args["rate"] <= 1:
+            abort(400, "Sampling rate must be between 0 and 1")
+        unknown = set(args["routes"] or ()) - {path for _, path in api_routes}
+        if unknown:
+            abort(400, "Unknown routes: {}".format(", ".join(sorted(unknown))))
+        profiler.sampler.configure(args["rate"], args["routes"])
+        return profiler.sampler.status()
+
+    def delete(self):
+        """API Endpoint for stopping profiling, and discarding all profiles
+        """
+        _require_admin(_admin_parser.parse_args()["user_id"])
+        profiler.sampler.reset()
+        return profiler.sampler.status()
+
+
+class ProfileDownloadApi(Resource):
+    """API Endpoint for downloading kept profiles, merged
+    """
+    def get(self, output):
+        """API Endpoint for downloading profiles of a route, or of all routes, as a pstats file, collapsed stacks, or a text report
+        """
+        args = _download_parser.parse_args()
+        _require_admin(args["user_id"])
+        if output not in _PROFILE_FORMATS:
+            abort(404, "Profiles are available as {}".format(", ".join(_PROFILE_FORMATS)))
+        stats = profiler.sampler.merged(args["route"])
+        if stats is None:
+            abort(404, "No requests have been profiled")
+        mimetype, extension, render = _PROFILE_FORMATS[output]
+        return Response(render(stats), mimetype=mimetype, headers={
+            "Content-Disposition": "attachment; filename=profile.{}".format(extension)})
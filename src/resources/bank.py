@@ -1,8 +1,14 @@
-from utils import json_serialize
+from datetime import datetime
+
+from utils import json_serialize, paginate, parse_expand
+from flask import abort
 from flask_restful import Resource, reqparse
 
 from app import db
-from models import Bank, BankBranch, Staff, User
+from cache import bump_versions, response_cache
+from clearing import clear_checks
+from interest import accrue_interest
+from models import Bank, BankBranch, CheckClearing, InterestAccrual, Staff, User
 
 
 _bank_parser = reqparse.RequestParser()
@@ -12,9 +18,11 @@ _bank_parser.add_argument(name="name", type=str, required=True, help="No Bank Na
 class BankListApi(Resource):
     """API Endpoint for accessing all banks and for adding new banks
     """
+    @response_cache.versioned("banks")
     def get(self):
         """API Endpoint for getting all banks"""
-        return json_serialize(Bank.query.all())
+        banks, headers = paginate(Bank.query, Bank.id)
+        return json_serialize(banks), 200, headers
 
     def put(self):
         """API Endpoint for creating new bank
@@ -22,6 +30,7 @@ class BankListApi(Resource):
         args = _bank_parser.parse_args()
         bank = Bank(name=args['name'])
         db.session.add(bank)
+        bump_versions("banks")
         db.session.commit()
         return json_serialize(bank)
 
@@ -41,6 +50,8 @@ class BankApi(Resource):
         args = _bank_parser.parse_args()
         bank = Bank.query.get_or_404(bank_id)
         bank.update(args)
+        Bank.cache.invalidate()
+        bump_versions("banks")
         db.session.commit()
         return json_serialize(bank)
 
@@ -49,10 +60,63 @@ class BankApi(Resource):
         """
         bank = Bank.query.get_or_404(bank_id)
         db.session.delete(bank)
+        Bank.cache.invalidate()
+        bump_versions("banks")
         db.session.commit()
         return json_serialize(bank)
 
 
+_interest_parser = reqparse.RequestParser()
+_interest_parser.add_argument(name="datetime", type=datetime.fromisoformat, help="Datetime Must Be In ISO 8601 Format", location="json")
+
+
+class InterestAccrualApi(Resource):
+    """API Endpoint for month-end interest runs at a specific bank
+    """
+    def get(self, bank_id):
+        """API Endpoint for getting all interest runs at a given bank
+        """
+        bank = Bank.query.get_or_404(bank_id)
+        accruals, headers = paginate(InterestAccrual.query.filter_by(bank=bank), InterestAccrual.id)
+        return json_serialize(accruals), 200, headers
+
+    def put(self, bank_id):
+        """API Endpoint for paying a month of interest into every open account at a given bank
+        """
+        args = _interest_parser.parse_args()
+        bank = Bank.query.get_or_404(bank_id)
+        try:
+            accrual = accrue_interest(bank, args['datetime'])
+        except ValueError as e:
+            abort(409, str(e))
+        db.session.commit()
+        return json_serialize(accrual)
+
+
+_clearing_parser = reqparse.RequestParser()
+_clearing_parser.add_argument(name="datetime", type=datetime.fromisoformat, help="Datetime Must Be In ISO 8601 Format", location="json")
+
+
+class CheckClearingApi(Resource):
+    """API Endpoint for clearing runs of checks drawn on accounts at a specific bank
+    """
+    def get(self, bank_id):
+        """API Endpoint for getting all clearing runs at a given bank
+        """
+        bank = Bank.query.get_or_404(bank_id)
+        clearings, headers = paginate(CheckClearing.query.filter_by(bank=bank), CheckClearing.id)
+        return json_serialize(clearings), 200, headers
+
+    def put(self, bank_id):
+        """API Endpoint for settling all pending checks drawn on accounts at a given bank
+        """
+        args = _clearing_parser.parse_args()
+        bank = Bank.query.get_or_404(bank_id)
+        clearing = clear_checks(bank, args['datetime'])
+        db.session.commit()
+        return json_serialize(clearing)
+
+
 _branch_parser = reqparse.RequestParser()
 _branch_parser.add_argument(name="name", type=str, required=True, help="No Branch Name Provided", location="json")
 
@@ -61,12 +125,14 @@ class BranchListApi(Resource):
     """API Endpoint for interacting with all bank branches at a specific bank
     """
 
+    @response_cache.versioned("banks", "branches")
     def get(self, bank_id):
         """API Endpoint for getting all branches for a given bank
         """
+        expand = parse_expand(BankBranch)
         bank = Bank.query.get_or_404(bank_id)
-        branches = BankBranch.query.filter_by(bank=bank).all()
-        return json_serialize(branches)
+        branches = BankBranch.query.options(*BankBranch.json_loader_options(expand)).filter_by(bank=bank).all()
+        return json_serialize(branches, expand)
 
     def put(self, bank_id):
         """API Endpoint for adding a branch to a given bank
@@ -75,6 +141,7 @@ class BranchListApi(Resource):
         bank = Bank.query.get_or_404(bank_id)
         branch = BankBranch(name=args['name'], bank=bank)
         db.session.add(branch)
+        bump_versions("branches")
         db.session.commit()
         return json_serialize(branch)
 
@@ -85,9 +152,10 @@ class BranchApi(Resource):
     def get(self, bank_id, branch_id):
         """API Endpoint for getting branch instance
         """
+        expand = parse_expand(BankBranch)
         bank = Bank.query.get_or_404(bank_id)
         branch = BankBranch.query.filter_by(bank=bank, id=branch_id).first_or_404()
-        return json_serialize(branch)
+        return json_serialize(branch, expand)
 
     def post(self, bank_id, branch_id):
         """API Endpoint for modifying branch instance
@@ -96,6 +164,7 @@ class BranchApi(Resource):
         bank = Bank.query.get_or_404(bank_id)
         branch = BankBranch.query.filter_by(bank=bank, id=branch_id).first_or_404()
         branch.update(args)
+        bump_versions("branches")
         db.session.commit()
         return json_serialize(branch)
 
@@ -105,6 +174,7 @@ class BranchApi(Resource):
         bank = Bank.query.get_or_404(bank_id)
         branch = BankBranch.query.filter_by(bank=bank, id=branch_id).first_or_404()
         db.session.delete(branch)
+        bump_versions("branches")
         db.session.commit()
         return json_serialize(branch)
 
@@ -117,13 +187,15 @@ _staff_create_parser.add_argument("role", type=int, required=True, help="No Role
 class StaffListApi(Resource):
     """API Endpoint for getting and adding staff at a given bank branch
     """
+    @response_cache.versioned("banks", "branches", "staff", "users")
     def get(self, bank_id, branch_id):
         """API Endpoint for getting all staff for a branch instance
         """
+        expand = parse_expand(Staff)
         bank = Bank.query.get_or_404(bank_id)
         branch = BankBranch.query.filter_by(bank=bank, id=branch_id).first_or_404()
-        staff = branch.staff
-        return json_serialize(staff)
+        staff, headers = paginate(Staff.query.options(*Staff.json_loader_options(expand)).filter_by(branch=branch), Staff.id)
+        return json_serialize(staff, expand), 200, headers
 
     def put(self, bank_id, branch_id):
         """API Endpoint for adding staff to a branch instance
@@ -135,6 +207,8 @@ class StaffListApi(Resource):
         staff = Staff(branch=branch, user=user, role=args['role'])
         user.staff = staff
         db.session.add(staff)
+        User.permission_cache.invalidate()
+        bump_versions("staff")
         db.session.commit()
         return json_serialize(staff)
 
@@ -149,8 +223,9 @@ class StaffApi(Resource):
     def get(self, bank_id, branch_id, staff_id):
         """API Endpoint for getting staff instance
         """
+        expand = parse_expand(Staff)
         staff = Staff.query.get_or_404(staff_id)
-        return json_serialize(staff)
+        return json_serialize(staff, expand)
 
     def post(self, bank_id, branch_id, staff_id):
         """API Endpoint for updating staff instance
@@ -158,6 +233,8 @@ class StaffApi(Resource):
         args = _staff_update_parser.parse_args()
         staff = Staff.query.get_or_404(staff_id)
         staff.update(args)
+        User.permission_cache.invalidate()
+        bump_versions("staff")
         db.session.commit()
         return json_serialize(staff)
 
@@ -165,7 +242,11 @@ class StaffApi(Resource):
         """API Endpoint for deleting staff instance
         """
         staff = Staff.query.get_or_404(staff_id)
+        # Serialize before committing, as deleted instances can't load their relationships afterwards
+        result = json_serialize(staff)
         db.session.delete(staff)
+        User.permission_cache.invalidate()
+        bump_versions("staff")
         db.session.commit()
-        return json_serialize(staff)
+        return result
 
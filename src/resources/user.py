@@ -1,7 +1,8 @@
 from flask_restful import Resource, reqparse
 
 from app import db
-from utils import json_serialize
+from cache import bump_versions
+from utils import json_serialize, paginate
 from models import User
 
 
@@ -16,7 +17,8 @@ class UserListApi(Resource):
 
     def get(self):
         """API Endpoint for getting all user instances"""
-        return json_serialize(User.query.all())
+        users, headers = paginate(User.query, User.id)
+        return json_serialize(users), 200, headers
 
     def put(self):
         """API Endpoint for creating user instance"""
@@ -52,6 +54,7 @@ class UserApi(Resource):
         user = User.query.get_or_404(user_id)
         args = self.parser.parse_args()
         user.update(args)
+        bump_versions("users")
         db.session.commit()
         return json_serialize(user)
 
@@ -59,5 +62,6 @@ class UserApi(Resource):
         """API Endpoint for deleting user instance"""
         user = User.query.get_or_404(user_id)
         db.session.delete(user)
+        bump_versions("users")
         db.session.commit()
         return json_serialize(user)
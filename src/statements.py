@@ -0,0 +1,227 @@
+"""Parallel generation of monthly account statements.
+
+Accounts of a bank are split into shards of consecutive ids, which a pool of worker processes generate statements for.
+Each worker reads through its own engine, with one range query over the shard's accounts and one over their transactions since
+the start of the month, and works back from current balances to the balances at the start and end of the month.
+Each statement file is written atomically, and a marker is written once all of a shard's statements are, so that a run which
+crashed can be resumed by running it again, skipping the shards already done.
+"""
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import sqlalchemy as sa
+from flask import current_app
+
+from app import configure_sqlite, db
+from interest import interest_description
+from models import Account, Transaction, User
+from money import from_cents
+
+FORMATS = ("json", "csv")
+SHARDS_DIR = ".shards"
+
+_engine = None
+
+
+def month_bounds(month):
+    """Gets start and end of a calendar month
+
+    Arguments:
+        month {datetime} -- Any time in the month
+
+    Returns:
+        tuple -- Start of the month, and start of the next month
+    """
+    start = datetime(month.year, month.month, 1)
+    end = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+    return start, end
+
+
+def plan_shards(bank_id, shard_size):
+    """Finds shards of accounts at a bank. Shard k holds accounts with ids from k * shard_size up to (k + 1) * shard_size,
+    so that shards stay the same between runs, even if accounts are opened in between.
+
+    Arguments:
+        bank_id {int} -- Bank to generate statements for
+        shard_size {int} -- Width of the range of account ids in each shard
+
+    Returns:
+        list[int] -- Numbers of shards holding any accounts at the bank
+    """
+    shard = sa.cast(Account.id / shard_size, sa.Integer)
+    return [number for number, in db.session.query(shard).filter(Account.bank_id == bank_id).distinct().order_by(shard)]
+
+
+def _init_worker(database_uri, pragmas):
+    global _engine
+    _engine = sa.create_engine(database_uri)
+    if _engine.dialect.name == "sqlite":
+        configure_sqlite(_engine, pragmas)
+
+
+def _read_shard(connection, bank_id, low, high, start):
+    """Reads accounts of a shard, and their transactions since start
+
+    Returns:
+        tuple -- List of (id, balance in cents, owner's name) of accounts, and lists of transactions by account id
+    """
+    accounts = connection.execute(
+        sa.select([Account.id, sa.type_coerce(Account._balance, sa.Integer), User.fname, User.lname])
+        .select_from(Account.__table__.outerjoin(User.__table__, User.id == Account.user_id))
+        .where(sa.and_(Account.bank_id == bank_id, Account.id >= low, Account.id < high))
+        .order_by(Account.id)
+    ).fetchall()
+    transactions = {account_id: [] for account_id, _, _, _ in accounts}
+    rows = connection.execute(
+        sa.select([
+            Transaction.account_id, Transaction.id, Transaction.datetime, Transaction.description,
+            sa.type_coerce(Transaction.cash_amount, sa.Integer) + sa.type_coerce(Transaction._check_amount, sa.Integer),
+            sa.type_coerce(Transaction.fees, sa.Integer),
+        ])
+        .where(sa.and_(Transaction.account_id >= low, Transaction.account_id < high, Transaction.datetime >= start))
+        .order_by(Transaction.account_id, Transaction.datetime, Transaction.id)
+    )
+    for account_id, *transaction in rows:
+        if account_id in transactions:
+            transactions[account_id].append(transaction)
+    return accounts, transactions
+
+
+def build_statement(account_id, name, balance, transactions, start, end):
+    """Builds statement for one month of an account
+
+    Arguments:
+        account_id {int} -- Account to build statement of
+        name {str} -- Account owner's name
+        balance {int} -- Current balance in cents
+        transactions {list[tuple]} -- Id, datetime, description, amount and fees in cents of each transaction since start, in date order
+        start {datetime} -- Start of the month
+        end {datetime} -- Start of the next month
+
+    Returns:
+        dict -- Statement, with amounts as Decimals
+    """
+    interest = interest_description(start)
+    in_month = [transaction for transaction in transactions if transaction[1] < end]
+    closing = balance - sum(amount - fees for _, when, _, amount, fees in transactions if when >= end)
+    opening = closing - sum(amount - fees for _, _, _, amount, fees in in_month)
+
+    totals = {"deposits": 0, "withdrawals": 0, "interest": 0, "fees": 0}
+    lines = []
+    running = opening
+    for id_, when, description, amount, fees in in_month:
+        kind = "interest" if description == interest else "deposits" if amount >= 0 else "withdrawals"
+        totals[kind] += amount
+        totals["fees"] += fees
+        running += amount - fees
+        lines.append({
+            "id": id_, "datetime": when, "description": description,
+            "amount": from_cents(amount), "fees": from_cents(fees), "balance": from_cents(running),
+        })
+    statement = {"account_id": account_id, "name": name, "period": "{:%Y-%m}".format(start), "opening_balance": from_cents(opening)}
+    statement.update((kind, from_cents(total)) for kind, total in totals.items())
+    statement["closing_balance"] = from_cents(closing)
+    statement["transactions"] = lines
+    return statement
+
+
+def _write_json(statement, file):
+    json.dump(statement, file, default=str, indent=2)
+
+
+def _write_csv(statement, file):
+    writer = csv.writer(file)
+    writer.writerow(("datetime", "description", "amount", "fees", "balance"))
+    writer.writerow(("", "Opening Balance", "", "", statement["opening_balance"]))
+    for line in statement["transactions"]:
+        writer.writerow((line["datetime"], line["description"], line["amount"], line["fees"], line["balance"]))
+    writer.writerow(("", "Closing Balance", "", "", statement["closing_balance"]))
+
+
+def _write_atomically(path, write, value):
+    partial = path + ".partial"
+    with open(partial, "w", newline="") as file:
+        write(value, file)
+    os.replace(partial, path)
+
+
+def generate_shard(bank_id, shard, shard_size, start, end, directory, output_format):
+    """Generates statements of the accounts in a shard, in a worker process
+
+    Returns:
+        tuple -- Shard number, and number of statements and transactions in them
+    """
+    low, high = shard * shard_size, (shard + 1) * shard_size
+    # Balances and transactions are read in one transaction, so that they agree with each other
+    with _engine.connect() as connection, connection.begin():
+        accounts, transactions = _read_shard(connection, bank_id, low, high, start)
+
+    write = _write_json if output_format == "json" else _write_csv
+    transaction_count = 0
+    for account_id, balance, fname, lname in accounts:
+        name = " ".join(part for part in (fname, lname) if part)
+        statement = build_statement(account_id, name, balance, transactions[account_id], start, end)
+        transaction_count += len(statement["transactions"])
+        _write_atomically(os.path.join(directory, "{}.{}".format(account_id, output_format)), write, statement)
+    _write_atomically(shard_marker(directory, start, shard_size, shard, output_format), _write_json, {"accounts": len(accounts), "transactions": transaction_count})
+    return shard, len(accounts), transaction_count
+
+
+def shard_marker(directory, start, shard_size, shard, output_format):
+    """Gets path of the file marking that all statements of a shard were written for a month in a format. Markers are kept
+    apart by month and shard size, as a shard's number only names the same accounts for the same shard size.
+
+    Arguments:
+        directory {str} -- Directory statements are written to
+        start {datetime} -- Start of the month
+        shard_size {int} -- Width of the range of account ids in each shard
+        shard {int} -- Shard number
+        output_format {str} -- Format of the statements
+
+    Returns:
+        str -- Path of marker
+    """
+    return os.path.join(directory, SHARDS_DIR, "{:%Y-%m}".format(start), str(shard_size), "{}.{}.done".format(shard, output_format))
+
+
+def generate_statements(bank_id, month, directory, output_format="json", workers=None, shard_size=1000, progress=None):
+    """Generates statements for one month of every account at a bank, skipping shards already generated by earlier runs
+
+    Arguments:
+        bank_id {int} -- Bank to generate statements for
+        month {datetime} -- Any time in the month
+        directory {str} -- Directory to write statements to, one file per account
+
+    Keyword Arguments:
+        output_format {str} -- "json" or "csv" (default: {"json"})
+        workers {int} -- Number of worker processes (default: {None, one per CPU})
+        shard_size {int} -- Width of the range of account ids generated by each task (default: {1000})
+        progress {function} -- Called with the number of shards done, total shards, and the shard's number, statements and transactions (default: {None})
+
+    Returns:
+        dict -- Number of shards generated and skipped, statements and transactions generated, and seconds taken
+    """
+    start, end = month_bounds(month)
+    os.makedirs(os.path.dirname(shard_marker(directory, start, shard_size, 0, output_format)), exist_ok=True)
+    shards = plan_shards(bank_id, shard_size)
+    pending = [shard for shard in shards if not os.path.exists(shard_marker(directory, start, shard_size, shard, output_format))]
+    result = {"shards": len(pending), "skipped": len(shards) - len(pending), "statements": 0, "transactions": 0}
+
+    # Workers mustn't share the connections of this process
+    db.session.remove()
+    db.engine.dispose()
+    began = time.perf_counter()
+    with ProcessPoolExecutor(workers, initargs=(str(db.engine.url), current_app.config["SQLITE_PRAGMAS"]), initializer=_init_worker) as pool:
+        futures = [pool.submit(generate_shard, bank_id, shard, shard_size, start, end, directory, output_format) for shard in pending]
+        for done, future in enumerate(as_completed(futures), 1):
+            shard, statements, transactions = future.result()
+            result["statements"] += statements
+            result["transactions"] += transactions
+            if progress is not None:
+                progress(done, len(pending), shard, statements, transactions)
+    result["seconds"] = time.perf_counter() - began
+    return result
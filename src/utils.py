@@ -1,11 +1,179 @@
+import base64
+import binascii
+import functools
+import json
+import random
+import time
+
+from flask import abort
+from flask_restful import reqparse
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm.exc import StaleDataError
+
+import config
+from app import db, writing
 from base_model import IdModel
 
 
-def json_serialize(result):
+def json_serialize(result, expand=()):
     """Uses .json() method of model instances to json serialize instances and list of instances.
+
+    Keyword Arguments:
+        expand {iterable} -- Relationships to encode as nested objects instead of as their string value (default: {()})
     """
     if isinstance(result, IdModel):
-        return result.json()
+        return result.json(expand)
     elif isinstance(result, list):
-        return [subresult.json() for subresult in result]
+        if not result:
+            return []
+        cls = type(result[0])
+        serializer = cls.json_serializer(expand)
+        memo = {}
+        return [serializer(subresult, memo) if type(subresult) is cls else subresult.json(expand) for subresult in result]
     raise TypeError("Invalid Type: {}".format(type(result)))
+
+
+_expand_parser = reqparse.RequestParser()
+_expand_parser.add_argument("expand", type=str, required=False, default="", location="args")
+
+
+def parse_expand(model):
+    """Gets relationships requested to be encoded as nested objects, from comma separated expand request argument.
+
+    Arguments:
+        model {IdModel} -- Model class being returned
+
+    Returns:
+        tuple -- Names of relationships to expand
+    """
+    expand = tuple(attr for attr in _expand_parser.parse_args()['expand'].split(",") if attr)
+    invalid = [attr for attr in expand if attr not in model.json_expandable()]
+    if invalid:
+        abort(400, "Can't expand {}. Expandable attributes are: {}".format(", ".join(invalid), ", ".join(model.json_expandable())))
+    return expand
+
+
+_page_parser = reqparse.RequestParser()
+_page_parser.add_argument("limit", type=int, required=False, help="Invalid Page Size Provided", location="args")
+_page_parser.add_argument("after", type=str, required=False, location="args")
+
+
+def encode_cursor(values):
+    """Encodes key values of last row on a page into an opaque cursor.
+
+    Arguments:
+        values {list} -- Values of the columns the page is ordered by
+
+    Returns:
+        str -- Url-safe cursor
+    """
+    raw = json.dumps([value.isoformat() if hasattr(value, "isoformat") else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor, columns):
+    """Decodes cursor produced by encode_cursor back into key values.
+
+    Arguments:
+        cursor {str} -- Cursor provided by client
+        columns {list} -- Columns the page is ordered by, used to restore value types
+
+    Returns:
+        list -- Key values of last row on previous page
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [_cursor_value(column, value) for column, value in zip(columns, values)]
+    except (binascii.Error, TypeError, ValueError):
+        abort(400, "Invalid Cursor")
+
+
+def _cursor_value(column, value):
+    """Restores type of a key value decoded from a cursor, checking it's a scalar of its column's type
+
+    Raises:
+        ValueError: Value doesn't fit column
+    """
+    python_type = column.type.python_type
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError
+    if hasattr(python_type, "fromisoformat"):
+        if not isinstance(value, str):
+            raise ValueError
+        return python_type.fromisoformat(value)
+    if python_type is float and isinstance(value, int):
+        return float(value)
+    if not isinstance(value, python_type):
+        raise ValueError
+    return value
+
+
+def paginate(query, *columns):
+    """Applies keyset pagination to query, using limit and after request arguments.
+
+    Seeks past the cursor with a row value comparison on the ordering columns rather than an OFFSET,
+    so every page costs the same no matter how deep into the result set it is.
+
+    Arguments:
+        query {Query} -- Query to paginate
+        *columns {Column} -- Unique combination of columns to order the page by
+
+    Returns:
+        tuple -- List of results, and response headers containing the next cursor if there are more results
+    """
+    args = _page_parser.parse_args()
+    limit = min(config.DEFAULT_PAGE_SIZE if args['limit'] is None else args['limit'], config.MAX_PAGE_SIZE)
+    if limit < 1:
+        abort(400, "Page size must be positive")
+    if args['after']:
+        query = query.filter(db.tuple_(*columns) > db.tuple_(*decode_cursor(args['after'], columns)))
+    results = query.order_by(*columns).limit(limit + 1).all()
+
+    headers = {}
+    if len(results) > limit:
+        results = results[:limit]
+        headers["X-Next-Cursor"] = encode_cursor([getattr(results[-1], column.key) for column in columns])
+    return results, headers
+
+
+def _is_conflict(error):
+    """Checks whether error was caused by a concurrent update
+
+    Arguments:
+        error {Exception} -- Error raised while updating the database
+
+    Returns:
+        bool -- Whether the update could succeed if retried
+    """
+    if isinstance(error, StaleDataError):
+        # Versioned row was changed since it was read
+        return True
+    # SQLite refuses to upgrade a read transaction to a write if its snapshot is out of date, rather than waiting
+    return isinstance(error, OperationalError) and "database is locked" in str(error.orig)
+
+
+def retry_on_conflict(func):
+    """Decorator re-running a unit of work that conflicts with a concurrent update, from a clean session.
+
+    Retries back off exponentially with jitter, so that workers contending for the same rows spread out rather than colliding again.
+    They are also marked as writing, so that on SQLite they take the write lock up front and can't conflict again.
+    Gives up with 409 Conflict after config.CONFLICT_RETRIES retries.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for retry in range(config.CONFLICT_RETRIES + 1):
+            try:
+                if not retry:
+                    return func(*args, **kwargs)
+                with writing():
+                    return func(*args, **kwargs)
+            except (StaleDataError, OperationalError) as e:
+                if not _is_conflict(e):
+                    raise
+                db.session.rollback()
+            if retry < config.CONFLICT_RETRIES:
+                time.sleep(random.uniform(0, min(config.CONFLICT_MAX_BACKOFF, config.CONFLICT_BACKOFF * 2 ** retry)))
+        abort(409, "Conflicting Concurrent Update, Please Try Again")
+    return wrapper
@@ -4,4 +4,4 @@ cd src
 flask db upgrade
 flask run &
 cd .. && sleep 5 && py.test --pdb
-rm -f src/test.db
+rm -f src/test.db src/test.db.ledger
@@ -0,0 +1,52 @@
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+@pytest.fixture(scope="session")
+def app():
+    """App running in-process, with its own freshly migrated database rather than the live server's.
+    """
+    os.environ["FLASK_DB_FILE"] = os.path.join(tempfile.mkdtemp(), "test.db")
+    sys.path.insert(0, SRC_DIR)
+    from flask_migrate import upgrade
+    from app import app
+
+    with app.app_context():
+        upgrade(directory=os.path.join(SRC_DIR, "migrations"))
+    return app
+
+
+# Account config created by create_bank, unless overridden: fee-free checking without overdrafts
+ACCOUNT_CONFIG = {
+    "name": "Test Checking", "is_savings": False, "is_checking": True, "min_opening_balance": 0, "interest": 0,
+    "deposit_fee": 0, "withdrawal_fee": 0, "allow_overdraft": False, "overdraft_limit": 0, "overdraft_fee": 0,
+}
+
+_bank_numbers = itertools.count(1)
+
+
+@pytest.fixture
+def create_bank(app):
+    """Factory seeding a bank with one account config and some users, committed in their own app context.
+
+    The factory takes the full names of users to create (default: one "Test User"), and any account config fields
+    to override ACCOUNT_CONFIG with, and returns the bank id, account config id and list of user ids.
+    """
+    def create_bank(users=("Test User",), **account_config):
+        from app import db
+        from models import AccountConfig, Bank, User
+
+        with app.app_context():
+            bank = Bank(name="Test Bank {}".format(next(_bank_numbers)))
+            config = AccountConfig(bank=bank, **dict(ACCOUNT_CONFIG, **account_config))
+            users = [User(fname=name.split(" ", 1)[0], lname=name.split(" ", 1)[1]) for name in users]
+            db.session.add_all([bank, config] + users)
+            db.session.commit()
+            return bank.id, config.id, [user.id for user in users]
+    return create_bank
@@ -1,3 +1,6 @@
+import base64
+import json
+
 import requests
 from . import data
 
@@ -25,6 +28,19 @@ def test_api():
     requests.delete(BANK_LIST_URL + "3/")
     assert len(requests.get(BANK_LIST_URL).json()) == 2
 
+    # Test paginating banks
+    first_page = requests.get(BANK_LIST_URL, params={"limit": 1})
+    assert len(first_page.json()) == 1
+    second_page = requests.get(BANK_LIST_URL, params={"limit": 1, "after": first_page.headers["X-Next-Cursor"]})
+    assert len(second_page.json()) == 1
+    assert second_page.json()[0]['id'] != first_page.json()[0]['id']
+    assert "X-Next-Cursor" not in second_page.headers
+    assert requests.get(BANK_LIST_URL, params={"after": "not-a-cursor"}).status_code == 400
+    for values in ([[1, 2]], [{"a": 1}], [True], ["1"], {"id": 1}):
+        cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+        assert requests.get(BANK_LIST_URL, params={"after": cursor}).status_code == 400
+    assert requests.get(BANK_LIST_URL, params={"limit": 0}).status_code == 400
+
     # Test changing bank name and getting bank instance
     requests.post(BANK_LIST_URL + "2/", json={"name": "New Bank Corp"})
     assert requests.get(BANK_LIST_URL + "2/").json()['name'] == "New Bank Corp"
@@ -107,7 +123,7 @@ def test_api():
                                                   "allow_overdraft": True,
                                                   "overdraft_fee": 5,
                                                   "overdraft_limit": 500})
-    assert requests.get(CONFIG_LIST_URL_1 + "4/").json()['overdraft_limit'] == "500.0"
+    assert requests.get(CONFIG_LIST_URL_1 + "4/").json()['overdraft_limit'] == "500.00"
 
     """ACCOUNT TESTS"""
     ACCOUNT_LIST_URL_1 = BANK_LIST_URL + "1/" + "account/"
@@ -131,13 +147,19 @@ def test_api():
 
     # Test getting accounts instance
     assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['user'] == "Mark Smith"
-    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "500.0"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "500.00"
     assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['user'] == "Natalie Zhao"
-    assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['balance'] == "745.0"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['balance'] == "745.00"
     assert requests.get(ACCOUNT_LIST_URL_1 + "3/").json()['user'] == "Eric Erickson"
-    assert requests.get(ACCOUNT_LIST_URL_1 + "3/").json()['balance'] == "990.0"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "3/").json()['balance'] == "990.00"
     assert requests.get(ACCOUNT_LIST_URL_2 + "5/").json()['user'] == "Natalie Zhao"
-    assert requests.get(ACCOUNT_LIST_URL_2 + "5/").json()['balance'] == "745.0"
+    assert requests.get(ACCOUNT_LIST_URL_2 + "5/").json()['balance'] == "745.00"
+
+    # Test expanding relationships into nested objects
+    assert requests.get(ACCOUNT_LIST_URL_1 + "1/", params={"expand": "user"}).json()['user']['full_name'] == "Mark Smith"
+    assert [account['config']['name'] for account in requests.get(ACCOUNT_LIST_URL_1, params={"expand": "config,bank"}).json()] == \
+        ["Basic Checking", "Premium Checking", "Basic Savings"]
+    assert requests.get(ACCOUNT_LIST_URL_1, params={"expand": "transactions"}).status_code == 400
 
     """CHECK TESTS"""
     CHECK_LIST_URL_1 = ACCOUNT_LIST_URL_1 + "1/check/"
@@ -187,48 +209,154 @@ def test_api():
     account_1_check_deposit_1 = {"cash_amount": 150, "checks": [5]}
     account_2_check_deposit_1 = {"cash_amount": 150, "checks": [1]}
 
+    # Test amounts with fractions of a cent are rejected
+    assert requests.put(TRANSACTION_LIST_URL_1, json={"cash_amount": 0.001}).status_code == 400
+
     # Test cash_deposit
     assert requests.put(TRANSACTION_LIST_URL_1, json=account_1_cash_deposit_1).status_code == 200
-    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "600.0"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "600.00"
 
     assert requests.put(TRANSACTION_LIST_URL_2, json=account_2_cash_deposit_1).status_code == 200
-    assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['balance'] == "840.0"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['balance'] == "840.00"
 
     # Test Check Depoit
     assert requests.put(TRANSACTION_LIST_URL_1, json=account_1_check_deposit_1).status_code == 200
-    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "770.0"
-    assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['balance'] == "815.0"  # Subtract 20$ check and 5$ withdrawal fee for check
+    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "770.00"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['balance'] == "840.00"  # Check is only paid by issuing account once cleared
 
     assert requests.put(TRANSACTION_LIST_URL_2, json=account_2_check_deposit_1).status_code == 200
-    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "760.0"  # Subtract 10$ check. Account 1 has no fees
-    assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['balance'] == "970.0"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "770.00"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['balance'] == "995.00"
+    assert requests.get(CHECK_LIST_URL_1 + "1/").json()['is_deposited']
+    assert not requests.get(CHECK_LIST_URL_1 + "1/").json()['is_cleared']
+
+    # Test clearing debits each issuing account once
+    CHECK_CLEARING_URL_1 = BANK_LIST_URL + "1/check_clearing/"
+    response = requests.put(CHECK_CLEARING_URL_1, json={})
+    assert response.status_code == 200
+    assert response.json()['check_count'] == 2
+    assert response.json()['total'] == "30.00"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "760.00"  # Subtract 10$ check. Account 1 has no fees
+    assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['balance'] == "970.00"  # Subtract 20$ check and 5$ withdrawal fee for check
+    assert requests.get(CHECK_LIST_URL_1 + "1/").json()['is_cleared']
+    assert requests.put(CHECK_CLEARING_URL_1, json={}).json()['check_count'] == 0
 
     # Check deposit with invalid check
     assert requests.put(TRANSACTION_LIST_URL_2, json=account_2_check_deposit_1).status_code == 400
-    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "760.0"  # Subtract 10$ check. Account 1 has no fees
-    assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['balance'] == "970.0"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "760.00"  # Subtract 10$ check. Account 1 has no fees
+    assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['balance'] == "970.00"
 
     # Test cash withdrawal
     assert requests.put(TRANSACTION_LIST_URL_1, json=account_1_cash_withdrawal_1).status_code == 200
-    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "660.0"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "660.00"
     # Test overdraft fee applied
     assert requests.put(TRANSACTION_LIST_URL_1, json=account_1_cash_withdrawal_2).status_code == 200
-    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "-275.0"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "-275.00"
     # Test going over overdraft limit
     assert requests.put(TRANSACTION_LIST_URL_1, json=account_1_cash_withdrawal_3).status_code == 403
-    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "-275.0"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "-275.00"
 
     # Test working withdrawal
     assert requests.put(TRANSACTION_LIST_URL_2, json=account_2_cash_withdrawal_1).status_code == 200
-    assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['balance'] == "865.0"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['balance'] == "865.00"
 
     # Test overdraft attempt on account without overdraft
     assert requests.put(TRANSACTION_LIST_URL_3, json=account_3_cash_withdrawal_1).status_code == 403
-    assert requests.get(ACCOUNT_LIST_URL_1 + "3/").json()['balance'] == "990.0"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "3/").json()['balance'] == "990.00"
 
     # Test withdraw from savings account more than 6 times
     account_3_valid_withdraw_transaction = {"cash_amount": -1}
     for i in range(6):
         assert requests.put(TRANSACTION_LIST_URL_3, json=account_3_valid_withdraw_transaction).status_code == 200
-    assert requests.get(ACCOUNT_LIST_URL_1 + "3/").json()['balance'] == "924.0"  # Decreases by 11 per transaction: 1 for withdrawal and 10 for fee
+    assert requests.get(ACCOUNT_LIST_URL_1 + "3/").json()['balance'] == "924.00"  # Decreases by 11 per transaction: 1 for withdrawal and 10 for fee
     assert requests.put(TRANSACTION_LIST_URL_3, json=account_3_valid_withdraw_transaction).status_code == 403
+
+    # Test paginating transactions
+    transactions = requests.get(TRANSACTION_LIST_URL_3).json()
+    first_page = requests.get(TRANSACTION_LIST_URL_3, params={"limit": 5})
+    second_page = requests.get(TRANSACTION_LIST_URL_3, params={"limit": 5, "after": first_page.headers["X-Next-Cursor"]})
+    assert first_page.json() + second_page.json() == transactions
+    assert "X-Next-Cursor" not in second_page.headers
+
+    """TRANSACTION BATCH TESTS"""
+    TRANSACTION_BATCH_URL_1 = BANK_LIST_URL + "1/transaction_batch/"
+
+    batch = [
+        {"account_id": 2, "cash_amount": 10},
+        {"account_id": 3, "cash_amount": -1},  # Over savings withdrawal limit
+        {"account_id": 5, "cash_amount": 10},  # Account at a different bank
+    ]
+
+    # Test failed transaction rolls back atomic batch
+    response = requests.put(TRANSACTION_BATCH_URL_1, json={"transactions": batch})
+    assert response.status_code == 403
+    assert [result['status'] for result in response.json()['results']] == [424, 403, 424]
+    assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['balance'] == "865.00"
+
+    # Test batch with invalid atomic flag is rejected
+    assert requests.put(TRANSACTION_BATCH_URL_1, json={"transactions": batch, "atomic": "maybe"}).status_code == 400
+
+    # Test failed transactions are skipped in non-atomic batch
+    response = requests.put(TRANSACTION_BATCH_URL_1, json={"transactions": batch, "atomic": False})
+    assert response.status_code == 200
+    assert [result['status'] for result in response.json()['results']] == [200, 403, 404]
+    assert response.json()['results'][0]['transaction']['total_amount'] == "5.00"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['balance'] == "870.00"
+    assert requests.get(ACCOUNT_LIST_URL_2 + "5/").json()['balance'] == "745.00"
+
+    """REFERENCE DATA CACHE TESTS"""
+    # Test account config changes apply to the next transaction
+    assert requests.put(TRANSACTION_LIST_URL_1, json={"cash_amount": 10}).json()['total_amount'] == "10.00"
+    requests.post(CONFIG_LIST_URL_1 + "1/", json={"deposit_fee": 1})
+    assert requests.put(TRANSACTION_LIST_URL_1, json={"cash_amount": 10}).json()['total_amount'] == "9.00"
+
+    # Test deleted banks aren't served from the cache
+    bank_id = requests.put(BANK_LIST_URL, json=data.bank_3).json()['id']
+    assert requests.get(BANK_LIST_URL + "{}/account/".format(bank_id)).status_code == 200
+    requests.delete(BANK_LIST_URL + "{}/".format(bank_id))
+    assert requests.get(BANK_LIST_URL + "{}/account/".format(bank_id)).status_code == 404
+
+    """INTEREST TESTS"""
+    INTEREST_URL_1 = BANK_LIST_URL + "1/interest/"
+
+    # Test month of interest is paid into accounts with a positive balance, rounding to the nearest cent (ties to even)
+    response = requests.put(INTEREST_URL_1, json={"datetime": "2026-10-31T23:59:59"})
+    assert response.status_code == 200
+    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "-256.00"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['balance'] == "873.62"  # 870.00 * 5% / 12 = 3.625
+    assert requests.get(ACCOUNT_LIST_URL_1 + "3/").json()['balance'] == "931.70"
+    assert requests.get(TRANSACTION_LIST_URL_3).json()[-1]['description'] == "Interest for 10/2026"
+    assert requests.get(INTEREST_URL_1).json() == [response.json()]
+
+    # Test interest isn't paid twice in the same month
+    assert requests.put(INTEREST_URL_1, json={"datetime": "2026-10-31T23:59:59"}).status_code == 409
+    assert requests.get(ACCOUNT_LIST_URL_1 + "3/").json()['balance'] == "931.70"
+
+    # Test check the issuing account can't cover is returned, and taken back from the depositing account
+    assert requests.put(TRANSACTION_LIST_URL_2, json={"cash_amount": 0, "checks": [4]}).status_code == 200
+    assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['balance'] == "10868.62"
+    response = requests.put(CHECK_CLEARING_URL_1, json={})
+    assert response.json()['returned_count'] == 1
+    assert response.json()['total'] == "0.00"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "-256.00"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['balance'] == "868.62"
+    assert "Returned Checks" in [transaction['description'] for transaction in requests.get(TRANSACTION_LIST_URL_2).json()]
+    assert requests.get(CHECK_LIST_URL_1 + "4/").json()['is_returned']
+
+    """TRANSFER TESTS"""
+    TRANSFER_URL_1 = BANK_LIST_URL + "1/transfer/"
+
+    # Test transfer applies withdrawal fee of source account (5$) and deposit fee of destination account (1$)
+    response = requests.put(TRANSFER_URL_1, json={"from_account_id": 2, "to_account_id": 1, "amount": 50})
+    assert response.status_code == 200
+    assert response.json()['withdrawal']['description'] == "Transfer to Account #1"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "-207.00"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['balance'] == "813.62"
+    # Test transfer going over overdraft limit isn't applied to either account
+    assert requests.put(TRANSFER_URL_1, json={"from_account_id": 1, "to_account_id": 2, "amount": 10000}).status_code == 403
+    assert requests.get(ACCOUNT_LIST_URL_1 + "1/").json()['balance'] == "-207.00"
+    assert requests.get(ACCOUNT_LIST_URL_1 + "2/").json()['balance'] == "813.62"
+    # Test invalid transfers
+    assert requests.put(TRANSFER_URL_1, json={"from_account_id": 2, "to_account_id": 2, "amount": 50}).status_code == 400
+    assert requests.put(TRANSFER_URL_1, json={"from_account_id": 2, "to_account_id": 1, "amount": -50}).status_code == 400
+    assert requests.put(TRANSFER_URL_1, json={"from_account_id": 2, "to_account_id": 9999, "amount": 50}).status_code == 404
@@ -0,0 +1,72 @@
+import asyncio
+
+CONCURRENT_REQUESTS = 1000
+
+
+def call(asgi_app, method, path, query_string=b"", **scope):
+    """Makes a request to an ASGI app
+
+    Returns:
+        tuple -- Status code and body
+    """
+    scope.update(type="http", method=method, path=path, query_string=query_string, headers=[(b"host", b"localhost")])
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    async def run():
+        await asgi_app(scope, receive, send)
+        return messages[0]["status"], b"".join(message.get("body", b"") for message in messages[1:])
+    return run()
+
+
+def test_read_endpoints_match_flask(app):
+    """Test that read endpoints served over ASGI respond like the Flask app, also with many requests in flight at once.
+    """
+    from app import db
+    from asgi import app as asgi_app
+    from models import Bank
+
+    with app.app_context():
+        bank = Bank(name="ASGI Bank")
+        db.session.add(bank)
+        db.session.commit()
+        bank_id = bank.id
+
+    path = "{}/bank/{}/".format(app.config["BASE_PATH"], bank_id)
+    expected = app.test_client().get(path).get_data()
+
+    async def run():
+        return await asyncio.gather(*(call(asgi_app, "GET", path) for _ in range(CONCURRENT_REQUESTS)))
+    assert asyncio.run(run()) == [(200, expected)] * CONCURRENT_REQUESTS
+
+    list_path = "{}/bank/".format(app.config["BASE_PATH"])
+    assert asyncio.run(call(asgi_app, "GET", list_path, b"limit=1")) == (200, app.test_client().get(list_path + "?limit=1").get_data())
+    assert asyncio.run(call(asgi_app, "GET", path + "account/9999/"))[0] == 404
+
+    # Test an app mounted under a root path serves the same paths below it
+    assert asyncio.run(call(asgi_app, "GET", "/mount" + path, root_path="/mount")) == (200, expected)
+
+    # Test writes and routes that aren't read endpoints aren't served
+    assert asyncio.run(call(asgi_app, "PUT", list_path))[0] == 405
+    assert asyncio.run(call(asgi_app, "GET", "{}/user/".format(app.config["BASE_PATH"])))[0] == 404
+
+
+def test_requests_keep_connection_details():
+    """Test that the client, scheme, server and root path of an ASGI request are passed on to the Flask app.
+    """
+    from asgi import _environ
+
+    scope = {
+        "type": "http", "method": "GET", "scheme": "https", "path": "/mount/bank/", "root_path": "/mount", "query_string": b"limit=1",
+        "client": ("10.0.0.1", 5123), "server": ("bank.example", 8443), "headers": [(b"host", b"bank.example:8443"), (b"x-a", b"1"), (b"x-a", b"2")],
+    }
+    environ = _environ(scope, b"")
+    assert (environ["REMOTE_ADDR"], environ["REMOTE_PORT"]) == ("10.0.0.1", "5123")
+    assert (environ["wsgi.url_scheme"], environ["SERVER_NAME"], environ["SERVER_PORT"]) == ("https", "bank.example", "8443")
+    assert (environ["SCRIPT_NAME"], environ["PATH_INFO"], environ["QUERY_STRING"]) == ("/mount", "/bank/", "limit=1")
+    assert (environ["HTTP_HOST"], environ["HTTP_X_A"]) == ("bank.example:8443", "1,2")
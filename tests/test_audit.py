@@ -0,0 +1,38 @@
+def test_audit_finds_tampered_balances(app, create_bank):
+    """Test that audits pass correct accounts and fail tampered ones, with and without --full, and that audits from checkpoints
+    only miss tampering with transactions made before the checkpoint, which --full catches.
+    """
+    from app import db
+    from models import Account, BalanceCheckpoint, Transaction
+
+    bank_id, account_config_id, (user_id,) = create_bank(users=["Aud Itor"])
+    base = "{}/bank/{}/account/".format(app.config["BASE_PATH"], bank_id)
+    client = app.test_client()
+    account_id_1, account_id_2 = (client.put(base, json={
+        "user_id": user_id, "account_config_id": account_config_id, "initial_deposit": 100}).get_json()["id"] for _ in range(2))
+    runner = app.test_cli_runner()
+
+    def audit(*args):
+        return runner.invoke(args=["audit", "--bank-id", str(bank_id)] + list(args))
+
+    for args in ((), ("--full",)):
+        result = audit(*args)
+        assert result.exit_code == 0 and "Audited 1 banks" in result.output, result.output
+    with app.app_context():
+        assert BalanceCheckpoint.query.filter_by(account_id=account_id_1).count() == 1
+
+        # Tamper with a balance
+        db.session.execute(Account.__table__.update().where(Account.id == account_id_2).values(_balance=500))
+        db.session.commit()
+    for args in ((), ("--full",)):
+        result = audit(*args)
+        assert result.exit_code != 0 and "accounts #s {}\n".format(account_id_2) in result.output, result.output
+
+    with app.app_context():
+        # Tamper with a transaction the latest checkpoint of the first account already covers
+        db.session.execute(Transaction.__table__.update().where(Transaction.account_id == account_id_1).values(cash_amount=5000))
+        db.session.commit()
+    assert "accounts #s {}\n".format(account_id_2) in audit().output
+    assert "accounts #s {}, {}\n".format(account_id_1, account_id_2) in audit("--full").output
+
+    assert runner.invoke(args=["audit", "--bank-id", "999999"]).output == "Error: No bank with id 999999\n"
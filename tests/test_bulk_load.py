@@ -0,0 +1,96 @@
+import os
+import tempfile
+from decimal import Decimal
+
+import pytest
+
+FILES = {
+    "users": "id,fname,lname,credit_score\n1,Bea,Bulk,\n2,Lou,Load,720\n",
+    "account_configs": (
+        "id,name,is_savings,is_checking,min_opening_balance,interest,deposit_fee,withdrawal_fee,allow_overdraft,overdraft_limit,overdraft_fee\n"
+        "1,Bulk Savings,true,false,0,0.01,0,0.50,false,0,0\n"
+    ),
+    "accounts": "id,user_id,config_id,closed\n1,1,1,\n2,2,1,false\n3,2,1,true\n",
+    "transactions": (
+        "account_id,cash_amount,fees,check_amount,description,datetime\n"
+        "1,100.00,,,Deposit,2020-01-01T09:00:00\n"
+        "1,-20.00,0.50,,Withdrawal,2020-01-02T09:00:00\n"
+        "1,0.25,0.75,,Deposit,2020-01-02T10:00:00\n"
+        "2,0,,12.34,Check deposit,2020-01-03\n"
+    ),
+    "checks": "issuing_account_id,payable_to,amount,void\n1,Lou Load,12.34,\n",
+}
+
+
+def write_files(files):
+    """Writes input files to a new directory
+
+    Returns:
+        dict -- Path of each file by kind
+    """
+    directory = tempfile.mkdtemp()
+    paths = {}
+    for kind, content in files.items():
+        paths[kind] = os.path.join(directory, kind + ".csv")
+        with open(paths[kind], "w") as file:
+            file.write(content)
+    return paths
+
+
+def bulk_load(app, bank_id, paths):
+    args = ["bulk-load", "--bank-id", str(bank_id), "--batch-size", "2"]
+    for kind, path in paths.items():
+        args += ["--" + kind.replace("_", "-"), path]
+    return app.test_cli_runner().invoke(args=args)
+
+
+def test_files_are_bulk_loaded(app, create_bank):
+    """Test that rows referring to each other by ids in files are loaded with those relations, and balances and withdrawal counters
+    computed from the loaded transactions. Test that an invalid row fails the whole load.
+    """
+    from models import Bank, Check, User, WithdrawalCounter
+
+    bank_id, _, _ = create_bank(users=())
+
+    result = bulk_load(app, bank_id, write_files(FILES))
+    assert result.exit_code == 0, result.output
+    assert "transactions: 4 rows" in result.output and "Loaded 11 rows" in result.output
+
+    with app.app_context():
+        bank = Bank.query.get(bank_id)
+        accounts = sorted(bank.accounts, key=lambda account: account.id)
+        assert [(account.user.fname, account.balance, account.closed) for account in accounts] == [
+            ("Bea", Decimal("79.00"), False), ("Lou", Decimal("12.34"), False), ("Lou", Decimal("0.00"), True)]
+        assert accounts[0].user.credit_score == "695" and accounts[1].user.credit_score == "720"
+        assert accounts[0].config.withdrawal_fee == Decimal("0.50") and accounts[0].config.is_savings
+        assert [check.amount for check in Check.query.filter_by(issuing_account_id=accounts[0].id)] == [Decimal("12.34")]
+        assert [(counter.year, counter.month, counter.count) for counter in WithdrawalCounter.query.filter_by(account_id=accounts[0].id)] == [(2020, 1, 1)]
+        users = User.query.count()
+
+    invalid = dict(FILES, accounts=FILES["accounts"] + "4,3,1,\n")
+    result = bulk_load(app, bank_id, write_files(invalid))
+    assert result.exit_code != 0 and "accounts.csv:5: No user with id 3 was loaded" in result.output
+    with app.app_context():
+        assert User.query.count() == users
+
+
+def test_parquet_files_are_bulk_loaded(app, create_bank):
+    """Test that Parquet files are loaded like CSV files, with values of the types Parquet stores rather than strings.
+    """
+    pyarrow_csv = pytest.importorskip("pyarrow.csv")
+    import pyarrow.parquet
+    from models import Bank
+
+    paths = write_files(FILES)
+    for kind, path in paths.items():
+        paths[kind] = path[:-len(".csv")] + ".parquet"
+        pyarrow.parquet.write_table(pyarrow_csv.read_csv(path), paths[kind])
+    bank_id, _, _ = create_bank(users=())
+
+    result = bulk_load(app, bank_id, paths)
+    assert result.exit_code == 0, result.output
+    assert "Loaded 11 rows" in result.output
+    with app.app_context():
+        accounts = sorted(Bank.query.get(bank_id).accounts, key=lambda account: account.id)
+        assert [(account.user.credit_score, account.balance, account.closed) for account in accounts] == [
+            ("695", Decimal("79.00"), False), ("720", Decimal("12.34"), False), ("720", Decimal("0.00"), True)]
@@ -0,0 +1,119 @@
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+THREADS = 16
+WITHDRAWALS_PER_THREAD = 20
+OPENING_BALANCE = 100
+
+
+def create_account(app, create_bank):
+    """Creates checking account without overdraft or fees, with 100.00 in it
+
+    Returns:
+        tuple -- Bank id and account id
+    """
+    from app import db
+    from models import Account, Transaction
+
+    bank_id, account_config_id, (user_id,) = create_bank(users=["Pat Concurrent"])
+    with app.app_context():
+        account = Account(user_id=user_id, bank_id=bank_id, config_id=account_config_id, _balance=OPENING_BALANCE)
+        db.session.add_all([account, Transaction(account=account, cash_amount=OPENING_BALANCE, description="Opening Deposit")])
+        db.session.commit()
+        return bank_id, account.id
+
+
+def hammer(withdraw):
+    """Runs withdrawals of 1.00 from many threads at once
+
+    Arguments:
+        withdraw {function} -- Makes one withdrawal, returning its HTTP status code
+
+    Returns:
+        list[int] -- Status code of each withdrawal
+    """
+    with ThreadPoolExecutor(THREADS) as pool:
+        return list(pool.map(lambda _: withdraw(), range(THREADS * WITHDRAWALS_PER_THREAD)))
+
+
+def assert_no_lost_updates(app, account_id, statuses):
+    """Checks that exactly as many withdrawals succeeded as the balance allowed, and that every one of them was applied once
+    """
+    from app import db
+    from models import Account, Transaction
+
+    assert statuses.count(200) == OPENING_BALANCE
+    assert statuses.count(403) == len(statuses) - OPENING_BALANCE
+    with app.app_context():
+        account = Account.query.get(account_id)
+        assert account.balance == 0
+        assert account.version == 1 + OPENING_BALANCE
+        assert db.session.query(db.func.count(Transaction.id)).filter(Transaction.account_id == account_id).scalar() == 1 + OPENING_BALANCE
+        assert not Account.audit_accounts(Account.query.filter_by(id=account_id), full=True)
+
+
+def test_concurrent_withdrawals_through_api(app, create_bank):
+    """Test that concurrent withdrawal requests can't overdraw an account or lose updates.
+    """
+    bank_id, account_id = create_account(app, create_bank)
+    url = "{}/bank/{}/account/{}/transaction/".format(app.config["BASE_PATH"], bank_id, account_id)
+
+    def withdraw():
+        return app.test_client().put(url, json={"cash_amount": -1}).status_code
+
+    statuses = hammer(withdraw)
+    assert_no_lost_updates(app, account_id, statuses)
+
+
+def test_concurrent_withdrawals_are_retried(app, create_bank):
+    """Test that withdrawals outside requests, which don't take the write lock up front, retry on conflicts instead of losing updates.
+    """
+    from app import db
+    from models import Account
+    from resources.accounts import _process_transaction
+    from utils import retry_on_conflict
+
+    _, account_id = create_account(app, create_bank)
+
+    @retry_on_conflict
+    def process_withdrawal():
+        _process_transaction(Account.query.get(account_id), Decimal(-1), [])
+        db.session.commit()
+
+    def withdraw():
+        with app.app_context():
+            try:
+                process_withdrawal()
+                return 200
+            except Exception as e:
+                db.session.rollback()
+                return getattr(e, "code", 500)
+
+    statuses = hammer(withdraw)
+    assert_no_lost_updates(app, account_id, statuses)
+
+
+def test_concurrent_transfers_in_both_directions(app, create_bank):
+    """Test that transfers made concurrently in opposite directions between two accounts neither deadlock nor lose updates.
+    """
+    from models import Account
+
+    bank_id_1, account_id_1 = create_account(app, create_bank)
+    bank_id_2, account_id_2 = create_account(app, create_bank)
+    directions = (
+        ("{}/bank/{}/transfer/".format(app.config["BASE_PATH"], bank_id_1), {"from_account_id": account_id_1, "to_account_id": account_id_2, "amount": 1}),
+        ("{}/bank/{}/transfer/".format(app.config["BASE_PATH"], bank_id_2), {"from_account_id": account_id_2, "to_account_id": account_id_1, "amount": 1}),
+    )
+    made = iter(range(THREADS * WITHDRAWALS_PER_THREAD))
+
+    def transfer():
+        url, body = directions[next(made) % 2]
+        return app.test_client().put(url, json=body).status_code
+
+    statuses = hammer(transfer)
+    assert set(statuses) <= {200, 403}
+    with app.app_context():
+        accounts = Account.query.filter(Account.id.in_((account_id_1, account_id_2))).all()
+        assert sum(account.balance for account in accounts) == 2 * OPENING_BALANCE
+        assert [account.version for account in accounts] == [1 + statuses.count(200)] * 2
+        assert not Account.audit_accounts(Account.query.filter(Account.id.in_((account_id_1, account_id_2))), full=True)
@@ -0,0 +1,59 @@
+import csv
+import json
+from datetime import datetime
+from io import StringIO
+
+
+def create_history(app, create_bank):
+    """Creates a bank with two fee-free accounts, each with a transaction on each of the first three days of 2020
+
+    Returns:
+        tuple -- Bank id and ids of the accounts
+    """
+    from app import db
+    from models import Account, Transaction
+
+    bank_id, account_config_id, (user_id,) = create_bank(users=["Ed Export"])
+    with app.app_context():
+        accounts = [Account(bank_id=bank_id, config_id=account_config_id, user_id=user_id) for _ in range(2)]
+        db.session.add_all(accounts)
+        for day in (3, 1, 2):
+            for account in accounts:
+                db.session.add(Transaction(account=account, cash_amount=day, fees=0, description="Day {}".format(day), datetime=datetime(2020, 1, day)))
+        db.session.commit()
+        return bank_id, [account.id for account in accounts]
+
+
+def test_transactions_are_exported(app, create_bank):
+    """Test that a bank's transactions are streamed as NDJSON and CSV, by account then date, and filtered by account and date.
+    """
+    bank_id, (account_id_1, account_id_2) = create_history(app, create_bank)
+    client = app.test_client()
+    url = "{}/bank/{}/transaction_export/".format(app.config["BASE_PATH"], bank_id)
+
+    response = client.get(url)
+    assert response.status_code == 200 and response.mimetype == "application/x-ndjson" and response.is_streamed
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(row["account_id"], row["description"]) for row in rows] == [
+        (account_id, "Day {}".format(day)) for account_id in (account_id_1, account_id_2) for day in (1, 2, 3)]
+    assert rows[0]["total_amount"] == "1.00" and rows[0]["datetime"] == "2020-01-01 00:00:00"
+
+    response = client.get(url, query_string={"format": "csv", "account_id": account_id_2, "start": "2020-01-02", "end": "2020-01-03"})
+    rows = list(csv.DictReader(StringIO(response.get_data(as_text=True))))
+    assert [(int(row["account_id"]), row["cash_amount"]) for row in rows] == [(account_id_2, "2.00")]
+
+    assert client.get(url, query_string={"format": "xml"}).status_code == 400
+    assert client.get(url, query_string={"account_id": 0}).status_code == 404
+
+    result = app.test_cli_runner().invoke(args=["export-transactions", "--account-id", str(account_id_1), "--format", "csv", "--start", "2020-01-03"])
+    assert result.exit_code == 0
+    assert [row["description"] for row in csv.DictReader(StringIO(result.output))] == ["Day 3"]
+
+    # Test unknown banks and accounts are reported instead of exporting nothing
+    other_bank_id, _, _ = create_bank(users=())
+    for args, message in (
+            (["--bank-id", "0"], "No bank with id 0"),
+            (["--account-id", "0"], "No account with id 0"),
+            (["--bank-id", str(other_bank_id), "--account-id", str(account_id_1)], "No account with id {} at bank {}".format(account_id_1, other_bank_id))):
+        result = app.test_cli_runner().invoke(args=["export-transactions"] + args)
+        assert result.exit_code != 0 and message in result.output
@@ -0,0 +1,96 @@
+def create_accounts(app, create_bank):
+    """Creates a bank with two fee-free accounts, with 100.00 deposited into each through the API
+
+    Returns:
+        tuple -- Bank id and ids of the accounts
+    """
+    bank_id, account_config_id, (user_id,) = create_bank(users=["Lee Ledger"])
+
+    url = "{}/bank/{}/account/".format(app.config["BASE_PATH"], bank_id)
+    client = app.test_client()
+    account_ids = [
+        client.put(url, json={"user_id": user_id, "account_config_id": account_config_id, "initial_deposit": 100}).get_json()["id"]
+        for _ in range(2)
+    ]
+    return bank_id, account_ids
+
+
+def test_replay_matches_database(app, create_bank):
+    """Test that balances and withdrawal counts replayed from the ledger match those kept in the database, and can be restored from it.
+    """
+    import ledger
+    from app import db
+    from models import Account, WithdrawalCounter
+
+    bank_id, (account_id_1, account_id_2) = create_accounts(app, create_bank)
+    client = app.test_client()
+    base = app.config["BASE_PATH"]
+    assert client.put("{}/bank/{}/account/{}/transaction/".format(base, bank_id, account_id_1), json={"cash_amount": -30}).status_code == 200
+    assert client.put("{}/bank/{}/transfer/".format(base, bank_id), json={
+        "from_account_id": account_id_2, "to_account_id": account_id_1, "amount": 20}).status_code == 200
+
+    with app.app_context():
+        replayed = ledger.replay()
+        result = ledger.audit(replayed)
+        assert result["behind"] == 0
+        assert account_id_1 not in result["mismatched"] and account_id_2 not in result["mismatched"]
+        balances = dict(zip(replayed["account_ids"].tolist(), replayed["balances"].tolist()))
+        assert (balances[account_id_1], balances[account_id_2]) == (9000, 8000)
+
+        # Test a lost balance update is found and restored
+        db.session.execute(Account.__table__.update().where(Account.id == account_id_1).values(_balance=0))
+        db.session.commit()
+        assert account_id_1 in ledger.audit(replayed)["mismatched"]
+        ledger.restore(replayed, [account_id_1])
+        db.session.commit()
+        assert Account.query.get(account_id_1).balance == 90
+        counters = WithdrawalCounter.query.filter(WithdrawalCounter.account_id.in_((account_id_1, account_id_2))).all()
+        assert sorted((counter.account_id, counter.count) for counter in counters) == [(account_id_1, 1), (account_id_2, 1)]
+
+
+def test_replayed_withdrawals_match_counters(app, create_bank):
+    """Test that only transactions counted as withdrawals when made are replayed as withdrawals, rather than any with a negative total.
+    """
+    import ledger
+    from models import WithdrawalCounter
+
+    bank_id, account_config_id, (user_id,) = create_bank(users=["Lee Ledger"], deposit_fee=1)
+    base = "{}/bank/{}/account/".format(app.config["BASE_PATH"], bank_id)
+    client = app.test_client()
+    account_id = client.put(base, json={"user_id": user_id, "account_config_id": account_config_id, "initial_deposit": 100}).get_json()["id"]
+    assert client.put("{}{}/transaction/".format(base, account_id), json={"cash_amount": 0.5}).status_code == 200
+    assert client.put("{}{}/transaction/".format(base, account_id), json={"cash_amount": -10}).status_code == 200
+
+    with app.app_context():
+        counter_account_ids, _, _, counts = ledger.replay()["counters"]
+        assert counts[counter_account_ids == account_id].tolist() == [WithdrawalCounter.query.filter_by(account_id=account_id).one().count] == [1]
+
+
+def test_partial_batch_is_appended(app, create_bank):
+    """Test that transactions committed by a non-atomic batch are appended to the ledger, even though a failed one was rolled back.
+    """
+    import ledger
+
+    bank_id, (account_id, _) = create_accounts(app, create_bank)
+    response = app.test_client().put("{}/bank/{}/transaction_batch/".format(app.config["BASE_PATH"], bank_id), json={
+        "atomic": False, "transactions": [{"account_id": account_id, "cash_amount": 5}, {"account_id": 9999, "cash_amount": 5}]})
+    assert [result["status"] for result in response.get_json()["results"]] == [200, 404]
+
+    with app.app_context():
+        assert ledger.audit(ledger.replay())["behind"] == 0
+
+
+def test_partly_written_record_is_dropped(app, create_bank):
+    """Test that a record cut short by a crash is dropped, and appended again by the next sync.
+    """
+    import config
+    import ledger
+
+    create_accounts(app, create_bank)
+    with app.app_context():
+        records = ledger.replay()["records"]
+        with open(config.LEDGER_FILE, "r+b") as log:
+            log.truncate(log.seek(0, 2) - ledger.RECORD.itemsize // 2)
+        assert ledger.replay()["records"] == records - 1
+        assert ledger.sync() == 1
+        assert ledger.replay()["records"] == records
@@ -0,0 +1,39 @@
+import re
+
+
+def sample(exposition, name, **labels):
+    """Finds value of a sample in a Prometheus text exposition
+
+    Returns:
+        float -- Value of the sample, or 0 if it isn't exposed
+    """
+    for line in exposition.splitlines():
+        match = re.match(r"(\w+)(?:\{(.*)\})? (\S+)$", line)
+        if match and match.group(1) == name and dict(re.findall(r'(\w+)="([^"]*)"', match.group(2) or "")) == labels:
+            return float(match.group(3))
+    return 0
+
+
+def test_metrics_are_recorded_per_route(app):
+    """Test that requests, SQL statements, rows and commits are counted under the route that made them.
+    """
+    client = app.test_client()
+    route = app.config["BASE_PATH"] + "/bank/"
+    before = client.get("/metrics").get_data(as_text=True)
+
+    assert client.put(route, json={"name": "Metrics Bank"}).status_code == 200
+    for _ in range(3):
+        assert client.get(route).status_code == 200
+    exposition = client.get("/metrics").get_data(as_text=True)
+
+    def delta(name, **labels):
+        return sample(exposition, name, **labels) - sample(before, name, **labels)
+
+    assert delta("http_requests_total", route=route, method="GET", status="200") == 3
+    assert delta("http_request_duration_seconds_count", route=route, method="GET") == 3
+    assert delta("http_request_duration_seconds_bucket", route=route, method="GET", le="+Inf") == 3
+    assert delta("db_statements_per_request_count", route=route, method="GET") == 3
+    assert delta("db_statements_per_request_sum", route=route, method="GET") >= 3
+    assert delta("db_rows_fetched_per_request_sum", route=route, method="GET") >= 3
+    assert delta("db_commit_duration_seconds_count", route=route, method="PUT") == 1
+    assert delta("db_commit_duration_seconds_count", route=route, method="GET") == 0
@@ -0,0 +1,40 @@
+def test_permission_levels_follow_staff_changes(app):
+    """Test that cached staff roles are used for permission levels, and dropped when staff change.
+    """
+    import config
+    from app import db
+    from models import Bank, BankBranch, User
+
+    with app.app_context():
+        bank = Bank(name="Permissions Bank")
+        branch = BankBranch(name="Main", bank=bank)
+        user = User(fname="Pat", lname="Teller")
+        superuser = User(fname="Sam", lname="Admin", _is_superuser=True)
+        db.session.add_all([bank, branch, user, superuser])
+        db.session.commit()
+        bank_id, branch_id, user_id, superuser_id = bank.id, branch.id, user.id, superuser.id
+
+    def permission_level(user_id):
+        with app.app_context():
+            return User.query.get(user_id).get_permission_level(bank_id)
+
+    client = app.test_client()
+    staff_list_url = "{}/bank/{}/branch/{}/staff/".format(app.config["BASE_PATH"], bank_id, branch_id)
+
+    assert permission_level(user_id) == config.CUSTOMER
+    assert permission_level(superuser_id) == config.ADMIN
+
+    staff_id = client.put(staff_list_url, json={"user_id": user_id, "role": config.TELLER}).get_json()['id']
+    assert permission_level(user_id) == config.TELLER
+
+    with app.app_context():
+        user = User.query.get(user_id)
+        assert user.bank_roles is user.bank_roles  # Served from the cache
+        assert user.get_permission_level(Bank.query.get(bank_id)) == config.TELLER
+        assert user.get_permission_level() == config.CUSTOMER
+
+    client.post(staff_list_url + "{}/".format(staff_id), json={"role": config.MANAGER})
+    assert permission_level(user_id) == config.MANAGER
+
+    assert client.delete(staff_list_url + "{}/".format(staff_id)).status_code == 200
+    assert permission_level(user_id) == config.CUSTOMER
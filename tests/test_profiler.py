@@ -0,0 +1,42 @@
+import marshal
+
+
+def test_sampled_requests_are_profiled(app):
+    """Test that admins can profile requests to a route, and download the merged profiles.
+    """
+    from app import db
+    from models import User
+
+    with app.app_context():
+        admin, customer = User(fname="Ada", lname="Admin", _is_superuser=True), User(fname="Cal", lname="Customer")
+        db.session.add_all([admin, customer])
+        db.session.commit()
+        admin_id, customer_id = admin.id, customer.id
+
+    client = app.test_client()
+    base = app.config["BASE_PATH"]
+    profile_url = base + "/admin/profile/"
+
+    assert client.put(profile_url, json={"user_id": customer_id, "rate": 1}).status_code == 403
+    assert client.put(profile_url, json={"user_id": admin_id, "rate": 2}).status_code == 400
+    assert client.put(profile_url, json={"user_id": admin_id, "rate": 1, "routes": ["/nowhere/"]}).status_code == 400
+    assert client.delete(profile_url, query_string={"user_id": admin_id}).status_code == 200
+    assert client.get(profile_url + "text/", query_string={"user_id": admin_id}).status_code == 404
+
+    assert client.put(profile_url, json={"user_id": admin_id, "rate": 1, "routes": ["/user/"]}).status_code == 200
+    for _ in range(3):
+        assert client.get(base + "/user/").status_code == 200
+    assert client.get(base + "/bank/").status_code == 200
+    status = client.get(profile_url, query_string={"user_id": admin_id}).get_json()
+    assert status["samples"] == {"/user/": 3}
+
+    download = client.get(profile_url + "pstats/", query_string={"user_id": admin_id, "route": "/user/"})
+    assert download.status_code == 200
+    assert "attachment" in download.headers["Content-Disposition"]
+    assert any(name == "get" and filename.endswith("user.py") for filename, _, name in marshal.loads(download.get_data()))
+    collapsed = client.get(profile_url + "collapsed/", query_string={"user_id": admin_id}).get_data(as_text=True)
+    assert any(line.rsplit(" ", 1)[1].isdigit() and "user.py" in line for line in collapsed.splitlines())
+    assert "cumulative" in client.get(profile_url + "text/", query_string={"user_id": admin_id}).get_data(as_text=True)
+    assert client.get(profile_url + "svg/", query_string={"user_id": admin_id}).status_code == 404
+
+    assert client.delete(profile_url, query_string={"user_id": admin_id}).get_json() == {"rate": 0, "routes": None, "samples": {}}
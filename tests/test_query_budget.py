@@ -0,0 +1,68 @@
+import pytest
+
+# Statements each read endpoint may execute, whatever the number of rows it returns
+BUDGETS = {
+    "/bank/": 2,
+    "/bank/{bank_id}/": 2,
+    "/bank/{bank_id}/account/": 6,
+    "/bank/{bank_id}/account/{account_id}/": 5,
+    "/bank/{bank_id}/account/{account_id}/transaction/": 5,
+    "/bank/{bank_id}/account/{account_id}/check/": 5,
+}
+
+
+def open_accounts(app, create_bank, count):
+    """Opens fee-free accounts at a new bank, each with an opening deposit and three checks written through the API
+
+    Returns:
+        tuple -- Bank id and ids of the accounts
+    """
+    bank_id, account_config_id, user_ids = create_bank(users=["Bea Budget {}".format(i) for i in range(count)])
+
+    client = app.test_client()
+    base = "{}/bank/{}".format(app.config["BASE_PATH"], bank_id)
+    account_ids = []
+    for user_id in user_ids:
+        account_id = client.put(base + "/account/", json={"user_id": user_id, "account_config_id": account_config_id, "initial_deposit": 100}).get_json()["id"]
+        for amount in (5, 10, 15):
+            check = {"payable_to": "Bea Budget", "amount": amount}
+            assert client.put("{}/account/{}/check/".format(base, account_id), json=check).status_code == 200
+        account_ids.append(account_id)
+    return bank_id, account_ids
+
+
+@pytest.mark.parametrize("route", sorted(BUDGETS))
+def test_read_endpoints_stay_within_query_budget(app, create_bank, route):
+    """Test that read endpoints execute a fixed number of statements, none of them repeatedly.
+    """
+    from query_tracker import query_budget
+
+    bank_id, account_ids = open_accounts(app, create_bank, 10)
+    url = app.config["BASE_PATH"] + route.format(bank_id=bank_id, account_id=account_ids[0])
+    client = app.test_client()
+    # Warm caches of reference data, which are only loaded on the first request
+    assert client.get(url).status_code == 200
+    with app.app_context(), query_budget(BUDGETS[route], threshold=1):
+        assert client.get(url).status_code == 200
+
+
+def test_lazy_loads_in_loop_are_reported(app, create_bank):
+    """Test that lazy loading a relationship of each of a query's results is reported with the relationship and call site.
+    """
+    from app import db
+    from models import Account
+    from query_tracker import NPlusOneError, track_queries
+
+    bank_id, _ = open_accounts(app, create_bank, 3)
+    with app.app_context():
+        with track_queries() as tracker:
+            accounts = Account.query.filter_by(bank_id=bank_id).all()
+            for account in accounts:
+                assert account.transactions
+        assert tracker.lazy_loads["Account.transactions"] == 3
+        assert "test_query_budget.py" in tracker.call_sites["Account.transactions"]
+
+        db.session.expire_all()
+        with pytest.raises(NPlusOneError, match="Account.transactions"), track_queries(threshold=2):
+            for account in Account.query.filter_by(bank_id=bank_id).all():
+                account.transactions
@@ -0,0 +1,98 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+# Tables that are meant to be read whole
+SCANNABLE_TABLES = ("cache_version",)
+
+
+@contextmanager
+def capture_statements(engine):
+    """Records every statement executed on engine, along with its parameters.
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def seed(db):
+    """Adds two of everything listed by the endpoints, so that every list has a second page.
+
+    Returns:
+        dict -- Ids of the bank, branch and account to list the contents of
+    """
+    import config
+    from models import Account, AccountConfig, Bank, BankBranch, Check, CheckClearing, InterestAccrual, Staff, Transaction, User
+
+    banks = [Bank(name="Query Plan Bank {}".format(i)) for i in range(2)]
+    bank = banks[0]
+    branches = [BankBranch(name="Branch {}".format(i), bank=bank) for i in range(2)]
+    branch = branches[0]
+    users = [User(fname="First", lname="Last {}".format(i)) for i in range(2)]
+    staff = [Staff(user=user, branch=branch, role=config.TELLER) for user in users]
+    account_configs = [AccountConfig(
+        name="Config {}".format(i), is_savings=False, is_checking=True, min_opening_balance=0, interest=0,
+        deposit_fee=0, withdrawal_fee=0, allow_overdraft=False, overdraft_limit=0, overdraft_fee=0, bank=bank) for i in range(2)]
+    accounts = [Account(user=users[0], bank=bank, config=account_configs[0], _balance=100) for i in range(2)]
+    account = accounts[0]
+    checks = [Check(issuing_account=account, payable_to=users[0].full_name, amount=1) for i in range(2)]
+    transactions = [Transaction(account=account, cash_amount=50) for i in range(2)]
+    interest_accruals = [InterestAccrual(bank=bank, year=2026, month=month) for month in range(1, 3)]
+    check_clearings = [CheckClearing(bank=bank) for i in range(2)]
+    db.session.add_all(banks + branches + users + staff + account_configs + accounts + checks + transactions + interest_accruals + check_clearings)
+    db.session.commit()
+    return {"bank_id": bank.id, "branch_id": branch.id, "account_id": account.id}
+
+
+def test_list_endpoints_use_indexes(app):
+    """Test that the queries behind each list endpoint search indexes instead of scanning tables.
+
+    The second page of every list is requested, as keyset pagination should seek straight to the cursor.
+    """
+    from app import db
+
+    with app.app_context():
+        ids = seed(db)
+
+    endpoints = (
+        ("bank/", {}),
+        ("bank/{bank_id}/branch/", {}),
+        ("bank/{bank_id}/branch/{branch_id}/staff/", {}),
+        ("bank/{bank_id}/account_config/", {}),
+        ("bank/{bank_id}/account/", {"expand": "user,config"}),
+        ("bank/{bank_id}/account/{account_id}/transaction/", {}),
+        ("bank/{bank_id}/account/{account_id}/check/", {}),
+        ("bank/{bank_id}/interest/", {}),
+        ("bank/{bank_id}/check_clearing/", {}),
+        ("bank/{bank_id}/transaction_export/", {"start": "2000-01-01"}),
+        ("user/", {}),
+    )
+    client = app.test_client()
+    for path, params in endpoints:
+        url = app.config["BASE_PATH"] + "/" + path.format(**ids)
+        params = dict(params, limit=1)
+        cursor = client.get(url, query_string=params).headers.get("X-Next-Cursor")
+        if cursor:
+            params["after"] = cursor
+
+        with app.app_context(), capture_statements(db.engine) as statements:
+            assert client.get(url, query_string=params).status_code == 200
+
+        with app.app_context():
+            connection = db.engine.raw_connection()
+            try:
+                for statement, parameters in statements:
+                    if not statement.lstrip().upper().startswith("SELECT"):
+                        continue
+                    plan = [row[-1] for row in connection.execute("EXPLAIN QUERY PLAN " + statement, parameters)]
+                    scans = [step for step in plan if step.startswith("SCAN") and not step.split()[1] in SCANNABLE_TABLES]
+                    assert not scans, "{} scans tables: {}\n{}".format(url, scans, statement)
+            finally:
+                connection.close()
@@ -0,0 +1,31 @@
+def test_list_responses_are_cached_until_collection_changes(app):
+    """Test that repeated polls of a list are answered from the cache, or with 304 given a matching ETag, until it's written to.
+    """
+    from query_tracker import track_queries
+
+    client = app.test_client()
+    base = app.config["BASE_PATH"]
+    bank_id = client.put(base + "/bank/", json={"name": "Cached Bank"}).get_json()["id"]
+    url = "{}/bank/{}/branch/".format(base, bank_id)
+    assert client.put(url, json={"name": "Main Street"}).status_code == 200
+
+    first = client.get(url)
+    etag = first.headers["ETag"]
+    with app.app_context(), track_queries() as tracker:
+        second = client.get(url)
+        not_modified = client.get(url, headers={"If-None-Match": etag})
+    assert second.get_data() == first.get_data() and second.headers["ETag"] == etag
+    assert not_modified.status_code == 304 and not not_modified.get_data()
+    # Only the version counters are read
+    assert all("branch" not in statement for statement in tracker.statements)
+
+    # Test different query strings are cached separately
+    expanded = client.get(url, query_string={"expand": "bank"})
+    assert expanded.get_json()[0]["bank"]["name"] == "Cached Bank" and expanded.headers["ETag"] != etag
+
+    # Test writes to the collection, or to collections it's built from, invalidate it
+    assert client.post("{}{}/".format(url, first.get_json()[0]["id"]), json={"name": "High Street"}).status_code == 200
+    renamed = client.get(url, headers={"If-None-Match": etag})
+    assert renamed.status_code == 200 and renamed.get_json()[0]["name"] == "High Street"
+    assert client.post("{}/bank/{}/".format(base, bank_id), json={"name": "Renamed Bank"}).status_code == 200
+    assert client.get(url, query_string={"expand": "bank"}).get_json()[0]["bank"]["name"] == "Renamed Bank"
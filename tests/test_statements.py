@@ -0,0 +1,72 @@
+import json
+import os
+import tempfile
+from datetime import datetime
+
+
+def create_accounts(app, create_bank):
+    """Creates a bank with two accounts, with transactions before, during and after January 2020
+
+    Returns:
+        tuple -- Bank id and ids of the accounts
+    """
+    from app import db
+    from models import Account, Transaction
+
+    bank_id, account_config_id, (user_id,) = create_bank(
+        users=["Stella Statement"], name="Statement Savings", is_savings=True, is_checking=False, interest=0.12, withdrawal_fee=1)
+    with app.app_context():
+        accounts = [Account(bank_id=bank_id, config_id=account_config_id, user_id=user_id, _balance=balance) for balance in (106, 0)]
+        db.session.add_all(accounts)
+        db.session.add_all([
+            Transaction(account=accounts[0], cash_amount=100, fees=0, description="Deposit", datetime=datetime(2019, 12, 20)),
+            Transaction(account=accounts[0], cash_amount=-20, fees=1, description="Withdrawal", datetime=datetime(2020, 1, 5)),
+            Transaction(account=accounts[0], cash_amount=30, fees=0, description="Deposit", datetime=datetime(2020, 1, 10)),
+            Transaction(account=accounts[0], cash_amount=1, fees=0, description="Interest for 1/2020", datetime=datetime(2020, 1, 31, 23)),
+            Transaction(account=accounts[0], cash_amount=-4, fees=0, description="Withdrawal", datetime=datetime(2020, 2, 2)),
+        ])
+        db.session.commit()
+        return bank_id, [account.id for account in accounts]
+
+
+def test_statements_are_generated_and_resumed(app, create_bank):
+    """Test that monthly statements are generated in parallel from balances and transactions, and that reruns only generate missing shards.
+    """
+    bank_id, (account_id_1, account_id_2) = create_accounts(app, create_bank)
+    directory = tempfile.mkdtemp()
+    args = ["statements", "--bank-id", str(bank_id), "--month", "2020-01", "--output", directory, "--workers", "2", "--shard-size", "1"]
+
+    result = app.test_cli_runner().invoke(args=args)
+    assert result.exit_code == 0, result.output
+    assert "Wrote 2 statements with 3 transactions" in result.output
+    with open(os.path.join(directory, "{}.json".format(account_id_1))) as file:
+        statement = json.load(file)
+    assert statement["period"] == "2020-01" and statement["name"] == "Stella Statement"
+    assert (statement["opening_balance"], statement["closing_balance"]) == ("100.00", "110.00")
+    assert (statement["deposits"], statement["withdrawals"], statement["interest"], statement["fees"]) == ("30.00", "-20.00", "1.00", "1.00")
+    assert [line["balance"] for line in statement["transactions"]] == ["79.00", "109.00", "110.00"]
+    with open(os.path.join(directory, "{}.json".format(account_id_2))) as file:
+        assert json.load(file)["transactions"] == []
+
+    # Test a rerun after losing a shard only generates that shard again
+    os.remove(os.path.join(directory, "{}.json".format(account_id_2)))
+    os.remove(os.path.join(directory, ".shards", "2020-01", "1", "{}.json.done".format(account_id_2)))
+    result = app.test_cli_runner().invoke(args=args)
+    assert result.exit_code == 0, result.output
+    assert "Skipped 1 shards" in result.output and "Wrote 1 statements" in result.output
+    assert os.path.exists(os.path.join(directory, "{}.json".format(account_id_2)))
+
+    # Test shards done for another shard size or month aren't skipped
+    result = app.test_cli_runner().invoke(args=args[:-1] + ["1000"])
+    assert result.exit_code == 0, result.output
+    assert "Skipped" not in result.output and "Wrote 2 statements" in result.output
+    result = app.test_cli_runner().invoke(args=[arg if arg != "2020-01" else "2020-02" for arg in args])
+    assert result.exit_code == 0, result.output
+    assert "Skipped" not in result.output and "Wrote 2 statements" in result.output
+
+    # Test statements can be written as CSV
+    result = app.test_cli_runner().invoke(args=args + ["--format", "csv"])
+    assert result.exit_code == 0, result.output
+    with open(os.path.join(directory, "{}.csv".format(account_id_1))) as file:
+        rows = file.read().splitlines()
+    assert rows[1] == ",Opening Balance,,,100.00" and rows[-1] == ",Closing Balance,,,110.00" and len(rows) == 6
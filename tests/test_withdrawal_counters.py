@@ -0,0 +1,60 @@
+def test_rebuilt_counters_match_live_counters(app, create_bank):
+    """Test that withdrawal counters rebuilt from the transaction log match those kept as transactions are made.
+    Deposits with fees larger than them and returned checks taken back from their depositor aren't withdrawals, while checks cleared are.
+    """
+    from app import db
+    from models import WithdrawalCounter
+
+    bank_id, account_config_id, (user_id,) = create_bank(users=["Wes Withdrawal"], deposit_fee=1)
+    base = "{}/bank/{}".format(app.config["BASE_PATH"], bank_id)
+    client = app.test_client()
+
+    def put(url, body):
+        response = client.put(base + url, json=body)
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()
+
+    account_id_1, account_id_2 = (put("/account/", {"user_id": user_id, "account_config_id": account_config_id, "initial_deposit": 100})["id"] for _ in range(2))
+    put("/account/{}/transaction/".format(account_id_1), {"cash_amount": 0.5})
+    put("/account/{}/transaction/".format(account_id_1), {"cash_amount": -10})
+    put("/transfer/", {"from_account_id": account_id_2, "to_account_id": account_id_1, "amount": 5})
+    paid = put("/account/{}/check/".format(account_id_1), {"payable_to": "Wes Withdrawal", "amount": 20})["id"]
+    bounced = put("/account/{}/check/".format(account_id_2), {"payable_to": "Wes Withdrawal", "amount": 1000})["id"]
+    put("/account/{}/transaction/".format(account_id_2), {"cash_amount": 0, "checks": [paid]})
+    put("/account/{}/transaction/".format(account_id_1), {"cash_amount": 0, "checks": [bounced]})
+    assert put("/check_clearing/", {})["returned_count"] == 1
+
+    def counters():
+        query = WithdrawalCounter.query.filter(WithdrawalCounter.account_id.in_((account_id_1, account_id_2)))
+        return sorted((counter.account_id, counter.year, counter.month, counter.count) for counter in query)
+
+    with app.app_context():
+        live = counters()
+        assert [(account_id, count) for account_id, _, _, count in live] == [(account_id_1, 2), (account_id_2, 1)]
+        WithdrawalCounter.rebuild()
+        db.session.commit()
+        assert counters() == live
+
+
+def test_clearing_respects_savings_withdrawal_limit(app, create_bank):
+    """Test that checks drawn on a savings account which already made its monthly withdrawals are returned rather than cleared.
+    """
+    import config
+    from models import Account
+
+    bank_id, account_config_id, (user_id,) = create_bank(users=["Sal Savings"], is_savings=True, is_checking=False)
+    base = "{}/bank/{}".format(app.config["BASE_PATH"], bank_id)
+    client = app.test_client()
+    account_id_1, account_id_2 = (client.put(base + "/account/", json={
+        "user_id": user_id, "account_config_id": account_config_id, "initial_deposit": 100}).get_json()["id"] for _ in range(2))
+    for _ in range(config.SAVINGS_ACCOUNT_MAX_WITHDRAWALS_PER_MONTH):
+        assert client.put("{}/account/{}/transaction/".format(base, account_id_1), json={"cash_amount": -1}).status_code == 200
+    check_id = client.put("{}/account/{}/check/".format(base, account_id_1), json={"payable_to": "Sal Savings", "amount": 10}).get_json()["id"]
+    assert client.put("{}/account/{}/transaction/".format(base, account_id_2), json={"cash_amount": 0, "checks": [check_id]}).status_code == 200
+
+    clearing = client.put(base + "/check_clearing/", json={}).get_json()
+    assert (clearing["check_count"], clearing["returned_count"]) == (0, 1)
+    with app.app_context():
+        account_1, account_2 = Account.query.get(account_id_1), Account.query.get(account_id_2)
+        assert (account_1.balance, account_2.balance) == (94, 100)
+        assert account_1.withdrawals_this_month == config.SAVINGS_ACCOUNT_MAX_WITHDRAWALS_PER_MONTH